@@ -10,7 +10,9 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 import logging
+import os
 from collections import namedtuple
+from types import SimpleNamespace
 import typing as T
 
 import OpenGL.GL as gl
@@ -24,14 +26,17 @@ from calibration_choreography import (
     ChoreographyMode,
     ChoreographyNotification,
 )
+from observable import Observable
 from plugin import Plugin
+import tasklib
+from tasklib.manager import PluginTaskManager
 
 from gaze_mapping import gazer_classes_by_class_name, registered_gazer_classes
 from gaze_mapping.notifications import (
     CalibrationSetupNotification,
     CalibrationResultNotification,
 )
-from gaze_mapping.utils import closest_matches_monocular
+from gaze_mapping.utils import closest_match_indices_monocular
 
 
 logger = logging.getLogger(__name__)
@@ -40,6 +45,18 @@ Calculation_Result = namedtuple(
     "Calculation_Result", ["result", "num_used", "num_total"]
 )
 
+# Threshold independent intermediate results of the accuracy calculation, cosines of
+# the angles between matched gaze and reference locations and between successive ones
+Angular_Errors = namedtuple(
+    "Angular_Errors",
+    [
+        "error_lines",
+        "angular_err",
+        "succesive_distances_gaze",
+        "succesive_distances_ref",
+    ],
+)
+
 
 class ValidationInput:
     def __init__(self):
@@ -120,7 +137,7 @@ class ValidationInput:
         return gazer_cls
 
 
-class Accuracy_Visualizer(Plugin):
+class Accuracy_Visualizer(Plugin, Observable):
     """Calibrate using a marker on your screen
     We use a ring detector that moves across the screen to 9 sites
     Points are collected at sites not between
@@ -146,6 +163,9 @@ class Accuracy_Visualizer(Plugin):
         self.error_lines = None
 
         self.recent_input = ValidationInput()
+        self._angular_errors = None
+        self._task = None
+        self._task_manager = PluginTaskManager(plugin=self)
 
         # .5 degrees, used to remove outliers from precision calculation
         self.succession_threshold = np.cos(np.deg2rad(0.5))
@@ -270,8 +290,10 @@ class Accuracy_Visualizer(Plugin):
             return
 
         if notification["subject"] == "accuracy_visualizer.outlier_threshold_changed":
-            if self.recent_input.is_complete:
-                self.recalculate()
+            # only the reduction depends on the threshold, if the angular errors are
+            # still being calculated, the new threshold is used once they are done
+            if self._angular_errors is not None:
+                self._update_results()
 
     def __handle_calibration_setup_notification(self, note_dict: dict) -> bool:
         try:
@@ -320,19 +342,48 @@ class Accuracy_Visualizer(Plugin):
         return True
 
     def recalculate(self):
+        """Starts calculating the angular errors of the recent input in the background.
+
+        The accuracy and precision are updated once the calculation completed.
+        """
         if not self.recent_input.is_complete:
             logger.info(
                 "Did not collect enough data to estimate gaze mapping accuracy."
             )
             return
 
-        results = self.calc_acc_prec_errlines(
-            gazer_class=self.recent_input.gazer_class,
-            g_pool=self.g_pool,
-            gazer_params=self.recent_input.gazer_params,
-            pupil_list=self.recent_input.pupil_list,
-            ref_list=self.recent_input.ref_list,
-            intrinsics=self.g_pool.capture.intrinsics,
+        if self._task is not None and self._task.running:
+            self._task.kill(grace_period=None)
+        self._angular_errors = None
+
+        def on_completed(angular_errors):
+            self._angular_errors = angular_errors
+            self._update_results()
+
+        self._task = self._task_manager.create_background_task(
+            name="Accuracy_Visualizer angular errors",
+            routine_or_generator_function=_calc_angular_errors_in_background,
+            args=(
+                self.recent_input.gazer_class_name,
+                self.recent_input.gazer_params,
+                self.recent_input.pupil_list,
+                self.recent_input.ref_list,
+                self.g_pool.capture.intrinsics,
+                self.g_pool.min_calibration_confidence,
+                self.g_pool.user_dir,
+            ),
+        )
+        self._task.add_observer("on_completed", on_completed)
+        self._task.add_observer("on_exception", tasklib.raise_exception)
+
+        ref_locations = [loc["norm_pos"] for loc in self.recent_input.ref_list]
+        if len(ref_locations) >= 3:
+            hull = ConvexHull(ref_locations)  # requires at least 3 points
+            self.calibration_area = hull.points[hull.vertices, :]
+
+    def _update_results(self):
+        results = self.reduce_angular_errors(
+            self._angular_errors,
             outlier_threshold=self.outlier_threshold,
             succession_threshold=self.succession_threshold,
         )
@@ -363,11 +414,6 @@ class Accuracy_Visualizer(Plugin):
 
         self.error_lines = results[2]
 
-        ref_locations = [loc["norm_pos"] for loc in self.recent_input.ref_list]
-        if len(ref_locations) >= 3:
-            hull = ConvexHull(ref_locations)  # requires at least 3 points
-            self.calibration_area = hull.points[hull.vertices, :]
-
     @staticmethod
     def calc_acc_prec_errlines(
         g_pool,
@@ -379,25 +425,39 @@ class Accuracy_Visualizer(Plugin):
         outlier_threshold,
         succession_threshold=np.cos(np.deg2rad(0.5)),
     ):
+        angular_errors = Accuracy_Visualizer.calc_angular_errors(
+            g_pool, gazer_class, gazer_params, pupil_list, ref_list, intrinsics
+        )
+        return Accuracy_Visualizer.reduce_angular_errors(
+            angular_errors, outlier_threshold, succession_threshold
+        )
+
+    @staticmethod
+    def calc_angular_errors(
+        g_pool, gazer_class, gazer_params, pupil_list, ref_list, intrinsics
+    ):
+        """Maps the pupil data and matches the gaze to the reference locations.
+
+        This is the expensive part of the accuracy and precision calculation, which
+        does not depend on the thresholds. See reduce_angular_errors().
+        """
         gazer = gazer_class(g_pool, params=gazer_params)
 
-        gaze_pos = gazer.map_pupil_to_gaze(pupil_list)
-        ref_pos = ref_list
+        gaze_pos = list(gazer.map_pupil_to_gaze(pupil_list, offline=True))
+        ref_pos = list(ref_list)
 
         width, height = intrinsics.resolution
 
-        # reuse closest_matches_monocular to correlate one label to each prediction
-        # correlated['ref']: prediction, correlated['pupil']: label location
-        correlated = closest_matches_monocular(gaze_pos, ref_pos)
-        # [[pred.x, pred.y, label.x, label.y], ...], shape: n x 4
-        locations = np.array(
-            [(*e["ref"]["norm_pos"], *e["pupil"]["norm_pos"]) for e in correlated]
+        # correlate one label to each prediction
+        gaze_idc, ref_idc = closest_match_indices_monocular(
+            [gp["timestamp"] for gp in gaze_pos], [rp["timestamp"] for rp in ref_pos]
         )
-        if locations.size == 0:
-            accuracy_result = Calculation_Result(0.0, 0, 0)
-            precision_result = Calculation_Result(0.0, 0, 0)
-            error_lines = np.array([])
-            return accuracy_result, precision_result, error_lines
+        if gaze_idc.size == 0:
+            return Angular_Errors(*(np.array([]) for _ in Angular_Errors._fields))
+        # [[pred.x, pred.y, label.x, label.y], ...], shape: n x 4
+        locations = np.empty((gaze_idc.size, 4))
+        locations[:, :2] = [gaze_pos[idx]["norm_pos"] for idx in gaze_idc.tolist()]
+        locations[:, 2:] = [ref_pos[idx]["norm_pos"] for idx in ref_idc.tolist()]
         error_lines = locations.copy()  # n x 4
         locations[:, ::2] *= width
         locations[:, 1::2] = (1.0 - locations[:, 1::2]) * height
@@ -416,18 +476,6 @@ class Accuracy_Visualizer(Plugin):
             "ij,ij->i", undistorted_3d[::2, :], undistorted_3d[1::2, :]
         )
 
-        # Good values are close to 1. since cos(0) == 1.
-        # Therefore we look for values greater than cos(outlier_threshold)
-        selected_indices = angular_err > np.cos(np.deg2rad(outlier_threshold))
-        selected_samples = angular_err[selected_indices]
-        num_used, num_total = selected_samples.shape[0], angular_err.shape[0]
-
-        error_lines = error_lines[selected_indices].reshape(
-            -1, 2
-        )  # shape: num_used x 2
-        accuracy = np.rad2deg(np.arccos(selected_samples.clip(-1.0, 1.0).mean()))
-        accuracy_result = Calculation_Result(accuracy, num_used, num_total)
-
         # lets calculate precision:  (RMS of distance of succesive samples.)
         # This is a little rough as we do not compensate headmovements in this test.
 
@@ -441,13 +489,44 @@ class Accuracy_Visualizer(Plugin):
         succesive_distances_ref = np.einsum(
             "ij,ij->i", undistorted_3d[:-1, 3:], undistorted_3d[1:, 3:]
         )
+        return Angular_Errors(
+            error_lines, angular_err, succesive_distances_gaze, succesive_distances_ref
+        )
+
+    @staticmethod
+    def reduce_angular_errors(
+        angular_errors, outlier_threshold, succession_threshold=np.cos(np.deg2rad(0.5))
+    ):
+        """Calculates accuracy, precision and error lines from angular errors.
+
+        This is cheap enough to be repeated on every change of the thresholds.
+        """
+        if angular_errors.error_lines.size == 0:
+            accuracy_result = Calculation_Result(0.0, 0, 0)
+            precision_result = Calculation_Result(0.0, 0, 0)
+            error_lines = np.array([])
+            return accuracy_result, precision_result, error_lines
+
+        angular_err = angular_errors.angular_err
+        # Good values are close to 1. since cos(0) == 1.
+        # Therefore we look for values greater than cos(outlier_threshold)
+        selected_indices = angular_err > np.cos(np.deg2rad(outlier_threshold))
+        selected_samples = angular_err[selected_indices]
+        num_used, num_total = selected_samples.shape[0], angular_err.shape[0]
+
+        error_lines = angular_errors.error_lines[selected_indices].reshape(
+            -1, 2
+        )  # shape: num_used x 2
+        accuracy = np.rad2deg(np.arccos(selected_samples.clip(-1.0, 1.0).mean()))
+        accuracy_result = Calculation_Result(accuracy, num_used, num_total)
 
         # if the ref distance is to big we must have moved to a new fixation or there is headmovement,
         # if the gaze dis is to big we can assume human error
         # both times gaze data is not valid for this mesurement
+        succesive_distances_gaze = angular_errors.succesive_distances_gaze
         selected_indices = np.logical_and(
             succesive_distances_gaze > succession_threshold,
-            succesive_distances_ref > succession_threshold,
+            angular_errors.succesive_distances_ref > succession_threshold,
         )
         succesive_distances = succesive_distances_gaze[selected_indices]
         num_used, num_total = (
@@ -486,3 +565,32 @@ class Accuracy_Visualizer(Plugin):
             "vis_mapping_error": self.vis_mapping_error,
             "vis_calibration_area": self.vis_calibration_area,
         }
+
+
+def _calc_angular_errors_in_background(
+    gazer_class_name,
+    gazer_params,
+    pupil_list,
+    ref_list,
+    intrinsics,
+    min_calibration_confidence,
+    user_dir,
+):
+    from plugin import import_runtime_plugins
+
+    import_runtime_plugins(os.path.join(user_dir, "plugins"))
+    gazers_by_name = gazer_classes_by_class_name(registered_gazer_classes())
+    gazer_class = gazers_by_name[gazer_class_name]
+
+    # The gazer only needs these attributes. Using the actual g_pool would also make
+    # the temporary gazer the active gaze mapping plugin.
+    g_pool = SimpleNamespace(
+        capture=SimpleNamespace(
+            frame_size=intrinsics.resolution, intrinsics=intrinsics
+        ),
+        min_calibration_confidence=min_calibration_confidence,
+        user_dir=user_dir,
+    )
+    return Accuracy_Visualizer.calc_angular_errors(
+        g_pool, gazer_class, gazer_params, pupil_list, ref_list, intrinsics
+    )
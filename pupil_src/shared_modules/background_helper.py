@@ -141,6 +141,39 @@ class Task_Proxy:
         return self._canceled
 
 
+class Task_Proxy_Group:
+    """Combines several task proxies into one, e.g. to split work across processes.
+
+    Available results are fetched from the proxies in turns, such that a fast proxy
+    does not hold back the results of the others. The group completes when all of
+    its proxies completed.
+    """
+
+    def __init__(self, proxies):
+        self.proxies = list(proxies)
+
+    def fetch(self):
+        fetching = [proxy.fetch() for proxy in self.proxies]
+        while fetching:
+            for results in fetching.copy():
+                try:
+                    yield next(results)
+                except StopIteration:
+                    fetching.remove(results)
+
+    def cancel(self, timeout=1):
+        for proxy in self.proxies:
+            proxy.cancel(timeout)
+
+    @property
+    def completed(self):
+        return all(proxy.completed for proxy in self.proxies)
+
+    @property
+    def canceled(self):
+        return any(proxy.canceled for proxy in self.proxies)
+
+
 class IPC_Logging_Task_Proxy(Task_Proxy):
     push_url = None
 
@@ -28,6 +28,8 @@ import gl_utils
 import player_methods as pm
 from observable import Observable
 from plugin import Plugin
+from plugin_timeline import draw_envelope
+from timeline_envelope import TimelineEnvelope
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +39,78 @@ blink_color = cygl_utils.RGBA(0.9961, 0.3789, 0.5313, 0.8)
 threshold_color = cygl_utils.RGBA(0.9961, 0.8438, 0.3984, 0.8)
 
 
+class Confidence_History:
+    """Ring buffer of pupil data with running prefix sums of their confidences.
+
+    Appending and dropping data, as well as summing the confidences of any
+    contiguous range of buffered data, costs constant (amortized) time. The
+    capacity is doubled in the rare case that the buffer runs full.
+    """
+
+    def __init__(self, capacity=512):
+        self._allocate(capacity)
+        self.clear()
+
+    def _allocate(self, capacity):
+        self._capacity = capacity
+        self._timestamps = np.empty(capacity)
+        # sum of all confidences appended before and including the sample
+        self._cumsum = np.empty(capacity)
+
+    def clear(self):
+        self._first = 0  # sequence number of the oldest datum
+        self._end = 0  # sequence number of the next appended datum
+        self._cumsum_dropped = 0.0
+        self.data = deque()
+
+    def __len__(self):
+        return self._end - self._first
+
+    def _grow(self):
+        seq = np.arange(self._first, self._end)
+        timestamps = self._timestamps[seq % self._capacity]
+        cumsum = self._cumsum[seq % self._capacity]
+        self._allocate(2 * self._capacity)
+        self._timestamps[seq % self._capacity] = timestamps
+        self._cumsum[seq % self._capacity] = cumsum
+
+    def append(self, datum):
+        if len(self) == self._capacity:
+            self._grow()
+        slot = self._end % self._capacity
+        self._timestamps[slot] = datum["timestamp"]
+        self._cumsum[slot] = self._prefix_sum(len(self)) + datum["confidence"]
+        self._end += 1
+        self.data.append(datum)
+
+    def popleft(self):
+        self._cumsum_dropped = self._cumsum[self._first % self._capacity]
+        self._first += 1
+        self.data.popleft()
+        if not self:
+            # restart prefix sums to avoid accumulating rounding errors
+            self.clear()
+
+    def timestamp(self, idx):
+        """Timestamp of the idx-th oldest datum. Supports negative indices."""
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("Confidence_History index out of range")
+        return float(self._timestamps[(self._first + idx) % self._capacity])
+
+    def confidence_sum(self, start, stop):
+        """Sum of the confidences of the buffered data in `[start, stop)`."""
+        if start >= stop:
+            return 0.0
+        return self._prefix_sum(stop) - self._prefix_sum(start)
+
+    def _prefix_sum(self, count):
+        if count == 0:
+            return self._cumsum_dropped
+        return self._cumsum[(self._first + count - 1) % self._capacity]
+
+
 class Blink_Detection(Plugin):
     """
     This plugin implements a blink detection algorithm, based on sudden drops in the
@@ -63,7 +137,7 @@ class Blink_Detection(Plugin):
         self.onset_confidence_threshold = onset_confidence_threshold
         self.offset_confidence_threshold = offset_confidence_threshold
 
-        self.history = deque()
+        self.history = Confidence_History()
         self.menu = None
         self._recent_blink = None
 
@@ -115,38 +189,41 @@ class Blink_Detection(Plugin):
         self._recent_blink = None
 
         pupil = events.get("pupil", [])
-        pupil = filter(lambda p: "2d" in p["topic"], pupil)
-        self.history.extend(pupil)
+        for datum in pupil:
+            if "2d" in datum["topic"]:
+                self.history.append(datum)
 
-        try:
-            ts_oldest = self.history[0]["timestamp"]
-            ts_newest = self.history[-1]["timestamp"]
-            inconsistent_timestamps = ts_newest < ts_oldest
-            if inconsistent_timestamps:
-                self.reset_history()
-                return
-
-            age_threshold = ts_newest - self.history_length
-            # pop elements until only one element below the age threshold remains:
-            while self.history[1]["timestamp"] < age_threshold:
-                self.history.popleft()  # remove outdated gaze points
-        except IndexError:
-            pass
+        if len(self.history) < 2:
+            return
+
+        ts_oldest = self.history.timestamp(0)
+        ts_newest = self.history.timestamp(-1)
+        inconsistent_timestamps = ts_newest < ts_oldest
+        if inconsistent_timestamps:
+            self.reset_history()
+            return
+
+        age_threshold = ts_newest - self.history_length
+        # pop elements until only one element below the age threshold remains:
+        while len(self.history) > 1 and self.history.timestamp(1) < age_threshold:
+            self.history.popleft()  # remove outdated gaze points
 
         filter_size = len(self.history)
         if filter_size < 2 or ts_newest - ts_oldest < self.history_length:
             return
 
-        activity = np.fromiter((pp["confidence"] for pp in self.history), dtype=float)
-        blink_filter = np.ones(filter_size) / filter_size
-        blink_filter[filter_size // 2 :] *= -1
-
-        if filter_size % 2 == 1:  # make filter symmetrical
-            blink_filter[filter_size // 2] = 0.0
+        # The filter weighs the first half of the history with +1/filter_size and
+        # the second half with -1/filter_size. The middle sample of an odd-sized
+        # history is ignored to keep the filter symmetrical.
+        half_size = filter_size // 2
+        filter_response = (
+            self.history.confidence_sum(0, half_size)
+            - self.history.confidence_sum(filter_size - half_size, filter_size)
+        ) / filter_size
 
         # The theoretical response maximum is +-0.5
         # Response of +-0.45 seems sufficient for a confidence of 1.
-        filter_response = activity @ blink_filter / 0.45
+        filter_response /= 0.45
 
         if (
             -self.offset_confidence_threshold
@@ -165,8 +242,8 @@ class Blink_Detection(Plugin):
             "topic": "blinks",
             "type": blink_type,
             "confidence": confidence,
-            "base_data": list(self.history),
-            "timestamp": self.history[len(self.history) // 2]["timestamp"],
+            "base_data": list(self.history.data),
+            "timestamp": self.history.timestamp(len(self.history) // 2),
             "record": True,
         }
         events["blinks"].append(blink_entry)
@@ -191,10 +268,14 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
         history_length=0.2,
         onset_confidence_threshold=0.5,
         offset_confidence_threshold=0.5,
+        copy_base_data=False,
     ):
         self._history_length = None
         self._onset_confidence_threshold = None
         self._offset_confidence_threshold = None
+        # If False, blinks only reference their base data and filter response via
+        # `base_data_index_range`, which keeps re-classification interactive.
+        self.copy_base_data = copy_base_data
 
         super().__init__(
             g_pool,
@@ -206,7 +287,11 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
         self.response_classification = []
         self.timestamps = []
         g_pool.blinks = pm.Affiliator()
-        self.cache = {"response_points": (), "class_points": (), "thresholds": ()}
+        self.cache = {
+            "response_envelope": TimelineEnvelope.empty(),
+            "class_points": (),
+            "thresholds": (),
+        }
 
         self.pupil_positions_listener = data_changed.Listener(
             "pupil_positions", g_pool.rec_dir, plugin=self
@@ -233,6 +318,19 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
         self.timeline.content_height *= 2
         self.g_pool.user_timelines.append(self.timeline)
 
+        def set_copy_base_data(val):
+            self.copy_base_data = val
+            self.consolidate_classifications()
+
+        self.menu.append(
+            ui.Switch(
+                "copy_base_data",
+                self,
+                label="Copy base data into blinks",
+                setter=set_copy_base_data,
+            )
+        )
+
     def deinit_ui(self):
         super().deinit_ui()
         self.g_pool.user_timelines.remove(self.timeline)
@@ -244,6 +342,9 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
     def gl_display(self):
         pass
 
+    def get_init_dict(self):
+        return {**super().get_init_dict(), "copy_base_data": self.copy_base_data}
+
     def on_notify(self, notification):
         if notification["subject"] == "blink_detection.should_recalculate":
             self.recalculate()
@@ -366,82 +467,91 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
         )
 
     def consolidate_classifications(self):
-        blink = None
-        state = "no blink"  # others: 'blink started' | 'blink ending'
-        blink_data = deque()
-        blink_start_ts = deque()
-        blink_stop_ts = deque()
-        counter = 1
+        """Groups the response classification into blink events.
+
+        A blink starts with the first onset classification after the previous blink
+        and ends with the last sample of the first consecutive run of offset
+        classifications following its start. Equivalently, each run of offset
+        classifications ends a blink if there is an onset classification between it
+        and the previous offset run.
+        """
+        classification = np.asarray(self.response_classification)
+        starts, ends = self._blink_index_ranges(classification)
+
+        if len(starts) == 0:
+            self.g_pool.blinks = pm.Affiliator()
+            self.notify_all({"subject": "blinks_changed", "delay": 0.2})
+            return
+
+        timestamps = np.asarray(self.timestamps)
+        start_ts = timestamps[starts]
+        end_ts = timestamps[ends]
+
+        # blink confidence is the mean of the absolute filter response
+        # during the blink event, clamped at 1.
+        abs_response_cumsum = np.concatenate(
+            ([0.0], np.cumsum(np.abs(self.filter_response)))
+        )
+        confidences = (abs_response_cumsum[ends] - abs_response_cumsum[starts]) / (
+            ends - starts
+        )
+        confidences = np.minimum(confidences, 1.0)
+
+        # correlate world indices
+        world_timestamps = self.g_pool.timestamps
+        idc_start = np.searchsorted(world_timestamps, start_ts)
+        idc_end = np.searchsorted(world_timestamps, end_ts)
+        # fix `list index out of range` error
+        idc_end = np.minimum(idc_end, len(world_timestamps) - 1)
 
         # NOTE: Cache result for performance reasons
-        pupil_data = self._pupil_data()
+        pupil_data = self._pupil_data() if self.copy_base_data else None
 
-        def start_blink(idx):
-            nonlocal blink
-            nonlocal state
-            nonlocal counter
+        blink_data = []
+        for idx, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+            idx_start, idx_end = int(idc_start[idx]), int(idc_end[idx])
             blink = {
                 "topic": "blink",
-                "__start_response_index__": idx,
-                "start_timestamp": self.timestamps[idx],
-                "id": counter,
+                "id": idx + 1,
+                "start_timestamp": float(start_ts[idx]),
+                "end_timestamp": float(end_ts[idx]),
+                "timestamp": float(end_ts[idx] + start_ts[idx]) / 2,
+                "duration": float(end_ts[idx] - start_ts[idx]),
+                "confidence": float(confidences[idx]),
+                "base_data_index_range": [start, end],
+                "start_frame_index": idx_start,
+                "end_frame_index": idx_end,
+                "index": (idx_start + idx_end) // 2,
             }
-            state = "blink started"
-            counter += 1
-
-        def blink_finished(idx):
-            nonlocal blink
-
-            # get tmp pupil idx
-            start_idx = blink["__start_response_index__"]
-            del blink["__start_response_index__"]
-
-            blink["end_timestamp"] = self.timestamps[idx]
-            blink["timestamp"] = (blink["end_timestamp"] + blink["start_timestamp"]) / 2
-            blink["duration"] = blink["end_timestamp"] - blink["start_timestamp"]
-            blink["base_data"] = pupil_data[start_idx:idx].tolist()
-            blink["filter_response"] = self.filter_response[start_idx:idx].tolist()
-            # blink confidence is the mean of the absolute filter response
-            # during the blink event, clamped at 1.
-            blink["confidence"] = min(
-                float(np.abs(blink["filter_response"]).mean()), 1.0
-            )
+            if self.copy_base_data:
+                blink["base_data"] = pupil_data[start:end].tolist()
+                blink["filter_response"] = self.filter_response[start:end].tolist()
+            blink_data.append(fm.Serialized_Dict(python_dict=blink))
 
-            # correlate world indices
-            ts_start, ts_end = blink["start_timestamp"], blink["end_timestamp"]
+        self.g_pool.blinks = pm.Affiliator(blink_data, start_ts, end_ts)
+        self.notify_all({"subject": "blinks_changed", "delay": 0.2})
 
-            idx_start, idx_end = np.searchsorted(
-                self.g_pool.timestamps, [ts_start, ts_end]
-            )
-            # fix `list index out of range` error
-            idx_end = min(idx_end, len(self.g_pool.timestamps) - 1)
-            blink["start_frame_index"] = int(idx_start)
-            blink["end_frame_index"] = int(idx_end)
-            blink["index"] = int((idx_start + idx_end) // 2)
+    @staticmethod
+    def _blink_index_ranges(classification):
+        """Returns start indices and (inclusive) end indices of blinks."""
+        is_offset = np.concatenate(([0], classification < 0, [0])).astype(np.int8)
+        offset_edges = np.diff(is_offset)
+        offset_run_starts = np.flatnonzero(offset_edges == 1)
+        offset_run_ends = np.flatnonzero(offset_edges == -1) - 1
 
-            blink_data.append(fm.Serialized_Dict(python_dict=blink))
-            blink_start_ts.append(ts_start)
-            blink_stop_ts.append(ts_end)
-
-        for idx, classification in enumerate(self.response_classification):
-            if state == "no blink" and classification > 0:
-                start_blink(idx)
-            elif state == "blink started" and classification == -1:
-                state = "blink ending"
-            elif state == "blink ending" and classification >= 0:
-                blink_finished(idx - 1)  # blink ended previously
-                if classification > 0:
-                    start_blink(0)
-                else:
-                    blink = None
-                    state = "no blink"
-
-        if state == "blink ending":
-            # only finish blink if it was already ending
-            blink_finished(idx)  # idx is the last possible idx
-
-        self.g_pool.blinks = pm.Affiliator(blink_data, blink_start_ts, blink_stop_ts)
-        self.notify_all({"subject": "blinks_changed", "delay": 0.2})
+        onsets = np.flatnonzero(classification > 0)
+        if len(onsets) == 0 or len(offset_run_starts) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        # first onset after the previous offset run
+        gap_starts = np.concatenate(([0], offset_run_ends[:-1] + 1))
+        first_onsets = np.searchsorted(onsets, gap_starts)
+        has_onset = first_onsets < len(onsets)
+        starts = onsets[np.minimum(first_onsets, len(onsets) - 1)]
+        is_blink = has_onset & (starts < offset_run_starts)
+
+        return starts[is_blink], offset_run_ends[is_blink]
 
     def cache_activation(self):
         t0, t1 = self.g_pool.timestamps[0], self.g_pool.timestamps[-1]
@@ -452,12 +562,13 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
             (t1, -self.offset_confidence_threshold),
         )
 
-        self.cache["response_points"] = tuple(
-            zip(self.timestamps, self.filter_response)
-        )
-        if len(self.cache["response_points"]) == 0:
+        if len(self.filter_response) == 0:
+            self.cache["response_envelope"] = TimelineEnvelope.empty((t0, t1))
             self.cache["class_points"] = ()
             return
+        self.cache["response_envelope"] = self._load_or_build_response_envelope(
+            (t0, t1)
+        )
 
         class_points = deque([(t0, -0.9)])
         for b in self.g_pool.blinks:
@@ -468,14 +579,44 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
         class_points.append((t1, -0.9))
         self.cache["class_points"] = tuple(class_points)
 
+    def _load_or_build_response_envelope(self, xlim) -> TimelineEnvelope:
+        """Loads the persisted envelope of the filter response, or builds and saves it.
+
+        The filter response only depends on the pupil data and the filter length.
+        """
+        token = self.pupil_positions_listener.current_token
+        file_path = os.path.join(
+            self.g_pool.rec_dir, "offline_data", "timelines", "blink_response.npz"
+        )
+        envelope_key = "-".join(
+            (
+                str(token),
+                "{:.6f}".format(self.history_length),
+                str(len(self.filter_response)),
+                "{:.6f}-{:.6f}".format(*xlim),
+            )
+        )
+        if token is not None:
+            envelope = TimelineEnvelope.load(file_path, envelope_key)
+            if envelope is not None:
+                return envelope
+
+        envelope = TimelineEnvelope.from_timeseries(
+            self.timestamps, self.filter_response, xlim=xlim
+        )
+        if token is not None:
+            envelope.save(file_path, envelope_key)
+        return envelope
+
     def draw_activation(self, width, height, scale):
         t0, t1 = self.g_pool.timestamps[0], self.g_pool.timestamps[-1]
         with gl_utils.Coord_System(t0, t1, -1, 1):
-            cygl_utils.draw_polyline(
-                self.cache["response_points"],
-                color=activity_color,
+            draw_envelope(
+                self.cache["response_envelope"],
+                width,
+                scale,
+                activity_color,
                 line_type=gl.GL_LINE_STRIP,
-                thickness=scale,
             )
             cygl_utils.draw_polyline(
                 self.cache["class_points"],
@@ -572,13 +713,20 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
 
     def csv_representation_for_blink(self, b, header):
         data = [b[k] for k in header if k not in ("filter_response", "base_data")]
+        if "base_data" in b:
+            filter_response = b["filter_response"]
+            base_timestamps = (pp["timestamp"] for pp in b["base_data"])
+        else:
+            start, end = b["base_data_index_range"]
+            filter_response = self.filter_response[start:end]
+            base_timestamps = self.timestamps[start:end]
         try:
-            resp = " ".join(["{}".format(val) for val in b["filter_response"]])
+            resp = " ".join(["{}".format(val) for val in filter_response])
             data.insert(header.index("filter_response"), resp)
         except IndexError:
             pass
         try:
-            base = " ".join(["{}".format(pp["timestamp"]) for pp in b["base_data"]])
+            base = " ".join(["{}".format(ts) for ts in base_timestamps])
             data.insert(header.index("base_data"), base)
         except IndexError:
             pass
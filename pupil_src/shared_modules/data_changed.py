@@ -67,6 +67,11 @@ class Announcer:
         self._current_token = None
         plugin.add_observer("on_notify", self._on_notify)
 
+    @property
+    def current_token(self):
+        """The token of the currently announced data or None if not announced yet."""
+        return self._current_token
+
     def announce_new(self, delay=None, token_data=None):
         """
         Announce that new data is available for the topic. New means that is has
@@ -149,6 +154,11 @@ class Listener(Observable):
         # topic, so it is asking for an announcement
         self._request_token()
 
+    @property
+    def current_token(self):
+        """The token of the most recently received announcement."""
+        return self._current_token
+
     def on_data_changed(self):
         """
         Add an observer to this to get notified when new data is announced. This is
@@ -370,6 +370,61 @@ class Serialized_Dict(object):
         )
 
 
+class Serialized_Dict_Batch(object):
+    """Timestamped Serialized_Dicts stored in contiguous buffers
+
+    Background tasks yield batches instead of lists of Serialized_Dicts. Pickling a
+    batch only copies a timestamp array, an offset array and a single payload blob,
+    independent of the number of data. Iterating yields (timestamp, Serialized_Dict)
+    pairs, just like the lists it replaces.
+
+    Timestamps have the shape (N,) or (N, k), e.g. for start and stop timestamps. In
+    the latter case, each timestamp is a tuple.
+    """
+
+    __slots__ = ["timestamps", "_payload", "_offsets"]
+
+    def __init__(self, timestamps, payload: bytes, offsets):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self._payload = payload
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_serialized(cls, timestamps, serialized_data):
+        """Batch from timestamps and msgpack bytes of the same length"""
+        lengths = np.fromiter(
+            map(len, serialized_data), dtype=np.int64, count=len(serialized_data)
+        )
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        return cls(timestamps, b"".join(serialized_data), offsets)
+
+    @classmethod
+    def from_pairs(cls, ts_and_data):
+        """Batch from (timestamp, Serialized_Dict) pairs"""
+        ts_and_data = list(ts_and_data)
+        timestamps = [ts for ts, _ in ts_and_data]
+        serialized_data = [datum.serialized for _, datum in ts_and_data]
+        return cls.from_serialized(timestamps, serialized_data)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        timestamps = self.timestamps.tolist()
+        if self.timestamps.ndim > 1:
+            timestamps = map(tuple, timestamps)
+        return zip(timestamps, self.data)
+
+    @property
+    def data(self):
+        offsets = self._offsets.tolist()
+        payload = self._payload
+        return [
+            Serialized_Dict(msgpack_bytes=payload[start:stop])
+            for start, stop in zip(offsets[:-1], offsets[1:])
+        ]
+
+
 def _recursive_deep_copy(item):
 
     if isinstance(item, collections.abc.Mapping):
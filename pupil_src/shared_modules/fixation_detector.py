@@ -153,6 +153,10 @@ def gaze_dispersion(capture, gaze_subset, method: FixationDetectionMethod) -> fl
     return dist
 
 
+# Fixations are sent to the foreground in batches of this size.
+FIXATION_BATCH_SIZE = 100
+
+
 def can_use_3d_gaze_mapping(gaze_data) -> bool:
     return all("gaze_point_3d" in gp for gp in gaze_data)
 
@@ -171,6 +175,29 @@ def detect_fixations(
         logger.warning("No data available to find fixations")
         return "Fixation detection failed", ()
 
+    queue = []
+    for fixation in _find_fixations(
+        capture, gaze_data, max_dispersion, min_duration, max_duration
+    ):
+        queue.append(fixation)
+        if len(queue) >= FIXATION_BATCH_SIZE:
+            yield "Detecting fixations...", _fixation_batch(queue)
+            queue.clear()
+    if queue:
+        yield "Detecting fixations...", _fixation_batch(queue)
+
+    yield "Fixation detection complete", ()
+
+
+def _fixation_batch(fixations):
+    """Serialized_Dict_Batch with start and stop timestamps of each fixation"""
+    serialized, start_ts, stop_ts = zip(*fixations)
+    return fm.Serialized_Dict_Batch.from_serialized(
+        np.column_stack((start_ts, stop_ts)), serialized
+    )
+
+
+def _find_fixations(capture, gaze_data, max_dispersion, min_duration, max_duration):
     method = (
         FixationDetectionMethod.GAZE_3D
         if can_use_3d_gaze_mapping(gaze_data)
@@ -216,7 +243,7 @@ def detect_fixations(
             fixation = fixation_result.from_data(
                 dispersion, method, working_queue, capture.timestamps
             )
-            yield "Detecting fixations...", fixation
+            yield fixation
             working_queue.clear()  # discard old Q
             continue
 
@@ -244,12 +271,10 @@ def detect_fixations(
         fixation = fixation_result.from_data(
             dispersion_result, method, final_base_data, capture.timestamps
         )
-        yield "Detecting fixations...", fixation
+        yield fixation
         working_queue.clear()  # clear queue
         remaining_gaze.extendleft(reversed(to_be_placed_back))
 
-    yield "Fixation detection complete", ()
-
 
 class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
     """Dispersion-duration-based fixation detector.
@@ -482,15 +507,13 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
 
     def recent_events(self, events):
         if self.bg_task:
-            for progress, fixation_result in self.bg_task.fetch():
+            for progress, fixation_batch in self.bg_task.fetch():
                 self.status = progress
-                if fixation_result:
-                    serialized, start_ts, stop_ts = fixation_result
-                    self.fixation_data.append(
-                        fm.Serialized_Dict(msgpack_bytes=serialized)
-                    )
-                    self.fixation_start_ts.append(start_ts)
-                    self.fixation_stop_ts.append(stop_ts)
+                if fixation_batch:
+                    start_ts, stop_ts = fixation_batch.timestamps.T.tolist()
+                    self.fixation_data.extend(fixation_batch.data)
+                    self.fixation_start_ts.extend(start_ts)
+                    self.fixation_stop_ts.extend(stop_ts)
 
                 if self.fixation_data:
                     current_ts = self.fixation_stop_ts[-1]
@@ -666,6 +689,215 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
             logger.info("Created 'fixation_report.csv' file.")
 
 
+class Gaze_Ring_Buffer:
+    """Ring buffer of gaze unit vectors for online fixation detection.
+
+    Next to the unit vectors, the buffer keeps running sums of all values that are
+    averaged into a fixation, as well as the sliding per-axis extrema of the
+    vectors (monotonic queues of sample sequence numbers). Appending and dropping
+    samples, and querying dispersion bounds, costs constant amortized time,
+    independent of the number of buffered samples.
+
+    The capacity is fixed, unless the buffer runs full. In this case the capacity
+    is doubled, which only happens if the minimum duration is increased beyond
+    what the initial capacity can hold at the current gaze rate.
+    """
+
+    def __init__(self, capacity=2048):
+        self._allocate(capacity)
+        self.clear()
+
+    def _allocate(self, capacity):
+        self._capacity = capacity
+        self._vectors = np.empty((capacity, 3))
+        self._timestamps = np.empty(capacity)
+        self._norm_pos = np.empty((capacity, 2))
+        self._confidences = np.empty(capacity)
+        self._gaze_points_3d = np.empty((capacity, 3))
+
+    def clear(self):
+        self._first = 0  # sequence number of the oldest sample
+        self._end = 0  # sequence number of the next appended sample
+        self._base_data = deque()
+        self._sum_norm_pos = np.zeros(2)
+        self._sum_confidence = 0.0
+        self._sum_gaze_point_3d = np.zeros(3)
+        self._min_queues = [deque() for _ in range(3)]
+        self._max_queues = [deque() for _ in range(3)]
+
+    def __len__(self):
+        return self._end - self._first
+
+    def timestamp(self, idx):
+        """Timestamp of the idx-th oldest sample. Supports negative indices."""
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("Gaze_Ring_Buffer index out of range")
+        return float(self._timestamps[(self._first + idx) % self._capacity])
+
+    def vectors(self):
+        """Copy of all buffered unit vectors, oldest first."""
+        return self._vectors[self._slots()]
+
+    def _slots(self):
+        return np.arange(self._first, self._end) % self._capacity
+
+    def _grow(self):
+        seq = np.arange(self._first, self._end)
+        old_slots = seq % self._capacity
+        arrays = (
+            self._vectors[old_slots],
+            self._timestamps[old_slots],
+            self._norm_pos[old_slots],
+            self._confidences[old_slots],
+            self._gaze_points_3d[old_slots],
+        )
+        self._allocate(2 * self._capacity)
+        new_slots = seq % self._capacity
+        (
+            self._vectors[new_slots],
+            self._timestamps[new_slots],
+            self._norm_pos[new_slots],
+            self._confidences[new_slots],
+            self._gaze_points_3d[new_slots],
+        ) = arrays
+
+    def append(self, vector, gaze):
+        self._append_sample(*self._sample(vector, gaze))
+
+    def extend(self, vectors, gaze):
+        """Adds timestamp-sorted gaze and the corresponding unit vectors.
+
+        Gaze that is older than the newest buffered sample, e.g. gaze that was
+        matched late, is sorted into the buffer. This rebuilds the buffer.
+        """
+        samples = [self._sample(vector, gp) for vector, gp in zip(vectors, gaze)]
+        if samples and self and samples[0][1] < self.timestamp(-1):
+            # stable sort, buffered samples stay first for equal timestamps
+            samples = sorted(self._samples() + samples, key=lambda s: s[1])
+            self.clear()
+        for sample in samples:
+            self._append_sample(*sample)
+
+    @staticmethod
+    def _sample(vector, gaze):
+        return (
+            vector,
+            gaze["timestamp"],
+            gaze["norm_pos"],
+            gaze["confidence"],
+            gaze.get("gaze_point_3d", (0.0, 0.0, 0.0)),
+            (gaze["topic"], gaze["timestamp"]),
+        )
+
+    def _samples(self):
+        """Copies of all buffered samples, oldest first, see `_sample`."""
+        slots = self._slots()
+        return list(
+            zip(
+                self._vectors[slots],
+                self._timestamps[slots].tolist(),
+                self._norm_pos[slots],
+                self._confidences[slots].tolist(),
+                self._gaze_points_3d[slots],
+                list(self._base_data),
+            )
+        )
+
+    def _append_sample(
+        self, vector, timestamp, norm_pos, confidence, gaze_point_3d, base_datum
+    ):
+        if len(self) == self._capacity:
+            self._grow()
+        seq = self._end
+        slot = seq % self._capacity
+        self._end += 1
+
+        self._vectors[slot] = vector
+        self._timestamps[slot] = timestamp
+        self._norm_pos[slot] = norm_pos
+        self._confidences[slot] = confidence
+        self._gaze_points_3d[slot] = gaze_point_3d
+        self._base_data.append(base_datum)
+
+        self._sum_norm_pos += self._norm_pos[slot]
+        self._sum_confidence += self._confidences[slot]
+        self._sum_gaze_point_3d += self._gaze_points_3d[slot]
+
+        for axis in range(3):
+            value = self._vectors[slot, axis]
+            min_queue = self._min_queues[axis]
+            while min_queue and self._value(min_queue[-1], axis) >= value:
+                min_queue.pop()
+            min_queue.append(seq)
+            max_queue = self._max_queues[axis]
+            while max_queue and self._value(max_queue[-1], axis) <= value:
+                max_queue.pop()
+            max_queue.append(seq)
+
+    def pop_oldest(self):
+        seq = self._first
+        slot = seq % self._capacity
+        self._first += 1
+
+        self._base_data.popleft()
+        self._sum_norm_pos -= self._norm_pos[slot]
+        self._sum_confidence -= self._confidences[slot]
+        self._sum_gaze_point_3d -= self._gaze_points_3d[slot]
+
+        for queue in self._min_queues + self._max_queues:
+            if queue[0] == seq:
+                queue.popleft()
+
+        if not self:
+            # reset running sums to avoid accumulating rounding errors
+            self.clear()
+
+    def _value(self, seq, axis):
+        return self._vectors[seq % self._capacity, axis]
+
+    def dispersion_bounds(self):
+        """Lower and upper bound of the dispersion in radians.
+
+        The upper bound is the angle spanned by the diagonal of the axis-aligned
+        bounding box of all buffered vectors. The lower bound is the maximum angle
+        between the vectors that are extremal along any of the axes.
+        """
+        min_slots = [queue[0] % self._capacity for queue in self._min_queues]
+        max_slots = [queue[0] % self._capacity for queue in self._max_queues]
+        extent = self._vectors[max_slots, range(3)] - self._vectors[min_slots, range(3)]
+        upper_chord = np.linalg.norm(extent)
+
+        extremes = self._vectors[min_slots + max_slots]
+        differences = extremes[:, np.newaxis, :] - extremes[np.newaxis, :, :]
+        lower_chord = np.linalg.norm(differences, axis=-1).max()
+
+        return self._chord_to_angle(lower_chord), self._chord_to_angle(upper_chord)
+
+    @staticmethod
+    def _chord_to_angle(chord):
+        return 2.0 * np.arcsin(min(chord / 2.0, 1.0))
+
+    def fixation(self, dispersion, method: FixationDetectionMethod):
+        """Creates a fixation from all buffered samples, see `fixation_from_data`."""
+        count = len(self)
+        start = self.timestamp(0)
+        fix = {
+            "topic": "fixations",
+            "norm_pos": (self._sum_norm_pos / count).tolist(),
+            "dispersion": np.rad2deg(dispersion),
+            "method": method.value,
+            "base_data": list(self._base_data),
+            "timestamp": start,
+            "duration": (self.timestamp(-1) - start) * 1000,
+            "confidence": float(self._sum_confidence / count),
+        }
+        if method == FixationDetectionMethod.GAZE_3D:
+            fix["gaze_point_3d"] = (self._sum_gaze_point_3d / count).tolist()
+        return fix
+
+
 class Fixation_Detector(Fixation_Detector_Base):
     """Dispersion-duration-based fixation detector.
 
@@ -689,7 +921,8 @@ class Fixation_Detector(Fixation_Detector_Base):
 
     def __init__(self, g_pool, max_dispersion=3.0, min_duration=300, **kwargs):
         super().__init__(g_pool)
-        self.history = []
+        self.history = Gaze_Ring_Buffer()
+        self.history_method = None
         self.min_duration = min_duration
         self.max_dispersion = max_dispersion
         self.id_counter = 0
@@ -697,73 +930,93 @@ class Fixation_Detector(Fixation_Detector_Base):
 
     def recent_events(self, events):
         events["fixations"] = []
-        gaze = events["gaze"]
-
-        gaze = (
-            gp for gp in gaze if gp["confidence"] >= self.g_pool.min_data_confidence
-        )
-        self.history.extend(gaze)
-        self.history.sort(key=lambda gp: gp["timestamp"])
+        gaze = [
+            gp
+            for gp in events["gaze"]
+            if gp["confidence"] >= self.g_pool.min_data_confidence
+        ]
+        gaze.sort(key=lambda gp: gp["timestamp"])
+        self.extend_history(gaze)
 
         if not self.history:
             self.recent_fixation = None
             return
 
-        try:
-            ts_oldest = self.history[0]["timestamp"]
-            ts_newest = self.history[-1]["timestamp"]
-            inconsistent_timestamps = ts_newest < ts_oldest
-            if inconsistent_timestamps:
-                self.reset_history()
-                return
-
-            age_threshold = ts_newest - self.min_duration / 1000.0
-            # pop elements until only one element below the age threshold remains:
-            while self.history[1]["timestamp"] < age_threshold:
-                del self.history[0]  # remove outdated gaze points
-
-        except IndexError:
-            pass
+        age_threshold = self.history.timestamp(-1) - self.min_duration / 1000.0
+        # pop elements until only one element below the age threshold remains:
+        while len(self.history) > 1 and self.history.timestamp(1) < age_threshold:
+            self.history.pop_oldest()  # remove outdated gaze points
 
-        method = (
-            FixationDetectionMethod.GAZE_3D
-            if can_use_3d_gaze_mapping(self.history)
-            else FixationDetectionMethod.GAZE_2D
-        )
-        base_data = self.history
-
-        if len(base_data) <= 2 or (
-            base_data[-1]["timestamp"] - base_data[0]["timestamp"]
+        if len(self.history) <= 2 or (
+            self.history.timestamp(-1) - self.history.timestamp(0)
             < self.min_duration / 1000.0
         ):
             self.recent_fixation = None
             return
 
-        dispersion = gaze_dispersion(self.g_pool.capture, base_data, method)
-
-        if dispersion < np.deg2rad(self.max_dispersion):
-            new_fixation = fixation_from_data(dispersion, method, base_data)
+        max_dispersion = np.deg2rad(self.max_dispersion)
+        dispersion_lower, dispersion_upper = self.history.dispersion_bounds()
+        # The exact pairwise dispersion costs O(n^2) and is only computed if the
+        # threshold lies between the bounds. Otherwise the lower bound is
+        # published, which is the largest angle between the samples that are
+        # extremal along an axis, and usually equal to the exact dispersion.
+        dispersion = dispersion_lower
+        if dispersion_lower < max_dispersion <= dispersion_upper:
+            dispersion = vector_dispersion(self.history.vectors())
+        is_fixation = dispersion < max_dispersion
+
+        if is_fixation:
+            new_fixation = self.history.fixation(dispersion, self.history_method)
             if self.recent_fixation:
                 new_fixation["id"] = self.recent_fixation["id"]
             else:
                 new_fixation["id"] = self.id_counter
                 self.id_counter += 1
 
-            self.replace_basedata_with_references(new_fixation)
             events["fixations"].append(new_fixation)
             self.recent_fixation = new_fixation
         else:
             self.recent_fixation = None
 
+    def extend_history(self, gaze):
+        """Adds timestamp-sorted gaze to the ring buffer.
+
+        Gaze that is older than the newest buffered datum is sorted in. Outdated
+        gaze is removed afterwards in `recent_events`.
+        """
+        if not gaze:
+            return
+
+        method = (
+            FixationDetectionMethod.GAZE_3D
+            if can_use_3d_gaze_mapping(gaze)
+            else FixationDetectionMethod.GAZE_2D
+        )
+        if method is not self.history_method:
+            self.reset_history()
+            self.history_method = method
+
+        self.history.extend(self.gaze_vectors(gaze, method), gaze)
+
+    def gaze_vectors(self, gaze, method: FixationDetectionMethod):
+        if not gaze:
+            return np.empty((0, 3))
+        if method is FixationDetectionMethod.GAZE_3D:
+            vectors = np.array([gp["gaze_point_3d"] for gp in gaze], dtype=np.float64)
+            return vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+
+        locations = np.array([gp["norm_pos"] for gp in gaze], dtype=np.float64)
+        # denormalize
+        width, height = self.g_pool.capture.frame_size
+        locations[:, 0] *= width
+        locations[:, 1] = (1.0 - locations[:, 1]) * height
+        # undistort onto 3d plane
+        return self.g_pool.capture.intrinsics.unprojectPoints(locations, normalize=True)
+
     def reset_history(self):
         logger.debug("Resetting history")
         self.history.clear()
 
-    def replace_basedata_with_references(self, fixation):
-        fixation["base_data"] = [
-            (gaze["topic"], gaze["timestamp"]) for gaze in fixation["base_data"]
-        ]
-
     def gl_display(self):
         if self.recent_fixation:
             fs = self.g_pool.capture.frame_size  # frame height
@@ -18,6 +18,8 @@ from gaze_mapping.gazer_base import (
     GazerBase,
     Model,
     NotEnoughDataError,
+    group_match_indices,
+    match_means,
 )
 
 
@@ -247,6 +249,51 @@ class Gazer2D(GazerBase):
                 }
                 yield gaze_datum
 
+    def predict_batch(
+        self, matched_pupil_data: T.Iterable[T.List["Pupil"]]
+    ) -> T.Iterator["Gaze"]:
+        matched_pupil_data = list(matched_pupil_data)
+        indices = group_match_indices(matched_pupil_data)
+        predictions = [None] * len(matched_pupil_data)
+
+        buckets = (
+            (indices.binocular, self.binocular_model, "binocular", "gaze.2d.01."),
+            (indices.right, self.right_model, "right", "gaze.2d.0."),
+            (indices.left, self.left_model, "left", "gaze.2d.1."),
+        )
+        for bucket, model, model_name, topic in buckets:
+            if not bucket:
+                continue
+            if not model.is_fitted:
+                logger.debug(
+                    f"Prediction failed because {model_name} model is not fitted"
+                )
+                continue
+            matches = [matched_pupil_data[idx] for idx in bucket]
+            if model is self.binocular_model:
+                right = self._extract_pupil_features([m[0] for m in matches])
+                left = self._extract_pupil_features([m[1] for m in matches])
+                X = np.hstack([left, right])
+                assert X.shape[1] == _BINOCULAR_FEATURE_COUNT
+            else:
+                X = self._extract_pupil_features([m[0] for m in matches])
+                assert X.shape[1] == _MONOCULAR_FEATURE_COUNT
+            gaze_positions = model.predict(X).tolist()
+            confidences = match_means(matches, "confidence")
+            timestamps = match_means(matches, "timestamp")
+            for idx, gaze_pos, confidence, timestamp in zip(
+                bucket, gaze_positions, confidences, timestamps
+            ):
+                predictions[idx] = {
+                    "topic": topic,
+                    "norm_pos": gaze_pos,
+                    "confidence": confidence,
+                    "timestamp": timestamp,
+                    "base_data": matched_pupil_data[idx],
+                }
+
+        yield from (gaze_datum for gaze_datum in predictions if gaze_datum)
+
     def filter_pupil_data(
         self, pupil_data: T.Iterable, confidence_threshold: T.Optional[float] = None
     ) -> T.Iterable:
@@ -59,19 +59,24 @@ class BundleAdjustment:
         initial_guess = self._get_initial_guess(
             initial_rotation, initial_translation, initial_gaze_targets
         )
-        self._row_ind, self._col_ind = self._get_ind_for_jacobian_matrix()
 
-        result = self._least_squares(initial_guess, all_observations)
+        if self._fix_gaze_targets:
+            self._row_ind, self._col_ind = self._get_ind_for_jacobian_matrix()
+            result = self._least_squares(initial_guess, all_observations)
+        else:
+            result = self._least_squares_with_gaze_targets(
+                initial_guess, all_observations
+            )
         return self._get_final_output(result)
 
     def _get_indices(self):
-        """Get the indices of the parameters for the optimization"""
+        """Get the indices of the pose parameters for the optimization
+
+        Gaze targets are not part of the least-squares variables. If they are not
+        fixed, they are optimized separately, see _least_squares_with_gaze_targets()
+        """
 
         to_be_opt = np.repeat(self._opt_items, 3)
-        if not self._fix_gaze_targets:
-            to_be_opt = np.append(
-                to_be_opt, np.ones(self._gaze_targets_size, dtype=bool)
-            )
         return np.where(to_be_opt)[0]
 
     def _get_initial_guess(
@@ -105,42 +110,33 @@ class BundleAdjustment:
         except ValueError:
             row_ind, col_ind = np.where([[]])
 
-        if not self._fix_gaze_targets:
-            _row = np.repeat(
-                np.arange(self._gaze_targets_size).reshape(-1, 3), 3, axis=0
-            ).ravel()
-            ind_row = [
-                _row + self._gaze_targets_size * i
-                for i in range(self._n_spherical_cameras)
-            ]
-            ind_row = np.asarray(ind_row).ravel()
-            ind_col = np.tile(
-                np.repeat(np.arange(self._gaze_targets_size), 3),
-                self._n_spherical_cameras,
-            )
-            row_ind = np.append(row_ind, ind_row)
-            col_ind = np.append(col_ind, ind_col + self._n_poses_variables)
-
         return row_ind, col_ind
 
-    def _calculate_jacobian_matrix(self, variables, all_observations):
-        def get_jac_rot(normals, rotation):
-            jacobian = cv2.Rodrigues(rotation)[1].reshape(3, 3, 3)
-            return np.einsum("mk,ijk->mji", normals, jacobian)
-
-        def get_jac_trans(translation):
-            vectors = gaze_targets - translation
-            norms = np.linalg.norm(vectors, axis=1)
-            block = -np.einsum("ki,kj->kij", vectors, vectors)
-            block /= (norms ** 3)[:, np.newaxis, np.newaxis]
-            ones = np.eye(3)[np.newaxis] / norms[:, np.newaxis, np.newaxis]
-            block += ones
-            return block
+    @staticmethod
+    def _get_jac_rot(normals, rotation):
+        """Jacobian of the rotated observations w.r.t. the rotation vector"""
+        jacobian = cv2.Rodrigues(rotation)[1].reshape(3, 3, 3)
+        return np.einsum("mk,ijk->mji", normals, jacobian)
+
+    @staticmethod
+    def _get_jac_trans(translation, gaze_targets):
+        """Jacobian of the projected gaze targets w.r.t. the gaze targets
 
+        The Jacobian w.r.t. the translation has the opposite sign.
+        """
+        vectors = gaze_targets - translation
+        norms = np.linalg.norm(vectors, axis=1)
+        block = -np.einsum("ki,kj->kij", vectors, vectors)
+        block /= (norms ** 3)[:, np.newaxis, np.newaxis]
+        ones = np.eye(3)[np.newaxis] / norms[:, np.newaxis, np.newaxis]
+        block += ones
+        return block
+
+    def _calculate_jacobian_matrix(self, variables, all_observations):
         rotations, translations, gaze_targets = self._decompose_variables(variables)
 
         data_rot = [
-            get_jac_rot(normals, rotation)
+            self._get_jac_rot(normals, rotation)
             for normals, rotation, opt in zip(
                 all_observations,
                 rotations,
@@ -150,7 +146,7 @@ class BundleAdjustment:
         ]
         data_rot = self._toarray(data_rot).ravel()
         data_trans = [
-            get_jac_trans(translation)
+            self._get_jac_trans(translation, gaze_targets)
             for translation, opt in zip(
                 translations, self._opt_items[self._n_spherical_cameras :]
             )
@@ -159,11 +155,6 @@ class BundleAdjustment:
         data_trans = self._toarray(data_trans).ravel()
         data = np.append(data_rot, data_trans)
 
-        if not self._fix_gaze_targets:
-            data_targets = [-get_jac_trans(translation) for translation in translations]
-            data_targets = self._toarray(data_targets).ravel()
-            data = np.append(data, data_targets)
-
         n_residuals = self._gaze_targets_size * self._n_spherical_cameras
         n_variables = len(self._indices)
         jacobian_matrix = scipy_sparse.csc_matrix(
@@ -173,8 +164,6 @@ class BundleAdjustment:
 
     def _least_squares(self, initial_guess, all_observations, tol=1e-8, max_nfev=100):
         x_scale = np.ones(self._n_poses_variables)
-        if not self._fix_gaze_targets:
-            x_scale = np.append(x_scale, np.ones(self._gaze_targets_size) * 500) / 20
 
         result = scipy_optimize.least_squares(
             fun=self._compute_residuals,
@@ -190,6 +179,130 @@ class BundleAdjustment:
         )
         return result
 
+    def _least_squares_with_gaze_targets(
+        self, initial_guess, all_observations, tol=1e-8, max_nfev=100
+    ):
+        """Levenberg-Marquardt optimization of the poses and gaze targets
+
+        The residuals of a gaze target only depend on the poses and this gaze target.
+        The normal equations therefore consist of a small block for the poses, a 3x3
+        block per gaze target and the coupling between them. The pose update is solved
+        on the Schur complement of the gaze target blocks, followed by independent
+        updates of the gaze targets. The cost per iteration is linear in the number of
+        gaze targets, and in contrast to an iterative sparse solver, the updates are
+        exact.
+
+        Gaze targets are not part of the returned variables. They are kept in
+        self._current_values, see _get_final_output().
+        """
+        variables = np.array(initial_guess, dtype=np.float64)
+        gaze_targets = self._current_values[-self._gaze_targets_size :].copy()
+        residuals = self._compute_residuals(variables, all_observations)
+        cost = 0.5 * residuals @ residuals
+        nfev = 1
+        damping = 1e-3
+        status = 0
+
+        while nfev < max_nfev and status == 0:
+            jac_poses, jac_targets = self._calculate_jacobian_blocks(
+                variables, all_observations
+            )
+            n_targets = jac_targets.shape[0]
+            residuals = residuals.reshape(-1, n_targets, 3).swapaxes(0, 1)
+            residuals = residuals.reshape(n_targets, -1)
+
+            hessian_poses = np.einsum("kji,kjl->il", jac_poses, jac_poses)
+            hessian_targets = np.einsum("kji,kjl->kil", jac_targets, jac_targets)
+            hessian_coupling = np.einsum("kji,kjl->kil", jac_poses, jac_targets)
+            gradient_poses = -np.einsum("kji,kj->i", jac_poses, residuals)
+            gradient_targets = -np.einsum("kji,kj->ki", jac_targets, residuals)
+
+            diag_poses = np.maximum(np.diag(hessian_poses), np.finfo(float).eps)
+            diag_targets = np.maximum(
+                np.diagonal(hessian_targets, axis1=1, axis2=2), np.finfo(float).eps
+            )
+
+            while nfev < max_nfev:
+                damped_targets = hessian_targets + damping * (
+                    diag_targets[:, :, np.newaxis] * np.eye(3)
+                )
+                inv_damped_targets = np.linalg.inv(damped_targets)
+                coupling_inv = hessian_coupling @ inv_damped_targets
+                schur = (
+                    hessian_poses
+                    + damping * np.diag(diag_poses)
+                    - np.einsum("kij,klj->il", coupling_inv, hessian_coupling)
+                )
+                rhs = gradient_poses - np.einsum(
+                    "kij,kj->i", coupling_inv, gradient_targets
+                )
+                step_poses = np.linalg.solve(schur, rhs)
+                step_targets = np.einsum(
+                    "kij,kj->ki",
+                    inv_damped_targets,
+                    gradient_targets
+                    - np.einsum("kji,j->ki", hessian_coupling, step_poses),
+                ).ravel()
+
+                new_variables = variables + step_poses
+                self._current_values[-self._gaze_targets_size :] = (
+                    gaze_targets + step_targets
+                )
+                new_residuals = self._compute_residuals(new_variables, all_observations)
+                new_cost = 0.5 * new_residuals @ new_residuals
+                nfev += 1
+
+                if new_cost < cost:
+                    step_norm = np.linalg.norm(np.append(step_poses, step_targets))
+                    x_norm = np.linalg.norm(np.append(variables, gaze_targets))
+                    if cost - new_cost < tol * cost:
+                        status = 2
+                    elif step_norm < tol * (tol + x_norm):
+                        status = 3
+                    variables, residuals, cost = new_variables, new_residuals, new_cost
+                    gaze_targets = gaze_targets + step_targets
+                    damping /= 3
+                    break
+                damping *= 2
+
+        self._current_values[-self._gaze_targets_size :] = gaze_targets
+        return scipy_optimize.OptimizeResult(
+            x=variables, cost=cost, nfev=nfev, status=status
+        )
+
+    def _calculate_jacobian_blocks(self, variables, all_observations):
+        """Jacobians of the residuals w.r.t. the poses and w.r.t. the gaze targets
+
+        Residuals are grouped by gaze target. Returns arrays of shape
+        (n_targets, 3 * n_cameras, n_pose_variables) and (n_targets, 3 * n_cameras, 3)
+        """
+        rotations, translations, gaze_targets = self._decompose_variables(variables)
+        jac_projections = self._toarray(
+            [
+                self._get_jac_trans(translation, gaze_targets)
+                for translation in translations
+            ]
+        )
+        n_cameras, n_targets = jac_projections.shape[:2]
+        n_variables = len(self._indices)
+
+        jac_poses = np.zeros((n_cameras, n_targets, 3, n_variables))
+        columns = iter(range(0, n_variables, 3))
+        for camera_idx in range(n_cameras):
+            if self._opt_items[camera_idx]:
+                col = next(columns)
+                jac_poses[camera_idx, :, :, col : col + 3] = self._get_jac_rot(
+                    all_observations[camera_idx], rotations[camera_idx]
+                )
+        for camera_idx in range(n_cameras):
+            if self._opt_items[n_cameras + camera_idx]:
+                col = next(columns)
+                jac_poses[camera_idx, :, :, col : col + 3] = jac_projections[camera_idx]
+
+        jac_poses = jac_poses.swapaxes(0, 1).reshape(n_targets, -1, n_variables)
+        jac_targets = -jac_projections.swapaxes(0, 1).reshape(n_targets, -1, 3)
+        return jac_poses, jac_targets
+
     def _compute_residuals(self, variables, all_observations):
         rotations, translations, gaze_targets = self._decompose_variables(variables)
 
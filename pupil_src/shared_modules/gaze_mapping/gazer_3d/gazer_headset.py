@@ -22,9 +22,10 @@ from gaze_mapping.gazer_base import (
     Model,
     NotEnoughDataError,
     FitDidNotConvergeError,
+    group_match_indices,
+    match_means,
 )
 
-from methods import normalize
 from .calibrate_3d import (
     calibrate_binocular,
     calibrate_monocular,
@@ -34,8 +35,6 @@ from .utils import (
     get_eye_cam_pose_in_world,
 )
 
-from .utils import _clamp_norm_point
-
 
 logger = logging.getLogger(__name__)
 
@@ -53,15 +52,32 @@ _BINOCULAR_SPHERE_CENTER = slice(8, 11)
 _BINOCULAR_PUPIL_NORMAL = slice(11, 14)
 
 
+def _rowwise_dot(a, b):
+    return np.einsum("ij,ij->i", a, b)
+
+
+def _normalize_and_clamp(image_points, resolution):
+    """Vectorized normalize(..., flip_y=True) followed by _clamp_norm_point()"""
+    width, height = resolution
+    norm_points = image_points / (float(width), float(height))
+    norm_points[:, 1] = 1 - norm_points[:, 1]
+    norm_points = np.clip(norm_points, -100.0, 100.0)
+    return [tuple(point) for point in norm_points.tolist()]
+
+
 class Model3D(Model):
     @abc.abstractmethod
     def _fit(self, *args, **kwargs):
         pass
 
     @abc.abstractmethod
-    def _predict_single(self, x):
+    def _predict_batch(self, X) -> T.List[T.Optional[dict]]:
+        """Returns one prediction per row of X, None if the prediction failed"""
         pass
 
+    def _predict_single(self, x):
+        return self._predict_batch(x[np.newaxis])[0]
+
     def __init__(self, *, intrinsics: T.Optional[T.Any], initial_depth=500):
         self.intrinsics = intrinsics
         self.initial_depth = initial_depth
@@ -82,7 +98,7 @@ class Model3D(Model):
 
     def predict(self, X):
         assert X.ndim == 2
-        predictions = (self._predict_single(x) for x in X)
+        predictions = self._predict_batch(X)
         predictions = filter(bool, predictions)
         return predictions
 
@@ -146,44 +162,54 @@ class Model3D_Monocular(Model3D):
         self.rotation_vector = cv2.Rodrigues(self.rotation_matrix)[0]
         self.translation_vector = self.eye_camera_to_world_matrix[:3, 3]
 
-    def _predict_single(self, x):
-        assert x.ndim == 1, x
-        assert x.shape[0] == _MONOCULAR_FEATURE_COUNT, x
-        pupil_normal = x[_MONOCULAR_PUPIL_NORMAL]
-        sphere_center = x[_MONOCULAR_SPHERE_CENTER]
-        gaze_point = pupil_normal * self.gaze_distance + sphere_center
+    def _predict_batch(self, X, gaze_distances=None):
+        """
+        Args:
+            gaze_distances: Optional gaze distance per row of X. Defaults to the
+                current gaze_distance for all rows.
+        """
+        assert X.ndim == 2, X
+        assert X.shape[1] == _MONOCULAR_FEATURE_COUNT, X
+        if gaze_distances is None:
+            gaze_distances = self.gaze_distance
+        gaze_distances = np.broadcast_to(gaze_distances, (X.shape[0],))
 
-        eye_center = self._toWorld(sphere_center)
-        gaze_3d = self._toWorld(gaze_point)
-        normal_3d = np.dot(self.rotation_matrix, pupil_normal)
+        pupil_normals = X[:, _MONOCULAR_PUPIL_NORMAL]
+        sphere_centers = X[:, _MONOCULAR_SPHERE_CENTER]
+        gaze_points = pupil_normals * gaze_distances[:, np.newaxis] + sphere_centers
 
-        # Check if gaze is in front of camera. If it is not, flip direction.
-        if gaze_3d[-1] < 0:
-            gaze_3d *= -1.0
+        eye_centers = self._toWorld(sphere_centers)
+        gaze_3d = self._toWorld(gaze_points)
+        normals_3d = pupil_normals @ self.rotation_matrix.T
 
-        g = {
-            "eye_center_3d": eye_center.tolist(),
-            "gaze_normal_3d": normal_3d.tolist(),
-            "gaze_point_3d": gaze_3d.tolist(),
-        }
+        # Check if gaze is in front of camera. If it is not, flip direction.
+        gaze_3d[gaze_3d[:, -1] < 0] *= -1.0
+
+        predictions = [
+            {
+                "eye_center_3d": eye_center,
+                "gaze_normal_3d": normal_3d,
+                "gaze_point_3d": gaze_point_3d,
+            }
+            for eye_center, normal_3d, gaze_point_3d in zip(
+                eye_centers.tolist(), normals_3d.tolist(), gaze_3d.tolist()
+            )
+        ]
 
-        if self.intrinsics is not None:
-            image_point = self.intrinsics.projectPoints(
-                gaze_point[np.newaxis], self.rotation_vector, self.translation_vector
+        if self.intrinsics is not None and predictions:
+            image_points = self.intrinsics.projectPoints(
+                gaze_points, self.rotation_vector, self.translation_vector
             )
-            image_point = image_point.reshape(-1, 2)
-            image_point = normalize(
-                image_point[0], self.intrinsics.resolution, flip_y=True
+            norm_pos = _normalize_and_clamp(
+                image_points.reshape(-1, 2), self.intrinsics.resolution
             )
-            image_point = _clamp_norm_point(image_point)
-            g["norm_pos"] = image_point
+            for g, image_point in zip(predictions, norm_pos):
+                g["norm_pos"] = image_point
 
-        return g
+        return predictions
 
     def _toWorld(self, p):
-        point = np.ones(4)
-        point[:3] = p[:3]
-        return np.dot(self.eye_camera_to_world_matrix, point)[:3]
+        return p[..., :3] @ self.rotation_matrix.T + self.translation_vector
 
 
 class Model3D_Binocular(Model3D):
@@ -249,79 +275,100 @@ class Model3D_Binocular(Model3D):
             self.eye_camera_to_world_matricies[1][:3, 3],
         )
 
-    def _predict_single(self, x):
-        assert x.ndim == 1, x
-        assert x.shape[0] == _BINOCULAR_FEATURE_COUNT, x
+    def _predict_batch(self, X):
+        predictions, _ = self.predict_with_gaze_distances(X)
+        return predictions
+
+    def predict_with_gaze_distances(self, X):
+        """Predicts gaze for all rows of X and their cyclopean gaze distances.
+
+        Gaze distances are NaN if they can not be computed. `last_gaze_distance` is
+        updated to the gaze distance of the last row with a valid distance.
+        """
+        assert X.ndim == 2, X
+        assert X.shape[1] == _BINOCULAR_FEATURE_COUNT, X
         # find the nearest intersection point of the two gaze lines
         # eye ball centers in world coords
-        s1_center = self._eye1_to_World(x[_MONOCULAR_SPHERE_CENTER])
-        s0_center = self._eye0_to_World(x[_BINOCULAR_SPHERE_CENTER])
+        s1_centers = self._eye1_to_World(X[:, _MONOCULAR_SPHERE_CENTER])
+        s0_centers = self._eye0_to_World(X[:, _BINOCULAR_SPHERE_CENTER])
         # eye line of sight in world coords
-        s1_normal = np.dot(self.rotation_matricies[1], x[_MONOCULAR_PUPIL_NORMAL])
-        s0_normal = np.dot(self.rotation_matricies[0], x[_BINOCULAR_PUPIL_NORMAL])
+        s1_normals = X[:, _MONOCULAR_PUPIL_NORMAL] @ self.rotation_matricies[1].T
+        s0_normals = X[:, _BINOCULAR_PUPIL_NORMAL] @ self.rotation_matricies[0].T
 
         # See Lech Swirski: "Gaze estimation on glasses-based stereoscopic displays"
         # Chapter: 7.4.2 Cyclopean gaze estimate
 
         # the cyclop is the avg of both lines of sight
-        cyclop_normal = (s0_normal + s1_normal) / 2.0
-        cyclop_center = (s0_center + s1_center) / 2.0
+        cyclop_normals = (s0_normals + s1_normals) / 2.0
+        cyclop_centers = (s0_centers + s1_centers) / 2.0
 
         # We use it to define a viewing plane.
-        gaze_plane = np.cross(cyclop_normal, s1_center - s0_center)
-        gaze_plane = gaze_plane / np.linalg.norm(gaze_plane)
+        gaze_planes = np.cross(cyclop_normals, s1_centers - s0_centers)
+        gaze_planes /= np.linalg.norm(gaze_planes, axis=1, keepdims=True)
 
         # project lines of sight onto the gaze plane
-        s0_norm_on_plane = s0_normal - np.dot(gaze_plane, s0_normal) * gaze_plane
-        s1_norm_on_plane = s1_normal - np.dot(gaze_plane, s1_normal) * gaze_plane
+        s0_norms_on_plane = (
+            s0_normals
+            - _rowwise_dot(gaze_planes, s0_normals)[:, np.newaxis] * gaze_planes
+        )
+        s1_norms_on_plane = (
+            s1_normals
+            - _rowwise_dot(gaze_planes, s1_normals)[:, np.newaxis] * gaze_planes
+        )
 
         # create gaze lines on this plane
-        gaze_line0 = [s0_center, s0_center + s0_norm_on_plane]
-        gaze_line1 = [s1_center, s1_center + s1_norm_on_plane]
+        gaze_lines0 = np.stack([s0_centers, s0_centers + s0_norms_on_plane], axis=1)
+        gaze_lines1 = np.stack([s1_centers, s1_centers + s1_norms_on_plane], axis=1)
 
         # find the intersection of left and right line of sight.
-        (
-            nearest_intersection_point,
-            intersection_distance,
-        ) = math_helper.nearest_intersection(gaze_line0, gaze_line1)
-
-        if nearest_intersection_point is None:
-            return None
+        intersection_points, _ = math_helper.nearest_intersections(
+            gaze_lines0, gaze_lines1
+        )
 
         # Check if gaze is in front of camera. If it is not, flip direction.
-        if nearest_intersection_point[-1] < 0:
-            nearest_intersection_point *= -1.0
+        intersection_points[intersection_points[:, -1] < 0] *= -1.0
+
+        gaze_distances = np.full(X.shape[0], np.nan)
+        if self.intrinsics is not None and X.shape[0]:
+            cyclop_gazes = intersection_points - cyclop_centers
+            gaze_distances = np.sqrt(_rowwise_dot(cyclop_gazes, cyclop_gazes))
+            image_points = self.intrinsics.projectPoints(intersection_points)
+            norm_pos = _normalize_and_clamp(
+                image_points.reshape(-1, 2), self.intrinsics.resolution
+            )
 
-        g = {
-            "eye_centers_3d": {"0": s0_center.tolist(), "1": s1_center.tolist()},
-            "gaze_normals_3d": {"0": s0_normal.tolist(), "1": s1_normal.tolist()},
-            "gaze_point_3d": nearest_intersection_point.tolist(),
-        }
+        predictions = [
+            {
+                "eye_centers_3d": {"0": s0_center, "1": s1_center},
+                "gaze_normals_3d": {"0": s0_normal, "1": s1_normal},
+                "gaze_point_3d": gaze_point_3d,
+            }
+            for s0_center, s1_center, s0_normal, s1_normal, gaze_point_3d in zip(
+                s0_centers.tolist(),
+                s1_centers.tolist(),
+                s0_normals.tolist(),
+                s1_normals.tolist(),
+                intersection_points.tolist(),
+            )
+        ]
 
         if self.intrinsics is not None:
-            cyclop_gaze = nearest_intersection_point - cyclop_center
-            self.last_gaze_distance = np.sqrt(cyclop_gaze.dot(cyclop_gaze))
-            image_point = self.intrinsics.projectPoints(
-                np.array([nearest_intersection_point])
-            )
-            image_point = image_point.reshape(-1, 2)
-            image_point = normalize(
-                image_point[0], self.intrinsics.resolution, flip_y=True
-            )
-            image_point = _clamp_norm_point(image_point)
-            g["norm_pos"] = image_point
+            for g, image_point in zip(predictions, norm_pos):
+                g["norm_pos"] = image_point
+
+        valid_distances = gaze_distances[np.isfinite(gaze_distances)]
+        if valid_distances.size:
+            self.last_gaze_distance = valid_distances[-1]
 
-        return g
+        return predictions, gaze_distances
 
     def _eye0_to_World(self, p):
-        point = np.ones(4)
-        point[:3] = p[:3]
-        return np.dot(self.eye_camera_to_world_matricies[0], point)[:3]
+        matrix = self.eye_camera_to_world_matricies[0]
+        return p[..., :3] @ matrix[:3, :3].T + matrix[:3, 3]
 
     def _eye1_to_World(self, p):
-        point = np.ones(4)
-        point[:3] = p[:3]
-        return np.dot(self.eye_camera_to_world_matricies[1], point)[:3]
+        matrix = self.eye_camera_to_world_matricies[1]
+        return p[..., :3] @ matrix[:3, :3].T + matrix[:3, 3]
 
 
 class Gazer3D(GazerBase):
@@ -421,6 +468,94 @@ class Gazer3D(GazerBase):
                 )
                 yield gaze_pos
 
+    def predict_batch(
+        self, matched_pupil_data: T.Iterable[T.List["Pupil"]]
+    ) -> T.Iterator["Gaze"]:
+        matched_pupil_data = list(matched_pupil_data)
+        indices = group_match_indices(matched_pupil_data)
+        predictions = [None] * len(matched_pupil_data)
+
+        # Monocular models use the gaze distance of the most recent binocular
+        # prediction. Keep track of it per match to replicate sequential mapping.
+        binocular_idc = np.empty(0, dtype=np.int64)
+        binocular_distances = np.empty(0)
+        previous_gaze_distance = getattr(
+            self.binocular_model, "last_gaze_distance", None
+        )
+
+        if indices.binocular:
+            if self.binocular_model.is_fitted:
+                matches = [matched_pupil_data[idx] for idx in indices.binocular]
+                right = self._extract_pupil_features([m[0] for m in matches])
+                left = self._extract_pupil_features([m[1] for m in matches])
+                X = np.hstack([left, right])
+                (
+                    gaze_positions,
+                    distances,
+                ) = self.binocular_model.predict_with_gaze_distances(X)
+                self._assign_predictions(
+                    predictions,
+                    indices.binocular,
+                    gaze_positions,
+                    matched_pupil_data,
+                    "gaze.3d.01.",
+                )
+                valid = np.isfinite(distances)
+                binocular_idc = np.asarray(indices.binocular)[valid]
+                binocular_distances = distances[valid]
+            else:
+                logger.debug("Prediction failed because binocular model is not fitted")
+
+        buckets = (
+            (indices.right, self.right_model, "right", "gaze.3d.0."),
+            (indices.left, self.left_model, "left", "gaze.3d.1."),
+        )
+        for bucket, model, model_name, topic in buckets:
+            if not bucket:
+                continue
+            if not model.is_fitted:
+                logger.debug(
+                    f"Prediction failed because {model_name} model is not fitted"
+                )
+                continue
+            gaze_distances = None
+            if model.binocular_model is not None and model.binocular_model.is_fitted:
+                gaze_distances = np.full(len(bucket), previous_gaze_distance, float)
+                preceding = np.searchsorted(binocular_idc, bucket) - 1
+                has_preceding = preceding >= 0
+                gaze_distances[has_preceding] = binocular_distances[
+                    preceding[has_preceding]
+                ]
+            X = self._extract_pupil_features(
+                [matched_pupil_data[idx][0] for idx in bucket]
+            )
+            gaze_positions = model._predict_batch(X, gaze_distances)
+            self._assign_predictions(
+                predictions, bucket, gaze_positions, matched_pupil_data, topic
+            )
+
+        yield from (gaze_datum for gaze_datum in predictions if gaze_datum)
+
+    @staticmethod
+    def _assign_predictions(predictions, bucket, gaze_positions, matches, topic):
+        bucket_matches = [matches[idx] for idx in bucket]
+        confidences = match_means(bucket_matches, "confidence")
+        timestamps = match_means(bucket_matches, "timestamp")
+        for idx, gaze_pos, confidence, timestamp in zip(
+            bucket, gaze_positions, confidences, timestamps
+        ):
+            if not gaze_pos:
+                continue
+            gaze_pos.update(
+                {
+                    "topic": topic,
+                    "confidence": confidence,
+                    "timestamp": timestamp,
+                    "base_data": matches[idx],
+                }
+            )
+            predictions[idx] = gaze_pos
+
     def filter_pupil_data(
         self, pupil_data: T.Iterable, confidence_threshold: T.Optional[float] = None
     ) -> T.Iterable:
@@ -20,7 +20,7 @@ import numpy as np
 from plugin import Plugin
 import file_methods as fm
 
-from .matching import RealtimeMatcher
+from .matching import OfflineMatcher, RealtimeMatcher
 from .notifications import (
     CalibrationSuccessNotification,
     CalibrationFailureNotification,
@@ -96,6 +96,10 @@ class Model(abc.ABC):
 class GazerBase(abc.ABC, Plugin):
     label: str = ...  # Subclasses should set this to a meaningful name
     uniqueness = "by_base_class"
+    # Maximum number of pupil matches passed to predict_batch() at once
+    prediction_batch_size: int = 4096
+    # Increase when the mapping results change, invalidates cached gaze mappings
+    gazer_version: int = 1
 
     @classmethod
     def _gazer_description_text(cls) -> str:
@@ -127,6 +131,17 @@ class GazerBase(abc.ABC, Plugin):
     ) -> T.Iterator["Gaze"]:
         pass
 
+    def predict_batch(
+        self, matched_pupil_data: T.Iterable[T.List["Pupil"]]
+    ) -> T.Iterator["Gaze"]:
+        """Predicts gaze for a whole batch of pupil matches
+
+        Overwrite to evaluate the models once per kind of match (binocular, right,
+        left) instead of once per match. Gaze must be yielded in the order of the
+        matches.
+        """
+        yield from self.predict(matched_pupil_data)
+
     def filter_pupil_data(
         self, pupil_data: T.Iterable, confidence_threshold: T.Optional[float] = None
     ) -> T.Iterable:
@@ -363,18 +378,67 @@ class GazerBase(abc.ABC, Plugin):
         X = self._extract_pupil_features(pupil)
         return X, Y
 
-    def map_pupil_to_gaze(self, pupil_data, sort_by_creation_time=True):
+    def map_pupil_to_gaze(self, pupil_data, sort_by_creation_time=True, offline=False):
+        """Maps pupil data to gaze
+
+        Keyword Arguments:
+            offline {bool} -- Match all pupil data at once instead of passing it
+                through the realtime matcher. The matches are the same as from a
+                newly initialized realtime matcher. (default: {False})
+        """
         pupil_data = self.filter_pupil_data(pupil_data)
         if sort_by_creation_time:
             pupil_data.sort(key=lambda p: p["timestamp"])
 
-        matches = (self.matcher.on_pupil_datum(datum) for datum in pupil_data)
-        matches = itertools.chain.from_iterable(matches)
+        if offline:
+            matches = iter(OfflineMatcher().match(pupil_data))
+        else:
+            matches = (self.matcher.on_pupil_datum(datum) for datum in pupil_data)
+            matches = itertools.chain.from_iterable(matches)
 
-        yield from self.predict(matches)
+        while True:
+            batch = list(itertools.islice(matches, self.prediction_batch_size))
+            if not batch:
+                break
+            yield from self.predict_batch(batch)
 
 
 class Matches(T.NamedTuple):
     left: object
     right: object
     binocular: object
+
+
+class MatchIndices(T.NamedTuple):
+    left: T.List[int]
+    right: T.List[int]
+    binocular: T.List[int]
+
+
+def group_match_indices(matched_pupil_data: T.Sequence[T.List["Pupil"]]):
+    """Groups the indices of pupil matches by kind of match
+
+    Binocular matches are ordered [eye0 (right), eye1 (left)].
+    """
+    left, right, binocular = [], [], []
+    for idx, pupil_match in enumerate(matched_pupil_data):
+        num_matched = len(pupil_match)
+        if num_matched == 2:
+            binocular.append(idx)
+        elif num_matched == 1:
+            eye_id = pupil_match[0]["id"]
+            if eye_id == 0:
+                right.append(idx)
+            elif eye_id == 1:
+                left.append(idx)
+        else:
+            raise ValueError(f"Unexpected number of matched pupil_data: {num_matched}")
+    return MatchIndices(left, right, binocular)
+
+
+def match_means(pupil_matches: T.Sequence[T.List["Pupil"]], key: str) -> np.ndarray:
+    """Mean of `key` per pupil match, for matches of equal length"""
+    if not pupil_matches:
+        return np.empty(0)
+    values = np.array([[p[key] for p in match] for match in pupil_matches])
+    return values.mean(axis=1)
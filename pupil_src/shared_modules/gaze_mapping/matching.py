@@ -12,6 +12,7 @@ import typing as T
 from collections import deque
 
 import numpy as np
+import scipy.signal
 
 
 class RealtimeMatcher:
@@ -26,7 +27,9 @@ class RealtimeMatcher:
         return len(cache) >= 2
 
     def estimate_frame_rate_raw(self, cache):
-        return np.mean(np.diff([d["timestamp"] for d in cache]))
+        # The mean of the differences of consecutive timestamps only depends on the
+        # first and the last timestamp in the cache.
+        return (cache[-1]["timestamp"] - cache[0]["timestamp"]) / (len(cache) - 1)
 
     def estimate_framerate_smoothed(self, eye0_cache, eye1_cache):
         if self.is_cache_valid(eye0_cache) and self.is_cache_valid(eye1_cache):
@@ -100,3 +103,161 @@ class RealtimeMatcher:
         elif len(self._caches[1]) > self.sample_cutoff:
             p = self._caches[1].popleft()
             yield [p]
+
+
+class OfflineMatcher:
+    """Matches a complete, timestamp-sorted sequence of pupil data at once.
+
+    Produces the same matches as feeding the data one by one into a new
+    RealtimeMatcher. The order in which the caches are consumed does not depend
+    on the estimated framerate, only on confidences, cache sizes and timestamp
+    order. It is replayed in a single pass over index pointers. The framerate
+    estimation and the temporal cutoff checks are evaluated vectorized afterwards.
+    """
+
+    _MONOCULAR = -1
+
+    def __init__(self):
+        self.min_pupil_confidence = 0.6
+        self.initial_framerate = 1 / 120
+        self.framerate_estimation_smoothing_factor = 1 / 50
+        self.sample_cutoff = 10
+
+    def match(self, pupil_data: T.Sequence) -> T.List[T.List]:
+        """Returns the pupil matches, lists with either one or two pupil datums."""
+        eye_ids = np.fromiter((p["id"] for p in pupil_data), dtype=np.int64)
+        timestamps = np.fromiter((p["timestamp"] for p in pupil_data), dtype=float)
+        confidences = np.fromiter((p["confidence"] for p in pupil_data), dtype=float)
+        first, second = self.match_indices(eye_ids, timestamps, confidences)
+        return [
+            [pupil_data[a]] if b == self._MONOCULAR else [pupil_data[a], pupil_data[b]]
+            for a, b in zip(first.tolist(), second.tolist())
+        ]
+
+    def match_indices(
+        self, eye_ids: np.ndarray, timestamps: np.ndarray, confidences: np.ndarray
+    ) -> T.Tuple[np.ndarray, np.ndarray]:
+        """Matches pupil data given as arrays, sorted by timestamp.
+
+        Returns:
+            Two index arrays into the input with one entry per match. Binocular
+            matches are (eye0 index, eye1 index), monocular matches have -1 as
+            second index.
+        """
+        eye_idc = [np.flatnonzero(eye_ids == eye_id) for eye_id in (0, 1)]
+        eye_ts = [timestamps[idc] for idc in eye_idc]
+        schedule = self._replay_cache_schedule(eye_ids, eye_idc, eye_ts, confidences)
+        steps, kinds, pos0, pos1, heads, tails = schedule
+
+        cutoffs = 2 * self._smoothed_framerates(eye_ts, heads, tails)[steps]
+
+        binocular = kinds == 2
+        pos0_bino, pos1_bino = pos0[binocular], pos1[binocular]
+        ts0, ts1 = eye_ts[0][pos0_bino], eye_ts[1][pos1_bino]
+        within_cutoff = np.abs(ts0 - ts1) < cutoffs[binocular]
+
+        first = np.empty(len(kinds), dtype=np.int64)
+        second = np.full(len(kinds), self._MONOCULAR, dtype=np.int64)
+        monocular0, monocular1 = kinds == 0, kinds == 1
+        first[monocular0] = eye_idc[0][pos0[monocular0]]
+        first[monocular1] = eye_idc[1][pos1[monocular1]]
+
+        # pairs outside of the temporal cutoff only map the older datum
+        older_is_eye0 = ts0 < ts1
+        first_bino = np.where(
+            within_cutoff | older_is_eye0,
+            eye_idc[0][pos0_bino],
+            eye_idc[1][pos1_bino],
+        )
+        second_bino = np.where(within_cutoff, eye_idc[1][pos1_bino], self._MONOCULAR)
+        first[binocular] = first_bino
+        second[binocular] = second_bino
+        return first, second
+
+    def _replay_cache_schedule(self, eye_ids, eye_idc, eye_ts, confidences):
+        """Replays which cached datum RealtimeMatcher.on_pupil_datum() consumes.
+
+        Returns per match its step (input index), its kind (0/1: monocular eye0/1
+        datum, 2: binocular candidate pair) and the cache positions of the eye0 and
+        eye1 datums. Also returns the cache heads and tails per step, after adding
+        the step's datum, for framerate estimation.
+        """
+        conf0, conf1 = (confidences[idc].tolist() for idc in eye_idc)
+        ts0, ts1 = (ts.tolist() for ts in eye_ts)
+        min_conf = self.min_pupil_confidence
+        sample_cutoff = self.sample_cutoff
+
+        steps, kinds, popped_eye0 = [], [], []
+        h0 = h1 = t0 = t1 = 0
+        for step, eye_id in enumerate(eye_ids.tolist()):
+            if eye_id == 0:
+                t0 += 1
+            else:
+                t1 += 1
+
+            if h0 < t0 and conf0[h0] < min_conf:
+                kind = 0
+            elif h1 < t1 and conf1[h1] < min_conf:
+                kind = 1
+            elif h0 < t0 and h1 < t1:
+                kind = 2
+            elif t0 - h0 > sample_cutoff:
+                kind = 0
+            elif t1 - h1 > sample_cutoff:
+                kind = 1
+            else:
+                continue
+
+            steps.append(step)
+            kinds.append(kind)
+            pop_eye0 = kind == 0 or (kind == 2 and ts0[h0] < ts1[h1])
+            popped_eye0.append(pop_eye0)
+            if pop_eye0:
+                h0 += 1
+            else:
+                h1 += 1
+
+        steps = np.array(steps, dtype=np.int64)
+        kinds = np.array(kinds, dtype=np.int64)
+        popped_eye0 = np.array(popped_eye0, dtype=bool)
+
+        all_steps = np.arange(len(eye_ids))
+        tails = np.stack([np.cumsum(eye_ids == eye_id) for eye_id in (0, 1)], axis=1)
+        # cache heads before the step's pop, i.e. the number of earlier pops
+        heads = np.stack(
+            [
+                np.searchsorted(steps[popped_eye0], all_steps),
+                np.searchsorted(steps[~popped_eye0], all_steps),
+            ],
+            axis=1,
+        )
+        pos0 = np.where(kinds == 1, -1, heads[steps, 0])
+        pos1 = np.where(kinds == 0, -1, heads[steps, 1])
+        return steps, kinds, pos0, pos1, heads, tails
+
+    def _smoothed_framerates(self, eye_ts, heads, tails) -> np.ndarray:
+        """Smoothed framerate estimate per step, see RealtimeMatcher."""
+        raw_framerates = np.full((len(heads), 2), np.nan)
+        for eye_id in (0, 1):
+            head, tail = heads[:, eye_id], tails[:, eye_id]
+            valid = tail - head >= 2
+            # mean of the timestamp differences in the cache
+            raw_framerates[valid, eye_id] = (
+                eye_ts[eye_id][tail[valid] - 1] - eye_ts[eye_id][head[valid]]
+            ) / (tail[valid] - head[valid] - 1)
+        estimated = np.fmax(raw_framerates[:, 0], raw_framerates[:, 1])
+
+        updated_steps = np.flatnonzero(np.isfinite(estimated))
+        if not updated_steps.size:
+            return np.full(len(heads), self.initial_framerate)
+
+        alpha = self.framerate_estimation_smoothing_factor
+        smoothed, _ = scipy.signal.lfilter(
+            [alpha],
+            [1, alpha - 1],
+            estimated[updated_steps],
+            zi=[(1 - alpha) * self.initial_framerate],
+        )
+        last_update = np.searchsorted(updated_steps, np.arange(len(heads)), "right")
+        smoothed = np.concatenate(([self.initial_framerate], smoothed))
+        return smoothed[last_update]
@@ -34,8 +34,11 @@ def _filter_pupil_list_by_confidence(pupil_list, threshold):
 def _match_data_batch(pupil_list, ref_list):
     assert pupil_list, "No pupil data to match"
     assert ref_list, "No reference data to match"
-    pupil0 = [p for p in pupil_list if p["id"] == 0]
-    pupil1 = [p for p in pupil_list if p["id"] == 1]
+    pupil_ids = np.fromiter(
+        (p["id"] for p in pupil_list), dtype=np.int64, count=len(pupil_list)
+    )
+    pupil0 = [pupil_list[idx] for idx in np.flatnonzero(pupil_ids == 0)]
+    pupil1 = [pupil_list[idx] for idx in np.flatnonzero(pupil_ids == 1)]
 
     matched_binocular_data = closest_matches_binocular_batch(ref_list, pupil0, pupil1)
     matched_pupil0_data = closest_matches_monocular_batch(ref_list, pupil0)
@@ -56,33 +59,69 @@ def _match_data_batch(pupil_list, ref_list):
     )
 
 
+def closest_match_indices_binocular(
+    ref_ts, pupil0_ts, pupil1_ts, max_dispersion=1 / 15.0
+):
+    """Get indices of pupil timestamps closest to the reference timestamps.
+    Return index arrays (ref, pupil0, pupil1) of the matches within max_dispersion.
+    """
+    ref_ts = np.asarray(ref_ts, dtype=np.float64)
+    pupil0_ts = np.asarray(pupil0_ts, dtype=np.float64)
+    pupil1_ts = np.asarray(pupil1_ts, dtype=np.float64)
+    if not (len(ref_ts) and len(pupil0_ts) and len(pupil1_ts)):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    closest_p0_idc = _find_nearest_idc(pupil0_ts, ref_ts)
+    closest_p1_idc = _find_nearest_idc(pupil1_ts, ref_ts)
+    matched_ts = np.stack(
+        (pupil0_ts[closest_p0_idc], pupil1_ts[closest_p1_idc], ref_ts)
+    )
+    dispersion = matched_ts.max(axis=0) - matched_ts.min(axis=0)
+    ref_idc = np.flatnonzero(dispersion < max_dispersion)
+
+    num_rejected = len(ref_ts) - len(ref_idc)
+    if num_rejected:
+        logger.debug(
+            f"{num_rejected} binocular matches rejected due to time dispersion "
+            "criterion"
+        )
+    return ref_idc, closest_p0_idc[ref_idc], closest_p1_idc[ref_idc]
+
+
+def closest_match_indices_monocular(ref_ts, pupil_ts, max_dispersion=1 / 15.0):
+    """Get indices of pupil timestamps closest to the reference timestamps.
+    Return index arrays (ref, pupil) of the matches within max_dispersion.
+    """
+    ref_ts = np.asarray(ref_ts, dtype=np.float64)
+    pupil_ts = np.asarray(pupil_ts, dtype=np.float64)
+    if not (len(ref_ts) and len(pupil_ts)):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    closest_p_idc = _find_nearest_idc(pupil_ts, ref_ts)
+    dispersion = np.abs(pupil_ts[closest_p_idc] - ref_ts)
+    ref_idc = np.flatnonzero(dispersion < max_dispersion)
+    return ref_idc, closest_p_idc[ref_idc]
+
+
 def closest_matches_binocular_batch(ref_pts, pupil0, pupil1, max_dispersion=1 / 15.0):
     """Get pupil positions closest in time to ref points.
     Return list of dict with matching ref, pupil0 and pupil1 data triplets.
     """
 
+    ref_pts, pupil0, pupil1 = list(ref_pts), list(pupil0), list(pupil1)
+
     matched = [[], [], []]
     if not (ref_pts and pupil0 and pupil1):
         return matched
 
-    pupil0_ts = np.array([p["timestamp"] for p in pupil0])
-    pupil1_ts = np.array([p["timestamp"] for p in pupil1])
-
-    for r in ref_pts:
-        closest_p0_idx = _find_nearest_idx(pupil0_ts, r["timestamp"])
-        closest_p0 = pupil0[closest_p0_idx]
-        closest_p1_idx = _find_nearest_idx(pupil1_ts, r["timestamp"])
-        closest_p1 = pupil1[closest_p1_idx]
-
-        dispersion = max(
-            closest_p0["timestamp"], closest_p1["timestamp"], r["timestamp"]
-        ) - min(closest_p0["timestamp"], closest_p1["timestamp"], r["timestamp"])
-        if dispersion < max_dispersion:
-            matched[0].append(r)
-            matched[1].append(closest_p0)
-            matched[2].append(closest_p1)
-        else:
-            logger.debug("Binocular match rejected due to time dispersion criterion")
+    ref_idc, p0_idc, p1_idc = closest_match_indices_binocular(
+        _timestamps(ref_pts), _timestamps(pupil0), _timestamps(pupil1), max_dispersion
+    )
+    matched[0] = [ref_pts[idx] for idx in ref_idc]
+    matched[1] = [pupil0[idx] for idx in p0_idc]
+    matched[2] = [pupil1[idx] for idx in p1_idc]
     return matched
 
 
@@ -91,27 +130,18 @@ def closest_matches_binocular(ref_pts, pupil0, pupil1, max_dispersion=1 / 15.0):
     Return list of dict with matching ref, pupil0 and pupil1 data triplets.
     """
 
+    ref_pts, pupil0, pupil1 = list(ref_pts), list(pupil0), list(pupil1)
+
     if not (ref_pts and pupil0 and pupil1):
         return []
 
-    pupil0_ts = np.array([p["timestamp"] for p in pupil0])
-    pupil1_ts = np.array([p["timestamp"] for p in pupil1])
-
-    matched = []
-    for r in ref_pts:
-        closest_p0_idx = _find_nearest_idx(pupil0_ts, r["timestamp"])
-        closest_p0 = pupil0[closest_p0_idx]
-        closest_p1_idx = _find_nearest_idx(pupil1_ts, r["timestamp"])
-        closest_p1 = pupil1[closest_p1_idx]
-
-        dispersion = max(
-            closest_p0["timestamp"], closest_p1["timestamp"], r["timestamp"]
-        ) - min(closest_p0["timestamp"], closest_p1["timestamp"], r["timestamp"])
-        if dispersion < max_dispersion:
-            matched.append({"ref": r, "pupil": closest_p0, "pupil1": closest_p1})
-        else:
-            logger.debug("Binocular match rejected due to time dispersion criterion")
-    return matched
+    ref_idc, p0_idc, p1_idc = closest_match_indices_binocular(
+        _timestamps(ref_pts), _timestamps(pupil0), _timestamps(pupil1), max_dispersion
+    )
+    return [
+        {"ref": ref_pts[r], "pupil": pupil0[p0], "pupil1": pupil1[p1]}
+        for r, p0, p1 in zip(ref_idc, p0_idc, p1_idc)
+    ]
 
 
 def closest_matches_monocular(ref_pts, pupil, max_dispersion=1 / 15.0):
@@ -119,21 +149,15 @@ def closest_matches_monocular(ref_pts, pupil, max_dispersion=1 / 15.0):
     Return list of dict with matching ref and pupil datum.
     """
 
+    ref_pts, pupil = list(ref_pts), list(pupil)
+
     if not (ref_pts and pupil):
         return []
 
-    pupil_ts = np.array([p["timestamp"] for p in pupil])
-
-    matched = []
-    for r in ref_pts:
-        closest_p_idx = _find_nearest_idx(pupil_ts, r["timestamp"])
-        closest_p = pupil[closest_p_idx]
-        dispersion = max(closest_p["timestamp"], r["timestamp"]) - min(
-            closest_p["timestamp"], r["timestamp"]
-        )
-        if dispersion < max_dispersion:
-            matched.append({"ref": r, "pupil": closest_p})
-    return matched
+    ref_idc, p_idc = closest_match_indices_monocular(
+        _timestamps(ref_pts), _timestamps(pupil), max_dispersion
+    )
+    return [{"ref": ref_pts[r], "pupil": pupil[p]} for r, p in zip(ref_idc, p_idc)]
 
 
 def closest_matches_monocular_batch(ref_pts, pupil, max_dispersion=1 / 15.0):
@@ -141,32 +165,33 @@ def closest_matches_monocular_batch(ref_pts, pupil, max_dispersion=1 / 15.0):
     Return list of dict with matching ref and pupil datum.
     """
 
+    ref_pts, pupil = list(ref_pts), list(pupil)
+
     matched = [[], []]
     if not (ref_pts and pupil):
         return matched
 
-    pupil_ts = np.array([p["timestamp"] for p in pupil])
-
-    for r in ref_pts:
-        closest_p_idx = _find_nearest_idx(pupil_ts, r["timestamp"])
-        closest_p = pupil[closest_p_idx]
-        dispersion = max(closest_p["timestamp"], r["timestamp"]) - min(
-            closest_p["timestamp"], r["timestamp"]
-        )
-        if dispersion < max_dispersion:
-            matched[0].append(r)
-            matched[1].append(closest_p)
+    ref_idc, p_idc = closest_match_indices_monocular(
+        _timestamps(ref_pts), _timestamps(pupil), max_dispersion
+    )
+    matched[0] = [ref_pts[idx] for idx in ref_idc]
+    matched[1] = [pupil[idx] for idx in p_idc]
     return matched
 
 
-def _find_nearest_idx(array, value):
-    """Find the index of the element in array which is closest to value"""
+def _timestamps(data):
+    return np.fromiter(
+        (d["timestamp"] for d in data), dtype=np.float64, count=len(data)
+    )
 
-    idx = np.searchsorted(array, value, side="left")
-    try:
-        if abs(value - array[idx - 1]) < abs(value - array[idx]):
-            return idx - 1
-        else:
-            return idx
-    except IndexError:
-        return idx - 1
+
+def _find_nearest_idc(array, values):
+    """Find the indices of the elements in array which are closest to values"""
+
+    idc = np.searchsorted(array, values, side="left")
+    right_idc = np.minimum(idc, len(array) - 1)
+    left_idc = np.maximum(idc - 1, 0)
+    left_is_closer = np.abs(values - array[left_idc]) < np.abs(
+        values - array[right_idc]
+    )
+    return np.where(left_is_closer, left_idc, right_idc)
@@ -10,6 +10,11 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 
+import typing as T
+
+from tasklib.graph import TaskGraph
+
+
 class CalculateAllController:
     def __init__(
         self,
@@ -19,6 +24,8 @@ class CalculateAllController:
         calibration_storage,
         gaze_mapper_controller,
         gaze_mapper_storage,
+        task_manager,
+        max_workers: T.Optional[int] = None,
     ):
         self._reference_detection_controller = reference_detection_controller
         self._reference_location_storage = reference_location_storage
@@ -26,17 +33,29 @@ class CalculateAllController:
         self._calibration_storage = calibration_storage
         self._gaze_mapper_controller = gaze_mapper_controller
         self._gaze_mapper_storage = gaze_mapper_storage
+        self._task_manager = task_manager
+        self._max_workers = max_workers
+        self._task_graph = None
+
+    @property
+    def status(self):
+        if self._task_graph is None:
+            return "Not started"
+        state = "Running" if self._task_graph.running else "Done"
+        return (
+            f"{state}: {self._task_graph.ended_node_count} of "
+            f"{len(self._task_graph)} steps ended "
+            f"({self._task_graph.progress * 100:.0f}%)"
+        )
 
     def calculate_all(self):
         """
         Detect reference locations if none available. Then (re)calculate all
         calibrations and gaze mappers.
         """
-        if self._reference_location_storage.is_empty:
-            task = self._reference_detection_controller.start_detection()
-            task.add_observer("on_completed", self._on_reference_detection_completed)
-        else:
-            self._calculate_all_calibrations()
+        self._start_task_graph(
+            detect_references=self._reference_location_storage.is_empty
+        )
 
     def calculate_all_if_references_available(self):
         """
@@ -44,32 +63,68 @@ class CalculateAllController:
         available.
         """
         if not self._reference_location_storage.is_empty:
-            self._calculate_all_calibrations()
+            self._start_task_graph(detect_references=False)
 
-    def _on_reference_detection_completed(self, _):
-        self._calculate_all_calibrations()
+    def _start_task_graph(self, detect_references):
+        """
+        Reference detection, calibrations and gaze mappers run as soon as the steps
+        they depend on completed, independent steps run concurrently. Mappers
+        validate themselves once their mapping completed.
+
+        Gaze mappers map in several processes. The workers of the graph are split
+        between them, such that all mappers can run at the same time.
+        """
+        graph = TaskGraph(max_workers=self._max_workers)
+        gaze_mapper_count = sum(
+            len(self._gaze_mappers_based_on_calibration(calibration))
+            for calibration in self._calibration_storage
+        )
+        workers_per_gaze_mapper = max(1, graph.max_workers // max(1, gaze_mapper_count))
+        reference_dependencies = ()
+        if detect_references:
+            graph.add_node(
+                "reference_detection",
+                self._reference_detection_controller.start_detection,
+            )
+            reference_dependencies = ("reference_detection",)
 
-    def _calculate_all_calibrations(self):
         for calibration in self._calibration_storage:
             calculation_possible = (
                 self._calibration_controller.is_from_same_recording(calibration)
                 and calibration.is_offline_calibration
             )
+            calibration_dependencies = ()
             if calculation_possible:
-                task = self._calibration_controller.calculate(calibration)
-                if not task:
-                    continue
-                task.add_observer(
-                    "on_completed",
-                    self._create_calibration_complete_handler(calibration),
+                graph.add_node(
+                    calibration.unique_id,
+                    self._create_calibration_start_function(calibration),
+                    dependencies=reference_dependencies,
+                )
+                calibration_dependencies = (calibration.unique_id,)
+            for gaze_mapper in self._gaze_mappers_based_on_calibration(calibration):
+                graph.add_node(
+                    gaze_mapper.unique_id,
+                    self._create_gaze_mapper_start_function(
+                        gaze_mapper, workers_per_gaze_mapper
+                    ),
+                    dependencies=calibration_dependencies,
+                    worker_count=workers_per_gaze_mapper,
                 )
-            else:
-                self._calculate_gaze_mappers_based_on_calibration(calibration)
 
-    def _create_calibration_complete_handler(self, calibration):
-        return lambda _: self._calculate_gaze_mappers_based_on_calibration(calibration)
+        self._task_graph = graph
+        self._task_manager.add_task(graph, identifier="calculate_all")
+
+    def _create_calibration_start_function(self, calibration):
+        return lambda: self._calibration_controller.calculate(calibration)
+
+    def _create_gaze_mapper_start_function(self, gaze_mapper, max_workers):
+        return lambda: self._gaze_mapper_controller.calculate(
+            gaze_mapper, max_workers=max_workers
+        )
 
-    def _calculate_gaze_mappers_based_on_calibration(self, calibration):
-        for gaze_mapper in self._gaze_mapper_storage:
-            if gaze_mapper.calibration_unique_id == calibration.unique_id:
-                self._gaze_mapper_controller.calculate(gaze_mapper)
+    def _gaze_mappers_based_on_calibration(self, calibration):
+        return [
+            gaze_mapper
+            for gaze_mapper in self._gaze_mapper_storage
+            if gaze_mapper.calibration_unique_id == calibration.unique_id
+        ]
@@ -42,9 +42,7 @@ class CalibrationController(Observable):
                 self._calibration_storage.save_to_disk()
                 self.on_calibration_computed(calibration)
 
-        if len(self._reference_location_storage.items) == 0:
-            error_message = f"You first need to detect reference locations before calculating the calibration '{calibration.name}'"
-            self._abort_calculation(calibration, error_message)
+        if not self._check_reference_locations_available(calibration):
             return None
         task = worker.create_calibration.create_task(
             calibration, all_reference_locations=self._reference_location_storage
@@ -56,6 +54,47 @@ class CalibrationController(Observable):
         )
         return task
 
+    def calculate_best_method(self, calibration):
+        """Calculates the calibration with all gaze mapping methods and several
+        minimum pupil confidences, and keeps the one with the best accuracy"""
+        if not self._check_reference_locations_available(calibration):
+            return None
+        configurations = worker.calibration_sweep.default_configurations(calibration)
+        task = worker.calibration_sweep.create_task(
+            calibration,
+            all_reference_locations=self._reference_location_storage,
+            configurations=configurations,
+        )
+        results = []
+
+        def on_sweep_yield(result):
+            results.append(result)
+            logger.info(f"Calibration '{calibration.name}': {result}")
+            calibration.status = (
+                f"Compared {len(results)}/{len(configurations)} calibration methods"
+            )
+
+        def on_sweep_completed(_):
+            best = worker.calibration_sweep.select_best(results)
+            if best is None:
+                calibration.status = "Calibration failed for all methods"
+                logger.error(f"Calibration '{calibration.name}' failed for all methods")
+                return
+            calibration.status = f"Selected {best}"
+            calibration.gazer_class_name = best.configuration.gazer_class_name
+            calibration.minimum_confidence = best.configuration.minimum_confidence
+            calibration.update(calib_params=best.calibration_result.params)
+            self._calibration_storage.save_to_disk()
+            self.on_calibration_computed(calibration)
+
+        task.add_observer("on_yield", on_sweep_yield)
+        task.add_observer("on_completed", on_sweep_completed)
+        task.add_observer("on_exception", tasklib.raise_exception)
+        self._task_manager.add_task(
+            task, identifier=f"{calibration.unique_id}-calibration"
+        )
+        return task
+
     def on_calibration_computed(self, calibration):
         pass
 
@@ -74,6 +113,13 @@ class CalibrationController(Observable):
             and calibration.recording_uuid == self._recording_uuid
         )
 
+    def _check_reference_locations_available(self, calibration):
+        if len(self._reference_location_storage.items) == 0:
+            error_message = f"You first need to detect reference locations before calculating the calibration '{calibration.name}'"
+            self._abort_calculation(calibration, error_message)
+            return False
+        return True
+
     def _abort_calculation(self, calibration, error_message):
         logger.error(error_message)
         calibration.status = error_message
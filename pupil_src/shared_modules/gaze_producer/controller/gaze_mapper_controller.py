@@ -28,6 +28,9 @@ class GazeMapperController(Observable):
         task_manager,
         get_current_trim_mark_range,
         publish_gaze_bisector,
+        gaze_mapping_cache=None,
+        get_pupil_token=lambda: None,
+        get_world_intrinsics=lambda: None,
     ):
         self._gaze_mapper_storage = gaze_mapper_storage
         self._calibration_storage = calibration_storage
@@ -35,6 +38,10 @@ class GazeMapperController(Observable):
         self._task_manager = task_manager
         self._get_current_trim_mark_range = get_current_trim_mark_range
         self._publish_gaze_bisector = publish_gaze_bisector
+        self._gaze_mapping_cache = gaze_mapping_cache
+        self._get_pupil_token = get_pupil_token
+        self._get_world_intrinsics = get_world_intrinsics
+        self._mappers_in_progress = set()
 
         self._gaze_mapper_storage.add_observer("delete", self.on_gaze_mapper_deleted)
 
@@ -50,7 +57,7 @@ class GazeMapperController(Observable):
     def set_calibration_unique_id(self, gaze_mapper, calibration_unique_id):
         gaze_mapper.calibration_unique_id = calibration_unique_id
 
-    def calculate(self, gaze_mapper):
+    def calculate(self, gaze_mapper, max_workers=None):
         self._reset_gaze_mapper_results(gaze_mapper)
         calibration = self.get_valid_calibration_or_none(gaze_mapper)
         if calibration is None:
@@ -67,13 +74,24 @@ class GazeMapperController(Observable):
                 f"calculating the mapper '{gaze_mapper.name}'",
             )
             return None
+        cache_key = self._gaze_mapping_cache_key(gaze_mapper, calibration)
+        cached = self._gaze_mapping_cache.load(cache_key) if cache_key else None
+        if cached:
+            gaze_mapper.gaze, gaze_mapper.gaze_ts = cached
+            logger.info(f"Loaded cached gaze mapping for '{gaze_mapper.name}'")
+            self._on_mapping_completed(gaze_mapper)
+            return None
         try:
-            task = self._create_mapping_task(gaze_mapper, calibration)
+            task = self._create_mapping_task(
+                gaze_mapper, calibration, cache_key, max_workers
+            )
         except worker.map_gaze.NotEnoughPupilData:
             self._abort_calculation(gaze_mapper, "There is no pupil data to be mapped!")
             return None
         self._task_manager.add_task(task, identifier=f"{gaze_mapper.unique_id}-mapping")
+        self._mappers_in_progress.add(gaze_mapper.unique_id)
         logger.info(f"Start gaze mapping for '{gaze_mapper.name}'")
+        return task
 
     def _abort_calculation(self, gaze_mapper, error_message):
         logger.error(error_message)
@@ -86,41 +104,74 @@ class GazeMapperController(Observable):
         pass
 
     def _reset_gaze_mapper_results(self, gaze_mapper):
-        gaze_mapper.gaze = []
-        gaze_mapper.gaze_ts = []
+        # mapped gaze does not contain the manual correction until the mapping
+        # completed, see apply_manual_correction()
+        gaze_mapper.reset_gaze()
         gaze_mapper.accuracy_result = ""
         gaze_mapper.precision_result = ""
 
-    def _create_mapping_task(self, gaze_mapper, calibration):
-        task = worker.map_gaze.create_task(gaze_mapper, calibration)
+    def _gaze_mapping_cache_key(self, gaze_mapper, calibration):
+        if self._gaze_mapping_cache is None:
+            return None
+        return self._gaze_mapping_cache.key(
+            calibration,
+            self._get_pupil_token(),
+            gaze_mapper.mapping_index_range,
+            self._get_world_intrinsics(),
+        )
+
+    def _create_mapping_task(
+        self, gaze_mapper, calibration, cache_key=None, max_workers=None
+    ):
+        task = worker.map_gaze.create_task(
+            gaze_mapper, calibration, max_workers=max_workers
+        )
 
-        def on_yield_gaze(mapped_gaze_ts_and_data):
+        def on_yield_gaze(gaze_batch):
             gaze_mapper.status = f"Mapping {task.progress * 100:.0f}% complete"
-            for timestamp, gaze_datum in mapped_gaze_ts_and_data:
-                gaze_mapper.gaze.append(gaze_datum)
-                gaze_mapper.gaze_ts.append(timestamp)
+            gaze_mapper.gaze.extend(gaze_batch.data)
+            gaze_mapper.gaze_ts.extend(gaze_batch.timestamps.tolist())
 
         def on_completed_mapping(_):
-            if gaze_mapper.empty():
-                gaze_mapper.status = "No data mapped!"
-                logger.warning(
-                    f"Gaze mapper {gaze_mapper.name} produced no data."
-                    f" Please check the quality of your Pupil data"
-                    f" and ensure you are using the appropriate pipeline!"
+            if cache_key:
+                self._gaze_mapping_cache.save(
+                    cache_key, gaze_mapper.gaze, gaze_mapper.gaze_ts
                 )
-            else:
-                gaze_mapper.status = "Successfully completed mapping"
-            self.publish_all_enabled_mappers()
-            self.validate_gaze_mapper(gaze_mapper)
-            self._gaze_mapper_storage.save_to_disk()
-            self.on_gaze_mapping_calculated(gaze_mapper)
+            self._on_mapping_completed(gaze_mapper)
             logger.info(f"Completed gaze mapping for '{gaze_mapper.name}'")
 
+        def on_ended_mapping():
+            self._mappers_in_progress.discard(gaze_mapper.unique_id)
+
         task.add_observer("on_yield", on_yield_gaze)
+        task.add_observer("on_ended", on_ended_mapping)
         task.add_observer("on_completed", on_completed_mapping)
         task.add_observer("on_exception", tasklib.raise_exception)
         return task
 
+    def _on_mapping_completed(self, gaze_mapper):
+        gaze_mapper.apply_manual_correction()
+        if gaze_mapper.empty():
+            gaze_mapper.status = "No data mapped!"
+            logger.warning(
+                f"Gaze mapper {gaze_mapper.name} produced no data."
+                f" Please check the quality of your Pupil data"
+                f" and ensure you are using the appropriate pipeline!"
+            )
+        else:
+            gaze_mapper.status = "Successfully completed mapping"
+        self.publish_all_enabled_mappers()
+        self.validate_gaze_mapper(gaze_mapper)
+        self._gaze_mapper_storage.save_to_disk()
+        self.on_gaze_mapping_calculated(gaze_mapper)
+
+    def apply_manual_correction(self, gaze_mapper):
+        """Updates gaze to the mapper's manual correction without mapping again"""
+        if gaze_mapper.unique_id in self._mappers_in_progress:
+            return  # applied once the mapping completed
+        if gaze_mapper.apply_manual_correction() and gaze_mapper.activate_gaze:
+            self.publish_all_enabled_mappers()
+
     def publish_all_enabled_mappers(self):
         """
         Publish gaze data to e.g. render it in Player or to trigger other plugins
@@ -99,6 +99,9 @@ class GazeFromOfflineCalibration(GazeProducerBase):
             task_manager=self._task_manager,
             get_current_trim_mark_range=self._current_trim_mark_range,
             publish_gaze_bisector=self._publish_gaze,
+            gaze_mapping_cache=model.GazeMappingCache(self.g_pool.rec_dir),
+            get_pupil_token=lambda: self._pupil_changed_listener.current_token,
+            get_world_intrinsics=lambda: self.g_pool.capture.intrinsics,
         )
         self._calculate_all_controller = controller.CalculateAllController(
             self._reference_detection_controller,
@@ -107,6 +110,7 @@ class GazeFromOfflineCalibration(GazeProducerBase):
             self._calibration_storage,
             self._gaze_mapper_controller,
             self._gaze_mapper_storage,
+            task_manager=self._task_manager,
         )
 
     def _setup_ui(self):
@@ -16,8 +16,10 @@ from gaze_producer.model.calibration import (
 )
 from gaze_producer.model.calibration_storage import CalibrationStorage
 
+from gaze_producer.model.columnar_gaze import ColumnarGaze, serialize_gaze_datum
 from gaze_producer.model.gaze_mapper import GazeMapper
 from gaze_producer.model.gaze_mapper_storage import GazeMapperStorage
+from gaze_producer.model.gaze_mapping_cache import GazeMappingCache
 
 from gaze_producer.model.reference_location import ReferenceLocation
 from gaze_producer.model.reference_location_storage import ReferenceLocationStorage
@@ -0,0 +1,120 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import typing as T
+
+import msgpack
+import numpy as np
+
+import file_methods as fm
+
+# msgpack layout of a gaze datum starting with its "norm_pos" key:
+# <map header> 0xa8 b"norm_pos" 0x92 0xcb <float64 x> 0xcb <float64 y>
+_NORM_POS_PREFIX = np.frombuffer(b"\xa8norm_pos\x92\xcb", dtype=np.uint8)
+_FLOAT64_MARKER = 0xCB
+_X_OFFSET = len(_NORM_POS_PREFIX)
+_Y_OFFSET = _X_OFFSET + 8 + 1
+_LAYOUT_LENGTH = _Y_OFFSET + 8
+
+
+def serialize_gaze_datum(gaze_datum: dict) -> fm.Serialized_Dict:
+    """Serializes gaze with norm_pos as first key, such that ColumnarGaze can shift
+    it without deserializing the datum."""
+    if "norm_pos" not in gaze_datum:
+        return fm.Serialized_Dict(python_dict=gaze_datum)
+    x, y = gaze_datum["norm_pos"]
+    reordered = {"norm_pos": [float(x), float(y)]}
+    reordered.update((k, v) for k, v in gaze_datum.items() if k != "norm_pos")
+    return fm.Serialized_Dict(python_dict=reordered)
+
+
+class ColumnarGaze:
+    """Serialized gaze data in a single contiguous buffer, with norm_pos as column.
+
+    Shifting norm_pos by a constant offset, e.g. for the manual gaze correction,
+    only overwrites the norm_pos bytes in the buffer. The gaze data does not need
+    to be deserialized and serialized again. Gaze that was not serialized with
+    `serialize_gaze_datum()` is converted once on construction.
+    """
+
+    def __init__(self, gaze: T.Sequence[fm.Serialized_Dict]):
+        payloads = [datum.serialized for datum in gaze]
+        self._set_payloads(payloads)
+
+        convert_idc = np.flatnonzero(self._norm_pos_idc < 0)
+        if convert_idc.size:
+            for idx in convert_idc.tolist():
+                gaze_datum = msgpack.unpackb(
+                    payloads[idx],
+                    ext_hook=fm.Serialized_Dict.unpacking_ext_hook,
+                    strict_map_key=False,
+                )
+                payloads[idx] = serialize_gaze_datum(gaze_datum).serialized
+            self._set_payloads(payloads)
+
+        positions = self._norm_pos_idc[self._norm_pos_idc >= 0]
+        self.norm_pos = np.full((len(payloads), 2), np.nan)
+        self.norm_pos[self._norm_pos_idc >= 0] = np.stack(
+            [self._read_float64(positions), self._read_float64(positions + 9)],
+            axis=1,
+        )
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def shifted(self, shift_x: float, shift_y: float) -> T.List[fm.Serialized_Dict]:
+        """Returns the gaze data with norm_pos shifted by (shift_x, shift_y)."""
+        buffer = self._buffer.copy()
+        has_norm_pos = self._norm_pos_idc >= 0
+        positions = self._norm_pos_idc[has_norm_pos]
+        shifted = self.norm_pos[has_norm_pos] + (shift_x, shift_y)
+        shifted_bytes = shifted.astype(">f8").view(np.uint8).reshape(-1, 2, 8)
+        byte_range = np.arange(8)
+        buffer[positions[:, np.newaxis] + byte_range] = shifted_bytes[:, 0]
+        buffer[positions[:, np.newaxis] + 9 + byte_range] = shifted_bytes[:, 1]
+
+        data = buffer.tobytes()
+        offsets = self._offsets.tolist()
+        return [
+            fm.Serialized_Dict(msgpack_bytes=data[start:stop])
+            for start, stop in zip(offsets[:-1], offsets[1:])
+        ]
+
+    def _set_payloads(self, payloads):
+        lengths = np.fromiter(map(len, payloads), dtype=np.int64, count=len(payloads))
+        self._offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self._buffer = np.frombuffer(b"".join(payloads), dtype=np.uint8).copy()
+        self._norm_pos_idc = self._find_norm_pos_x(lengths)
+
+    def _find_norm_pos_x(self, lengths) -> np.ndarray:
+        """Buffer index of each datum's norm_pos x value, -1 if not at the front"""
+        starts = self._offsets[:-1]
+        headers = self._buffer[starts] if len(starts) else np.empty(0, np.uint8)
+        # fixmap (up to 15 keys) or map16 header
+        header_size = np.where((headers & 0xF0) == 0x80, 1, -1)
+        header_size[headers == 0xDE] = 3
+
+        found = (header_size > 0) & (lengths >= header_size + _LAYOUT_LENGTH)
+        layout_starts = starts[found] + header_size[found]
+        prefixes = self._buffer[
+            layout_starts[:, np.newaxis] + np.arange(len(_NORM_POS_PREFIX))
+        ]
+        y_markers = self._buffer[layout_starts + _Y_OFFSET - 1]
+        found[found] = (prefixes == _NORM_POS_PREFIX).all(axis=1) & (
+            y_markers == _FLOAT64_MARKER
+        )
+
+        norm_pos_idc = np.full(len(starts), -1, dtype=np.int64)
+        norm_pos_idc[found] = starts[found] + header_size[found] + _X_OFFSET
+        return norm_pos_idc
+
+    def _read_float64(self, positions) -> np.ndarray:
+        raw = self._buffer[positions[:, np.newaxis] + np.arange(8)]
+        return raw.copy().view(">f8").ravel().astype(np.float64)
@@ -11,6 +11,8 @@ See COPYING and COPYING.LESSER for license details.
 
 from storage import StorageItem
 
+from gaze_producer.model.columnar_gaze import ColumnarGaze
+
 
 class GazeMapper(StorageItem):
     version = 1
@@ -46,10 +48,47 @@ class GazeMapper(StorageItem):
         self.precision_result = precision_result
         self.gaze = gaze if gaze is not None else []
         self.gaze_ts = gaze_ts if gaze_ts is not None else []
+        # Manual correction contained in self.gaze. Gaze stored on disk was saved
+        # together with its manual correction.
+        self.applied_manual_correction = (manual_correction_x, manual_correction_y)
+        self._columnar_gaze = None
+        self._columnar_gaze_correction = None
 
     def empty(self):
         return len(self.gaze) == 0 and len(self.gaze_ts) == 0
 
+    def apply_manual_correction(self):
+        """Shifts gaze to the current manual correction without mapping it again.
+
+        Returns:
+            True if gaze changed.
+        """
+        correction = (self.manual_correction_x, self.manual_correction_y)
+        if correction == self.applied_manual_correction:
+            return False
+        if self.empty():
+            self.applied_manual_correction = correction
+            return False
+
+        if self._columnar_gaze is None or len(self._columnar_gaze) != len(self.gaze):
+            self._columnar_gaze = ColumnarGaze(self.gaze)
+            self._columnar_gaze_correction = self.applied_manual_correction
+        # Always shift relative to the columnar gaze, such that repeated corrections
+        # do not accumulate rounding errors.
+        self.gaze = self._columnar_gaze.shifted(
+            correction[0] - self._columnar_gaze_correction[0],
+            correction[1] - self._columnar_gaze_correction[1],
+        )
+        self.applied_manual_correction = correction
+        return True
+
+    def reset_gaze(self):
+        self.gaze = []
+        self.gaze_ts = []
+        self.applied_manual_correction = (0.0, 0.0)
+        self._columnar_gaze = None
+        self._columnar_gaze_correction = None
+
     @staticmethod
     def from_tuple(tuple_):
         return GazeMapper(*tuple_)
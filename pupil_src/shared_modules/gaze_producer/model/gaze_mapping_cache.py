@@ -0,0 +1,118 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import hashlib
+import logging
+import os
+import typing as T
+
+import msgpack
+import numpy as np
+
+import file_methods as fm
+from gaze_mapping import gazer_classes_by_class_name, registered_gazer_classes
+
+logger = logging.getLogger(__name__)
+
+
+class GazeMappingCache:
+    """Mapped gaze stored in offline_data, addressed by the inputs of the mapping.
+
+    The key is built from the calibration (gazer class, its version and the
+    calibration params), the token of the pupil data, the mapping range and the
+    world camera intrinsics. Gaze mappers with the same inputs share their results,
+    also across Player sessions. Cached gaze does not contain the manual correction.
+    """
+
+    version = 1
+    max_entries = 16
+
+    def __init__(self, rec_dir):
+        self._directory = os.path.join(rec_dir, "offline_data", "gaze-mapping-cache")
+
+    def key(
+        self, calibration, pupil_token, mapping_index_range, intrinsics
+    ) -> T.Optional[str]:
+        """Returns None if the inputs can not be identified reliably."""
+        if pupil_token is None or calibration.params is None or intrinsics is None:
+            return None
+        gazers_by_name = gazer_classes_by_class_name(registered_gazer_classes())
+        gazer_class = gazers_by_name.get(calibration.gazer_class_name)
+        if gazer_class is None:
+            return None
+        try:
+            inputs = msgpack.packb(
+                [
+                    self.version,
+                    calibration.gazer_class_name,
+                    gazer_class.gazer_version,
+                    calibration.params,
+                    pupil_token,
+                    list(mapping_index_range),
+                    # 3d gazers project gaze into the world camera
+                    intrinsics.cam_type,
+                    list(intrinsics.resolution),
+                    np.asarray(intrinsics.K, dtype=np.float64).tolist(),
+                    np.asarray(intrinsics.D, dtype=np.float64).tolist(),
+                ],
+                use_bin_type=True,
+                default=fm.Serialized_Dict.packing_hook,
+            )
+        except TypeError:
+            logger.debug("Calibration params can not be used as gaze cache key")
+            return None
+        return hashlib.sha1(inputs).hexdigest()
+
+    def load(self, key: str) -> T.Optional[T.Tuple[T.List, T.List]]:
+        """Returns cached gaze and gaze timestamps, or None if there are none."""
+        try:
+            pldata = fm.load_pldata_file(self._directory, key)
+        except (ValueError, msgpack.UnpackException):
+            logger.debug(f"Could not read gaze mapping {key} from cache")
+            return None
+        if not len(pldata.data) or len(pldata.data) != len(pldata.timestamps):
+            return None
+        # mark as recently used
+        os.utime(os.path.join(self._directory, key + ".pldata"))
+        logger.debug(f"Loaded gaze mapping {key} from cache")
+        return list(pldata.data), np.asarray(pldata.timestamps).tolist()
+
+    def save(self, key: str, gaze, gaze_ts):
+        if not len(gaze):
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        # write to temporary files first, such that there are no incomplete entries
+        tmp_name = key + ".tmp"
+        with fm.PLData_Writer(self._directory, tmp_name) as writer:
+            for timestamp, datum in zip(gaze_ts, gaze):
+                writer.append_serialized(
+                    timestamp, topic="gaze", datum_serialized=datum.serialized
+                )
+        # the entry is only loaded once its .pldata file exists, so move it last
+        for suffix in ("_timestamps.npy", ".pldata"):
+            os.replace(
+                os.path.join(self._directory, tmp_name + suffix),
+                os.path.join(self._directory, key + suffix),
+            )
+        self._remove_oldest_entries()
+
+    def _remove_oldest_entries(self):
+        entries = [
+            os.path.join(self._directory, name[: -len(".pldata")])
+            for name in os.listdir(self._directory)
+            if name.endswith(".pldata")
+        ]
+        entries.sort(key=lambda path: os.path.getmtime(path + ".pldata"))
+        for path in entries[: -self.max_entries]:
+            for suffix in (".pldata", "_timestamps.npy"):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
@@ -73,6 +73,7 @@ class CalibrationMenu(plugin_ui.StorageEditMenu):
                 self._create_min_confidence_slider(calibration),
                 self._create_status_display(calibration),
                 self._create_calculate_button(calibration),
+                self._create_calculate_best_method_button(),
             ]
         )
 
@@ -132,6 +133,12 @@ class CalibrationMenu(plugin_ui.StorageEditMenu):
             function=self._on_click_calculate,
         )
 
+    def _create_calculate_best_method_button(self):
+        return ui.Button(
+            label="Calculate With Best Method",
+            function=self._on_click_calculate_best_method,
+        )
+
     def _render_ui_calibration_from_other_recording(self, calibration, menu):
         menu.append(
             ui.Info_Text(
@@ -210,6 +217,9 @@ class CalibrationMenu(plugin_ui.StorageEditMenu):
     def _on_click_calculate(self):
         self._calibration_controller.calculate(self.current_item)
 
+    def _on_click_calculate_best_method(self):
+        self._calibration_controller.calculate_best_method(self.current_item)
+
     def _on_calibration_computed(self, calibration):
         if calibration == self.current_item:
             # mostly to change button "calculate" -> "recalculate"
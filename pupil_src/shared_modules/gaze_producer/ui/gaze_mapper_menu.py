@@ -138,6 +138,9 @@ class GazeMapperMenu(plugin_ui.StorageEditMenu):
             step=0.01,
             max=0.5,
             label="Manual Correction " + axis.upper(),
+            setter=lambda value: self._on_manual_correction_changed(
+                gaze_mapper, axis, value
+            ),
         )
 
     def _create_validation_submenu(self, gaze_mapper):
@@ -214,6 +217,10 @@ class GazeMapperMenu(plugin_ui.StorageEditMenu):
         self._gaze_mapper_controller.validate_gaze_mapper(self.current_item)
         self.render()
 
+    def _on_manual_correction_changed(self, gaze_mapper, axis, value):
+        setattr(gaze_mapper, "manual_correction_" + axis, value)
+        self._gaze_mapper_controller.apply_manual_correction(gaze_mapper)
+
     def _on_outlier_threshold_changed(self, new_threshold):
         self.current_item.validation_outlier_threshold_deg = new_threshold
         self._gaze_mapper_controller.validate_gaze_mapper(self.current_item)
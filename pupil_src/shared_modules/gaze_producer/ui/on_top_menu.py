@@ -46,6 +46,7 @@ class OnTopMenu:
                     "which performs all steps with the current settings."
                 ),
                 self._calculate_all_button,
+                self._create_calculate_all_status_display(),
             ]
         )
 
@@ -55,6 +56,14 @@ class OnTopMenu:
             function=self._calculate_all_controller.calculate_all,
         )
 
+    def _create_calculate_all_status_display(self):
+        return ui.Text_Input(
+            "status",
+            self._calculate_all_controller,
+            label="Progress",
+            setter=lambda _: _,
+        )
+
     @property
     def _calculate_all_button_label(self):
         if self._reference_location_storage.is_empty:
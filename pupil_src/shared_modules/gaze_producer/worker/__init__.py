@@ -10,6 +10,7 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 from gaze_producer.worker import (
+    calibration_sweep,
     create_calibration,
     detect_circle_markers,
     map_gaze,
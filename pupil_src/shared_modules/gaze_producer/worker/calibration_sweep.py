@@ -0,0 +1,220 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import typing as T
+
+import numpy as np
+
+import tasklib.background
+from accuracy_visualizer import Accuracy_Visualizer, Angular_Errors, Calculation_Result
+from gaze_mapping import (
+    gazer_classes_by_class_name,
+    gazer_labels_by_class_names,
+    registered_gazer_classes,
+    user_selectable_gazer_classes,
+)
+from gaze_producer import model
+
+from . import create_calibration
+
+# Minimum pupil confidences that are tried in addition to the one of the calibration
+MINIMUM_CONFIDENCES = (0.6, 0.7, 0.8, 0.9)
+# Same default as for the validation of gaze mappers
+VALIDATION_OUTLIER_THRESHOLD_DEG = 5.0
+# Number of parts the reference locations are split into for cross-validation
+CROSS_VALIDATION_FOLDS = 5
+# Results with less used samples than this fraction of the most used samples of any
+# configuration are not selected. Otherwise configurations that produce outliers
+# could win, since outliers are not counted in the accuracy.
+MINIMUM_USED_FRACTION = 0.5
+
+
+class SweepConfiguration(T.NamedTuple):
+    gazer_class_name: str
+    minimum_confidence: float
+
+
+class SweepResult(T.NamedTuple):
+    configuration: SweepConfiguration
+    status: str
+    calibration_result: T.Optional[model.CalibrationResult]
+    accuracy: T.Optional[Calculation_Result]
+    precision: T.Optional[Calculation_Result]
+
+    @property
+    def successful(self) -> bool:
+        return self.accuracy is not None and self.accuracy.num_used > 0
+
+    def __str__(self):
+        gazer_labels = gazer_labels_by_class_names(registered_gazer_classes())
+        gazer_class_name = self.configuration.gazer_class_name
+        label = gazer_labels.get(gazer_class_name, gazer_class_name)
+        description = (
+            f"{label} with minimum confidence "
+            f"{self.configuration.minimum_confidence:.2f}"
+        )
+        if not self.successful:
+            return f"{description}: {self.status}"
+        return (
+            f"{description}: accuracy {self.accuracy.result:.3f}°, "
+            f"precision {self.precision.result:.3f}°"
+        )
+
+
+def default_configurations(calibration) -> T.List[SweepConfiguration]:
+    gazer_class_names = [cls.__name__ for cls in user_selectable_gazer_classes()]
+    minimum_confidences = sorted({calibration.minimum_confidence, *MINIMUM_CONFIDENCES})
+    return [
+        SweepConfiguration(gazer_class_name, minimum_confidence)
+        for gazer_class_name in gazer_class_names
+        for minimum_confidence in minimum_confidences
+    ]
+
+
+def create_task(calibration, all_reference_locations, configurations):
+    """Fits and evaluates one calibration per configuration in parallel processes.
+
+    The task yields a SweepResult per configuration, in the order of the
+    configurations. The calibration of a result is fitted to all reference
+    locations, while its accuracy and precision are cross-validated: The reference
+    locations are split into consecutive folds, and each fold is evaluated with a
+    calibration that was fitted to the other folds. The errors are calculated like
+    for the gaze mapper validation.
+    """
+    (
+        fake_gpool,
+        ref_dicts_in_calib_range,
+        pupil_pos_in_calib_range,
+    ) = create_calibration.collect_data(calibration, all_reference_locations)
+    pupil_pos_in_calib_range = list(pupil_pos_in_calib_range)
+
+    args_per_configuration = [
+        (fake_gpool, configuration, ref_dicts_in_calib_range, pupil_pos_in_calib_range)
+        for configuration in configurations
+    ]
+    name = f"Compare calibration methods for {calibration.name}"
+    return tasklib.background.ParallelGeneratorFunction(
+        name, _fit_and_evaluate, args_per_configuration
+    )
+
+
+def select_best(results: T.Iterable[SweepResult]) -> T.Optional[SweepResult]:
+    """Returns the result with the best accuracy, ties are broken by precision.
+
+    Only results that used at least MINIMUM_USED_FRACTION of the most used samples
+    are considered.
+    """
+    successful = [result for result in results if result.successful]
+    if not successful:
+        return None
+    max_num_used = max(result.accuracy.num_used for result in successful)
+    candidates = [
+        result
+        for result in successful
+        if result.accuracy.num_used >= MINIMUM_USED_FRACTION * max_num_used
+    ]
+    return min(
+        candidates, key=lambda result: (result.accuracy.result, result.precision.result)
+    )
+
+
+def _fit_and_evaluate(
+    fake_gpool, configuration, ref_dicts_in_calib_range, pupil_pos_in_calib_range
+):
+    fake_gpool.min_calibration_confidence = configuration.minimum_confidence
+    status, calibration_result = create_calibration._create_calibration(
+        fake_gpool,
+        configuration.gazer_class_name,
+        ref_dicts_in_calib_range,
+        pupil_pos_in_calib_range,
+    )
+    if calibration_result is None:
+        yield SweepResult(configuration, status, None, None, None)
+        return
+
+    held_out_errors = [
+        _held_out_angular_errors(
+            fake_gpool,
+            configuration,
+            fitting_refs,
+            pupil_pos_in_calib_range,
+            held_out_refs,
+            held_out_pupil_pos,
+        )
+        for fitting_refs, held_out_refs, held_out_pupil_pos in _folds(
+            ref_dicts_in_calib_range, pupil_pos_in_calib_range
+        )
+    ]
+    held_out_errors = [
+        errors
+        for errors in held_out_errors
+        if errors is not None and errors.angular_err.size
+    ]
+    if not held_out_errors:
+        status = "Cross-validation failed: no gaze matched held-out references"
+        yield SweepResult(configuration, status, calibration_result, None, None)
+        return
+
+    angular_errors = Angular_Errors(
+        *(np.concatenate(field) for field in zip(*held_out_errors))
+    )
+    accuracy, precision, _ = Accuracy_Visualizer.reduce_angular_errors(
+        angular_errors, outlier_threshold=VALIDATION_OUTLIER_THRESHOLD_DEG
+    )
+    yield SweepResult(configuration, status, calibration_result, accuracy, precision)
+
+
+def _folds(ref_dicts, pupil_pos):
+    """Yields the references to fit to, the held-out references and the pupil data
+    around the held-out references, for every fold"""
+    ref_dicts = sorted(ref_dicts, key=lambda ref: ref["timestamp"])
+    pupil_ts = np.array([datum["timestamp"] for datum in pupil_pos])
+    for held_out_idc in np.array_split(
+        np.arange(len(ref_dicts)), CROSS_VALIDATION_FOLDS
+    ):
+        if not 0 < held_out_idc.size < len(ref_dicts):
+            continue
+        start, stop = held_out_idc[0], held_out_idc[-1] + 1
+        held_out_refs = ref_dicts[start:stop]
+        fitting_refs = ref_dicts[:start] + ref_dicts[stop:]
+        # gaze is matched to references within 1/15 s, see calc_angular_errors()
+        pupil_start, pupil_stop = np.searchsorted(
+            pupil_ts,
+            [
+                held_out_refs[0]["timestamp"] - 1 / 15,
+                held_out_refs[-1]["timestamp"] + 1 / 15,
+            ],
+        )
+        yield fitting_refs, held_out_refs, pupil_pos[pupil_start:pupil_stop]
+
+
+def _held_out_angular_errors(
+    fake_gpool,
+    configuration,
+    fitting_refs,
+    fitting_pupil_pos,
+    held_out_refs,
+    held_out_pupil_pos,
+) -> T.Optional[Angular_Errors]:
+    """Angular errors on the held-out references, None if the fitting failed"""
+    _, calibration_result = create_calibration._create_calibration(
+        fake_gpool, configuration.gazer_class_name, fitting_refs, fitting_pupil_pos
+    )
+    if calibration_result is None:
+        return None
+    gazers_by_name = gazer_classes_by_class_name(registered_gazer_classes())
+    return Accuracy_Visualizer.calc_angular_errors(
+        g_pool=fake_gpool,
+        gazer_class=gazers_by_name[configuration.gazer_class_name],
+        gazer_params=calibration_result.params,
+        pupil_list=held_out_pupil_pos,
+        ref_list=held_out_refs,
+        intrinsics=fake_gpool.capture.intrinsics,
+    )
@@ -31,6 +31,21 @@ g_pool = None  # set by the plugin
 
 
 def create_task(calibration, all_reference_locations):
+    fake_gpool, ref_dicts_in_calib_range, pupil_pos_in_calib_range = collect_data(
+        calibration, all_reference_locations
+    )
+    args = (
+        fake_gpool,
+        calibration.gazer_class_name,
+        ref_dicts_in_calib_range,
+        pupil_pos_in_calib_range,
+    )
+    name = f"Create calibration {calibration.name}"
+    return tasklib.background.create(name, _create_calibration, args=args)
+
+
+def collect_data(calibration, all_reference_locations):
+    """Returns fake g_pool, reference dicts and pupil data in the calibration range"""
     assert g_pool, "You forgot to set g_pool by the plugin"
     calibration_window = pm.exact_window(
         g_pool.timestamps, calibration.frame_index_range
@@ -47,15 +62,7 @@ def create_task(calibration, all_reference_locations):
 
     fake_gpool = FakeGPool.from_g_pool(g_pool)
     fake_gpool.min_calibration_confidence = calibration.minimum_confidence
-
-    args = (
-        fake_gpool,
-        calibration.gazer_class_name,
-        ref_dicts_in_calib_range,
-        pupil_pos_in_calib_range,
-    )
-    name = f"Create calibration {calibration.name}"
-    return tasklib.background.create(name, _create_calibration, args=args)
+    return fake_gpool, ref_dicts_in_calib_range, pupil_pos_in_calib_range
 
 
 def _create_ref_dict(ref):
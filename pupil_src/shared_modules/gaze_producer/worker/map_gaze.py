@@ -8,22 +8,36 @@ Lesser General Public License (LGPL v3.0).
 See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
+import numpy as np
+
 import file_methods as fm
 import player_methods as pm
 import tasklib
+from tasklib.background.parallel import default_worker_count
 from gaze_mapping import gazer_classes_by_class_name, registered_gazer_classes
 
+from gaze_producer import model
+
 from .fake_gpool import FakeGPool
 
 
 g_pool = None  # set by the plugin
 
+# Pupil data is mapped in chunks of at least this duration in parallel processes.
+MIN_CHUNK_DURATION_SECONDS = 120.0
+# Each chunk also maps this much of its neighbours' pupil data, such that the pupil
+# matcher is in the same state at the chunk boundaries as during a single pass. Its
+# smoothed framerate estimate takes a few seconds to converge.
+CHUNK_OVERLAP_SECONDS = 10.0
+# Mapped gaze is sent to the foreground in batches of this size.
+RESULT_BATCH_SIZE = 1000
+
 
 class NotEnoughPupilData(ValueError):
     pass
 
 
-def create_task(gaze_mapper, calibration):
+def create_task(gaze_mapper, calibration, max_workers=None):
     assert g_pool, "You forgot to set g_pool by the plugin"
     mapping_window = pm.exact_window(g_pool.timestamps, gaze_mapper.mapping_index_range)
     pupil_pos_in_mapping_range = g_pool.pupil_positions.by_ts_window(mapping_window)
@@ -36,30 +50,54 @@ def create_task(gaze_mapper, calibration):
     # calibration_params = fm._recursive_deep_copy(calibration.params)
     calibration_params = calibration.params
 
-    args = (
-        calibration.gazer_class_name,
-        calibration_params,
-        fake_gpool,
-        pupil_pos_in_mapping_range,
-        gaze_mapper.manual_correction_x,
-        gaze_mapper.manual_correction_y,
-    )
+    pupil_ts = pupil_pos_in_mapping_range.data_ts
+    args_per_chunk = []
+    max_workers = max_workers or default_worker_count()
+    for chunk_window in _chunk_windows(pupil_ts, max_workers):
+        padded_window = (
+            chunk_window[0] - CHUNK_OVERLAP_SECONDS,
+            chunk_window[1] + CHUNK_OVERLAP_SECONDS,
+        )
+        start, stop = np.searchsorted(pupil_ts, padded_window)
+        if start == stop:
+            continue  # no pupil data to map in this chunk
+        args_per_chunk.append(
+            (
+                calibration.gazer_class_name,
+                calibration_params,
+                fake_gpool,
+                list(pupil_pos_in_mapping_range[start:stop]),
+                chunk_window,
+            )
+        )
+
     name = f"Create gaze mapper {gaze_mapper.name}"
-    return tasklib.background.create(
+    return tasklib.background.ParallelGeneratorFunction(
         name,
         _map_gaze,
-        args=args,
+        args_per_chunk,
         pass_shared_memory=True,
+        max_workers=max_workers,
     )
 
 
+def _chunk_windows(pupil_ts, max_chunk_count):
+    """Splits the time range into windows [start, stop), the outer ones unbounded"""
+    duration = pupil_ts[-1] - pupil_ts[0]
+    chunk_count = int(duration // MIN_CHUNK_DURATION_SECONDS)
+    chunk_count = max(1, min(chunk_count, max_chunk_count))
+    boundaries = np.linspace(pupil_ts[0], pupil_ts[-1], chunk_count + 1)[1:-1]
+    starts = [-np.inf, *boundaries]
+    stops = [*boundaries, np.inf]
+    return list(zip(starts, stops))
+
+
 def _map_gaze(
     gazer_class_name,
     gazer_params,
     fake_gpool,
     pupil_pos_in_mapping_range,
-    manual_correction_x,
-    manual_correction_y,
+    chunk_window,
     shared_memory,
 ):
     fake_gpool.import_runtime_plugins()
@@ -71,24 +109,29 @@ def _map_gaze(
     last_ts = pupil_pos_in_mapping_range[-1]["timestamp"]
     ts_span = last_ts - first_ts
     curr_ts = first_ts
+    chunk_start, chunk_stop = chunk_window
 
-    for gaze_datum in gazer.map_pupil_to_gaze(pupil_pos_in_mapping_range):
-        _apply_manual_correction(gaze_datum, manual_correction_x, manual_correction_y)
-
+    queue = []
+    for gaze_datum in gazer.map_pupil_to_gaze(pupil_pos_in_mapping_range, offline=True):
         # gazer.map_pupil_to_gaze does not yield gaze with monotonic timestamps.
         # Binocular pupil matches are delayed internally. To avoid non-monotonic
         # progress updates, we use the largest timestamp that has been returned up to
         # the current point in time.
         curr_ts = max(curr_ts, gaze_datum["timestamp"])
-        shared_memory.progress = (curr_ts - first_ts) / ts_span
-
-        result = (curr_ts, fm.Serialized_Dict(gaze_datum))
-        yield [result]
-
-
-def _apply_manual_correction(gaze_datum, manual_correction_x, manual_correction_y):
-    # ["norm_pos"] is a tuple by default
-    gaze_norm_pos = list(gaze_datum["norm_pos"])
-    gaze_norm_pos[0] += manual_correction_x
-    gaze_norm_pos[1] += manual_correction_y
-    gaze_datum["norm_pos"] = gaze_norm_pos
+        if ts_span > 0:
+            shared_memory.progress = (curr_ts - first_ts) / ts_span
+
+        # Gaze from the overlaps with neighbouring chunks is mapped by the neighbours.
+        # Assign each pupil match to exactly one chunk by its oldest pupil datum.
+        match_ts = min(p["timestamp"] for p in gaze_datum["base_data"])
+        if not chunk_start <= match_ts < chunk_stop:
+            continue
+
+        # Manual correction is applied in the foreground, see GazeMapper
+        queue.append((curr_ts, model.serialize_gaze_datum(gaze_datum)))
+        if len(queue) >= RESULT_BATCH_SIZE:
+            yield fm.Serialized_Dict_Batch.from_pairs(queue)
+            queue.clear()
+
+    if queue:
+        yield fm.Serialized_Dict_Batch.from_pairs(queue)
@@ -100,8 +100,8 @@ class OfflineLocalizationController(Observable):
         self.status = self._default_status
 
     def _create_localization_task(self):
-        def on_yield(data_pairs):
-            self._insert_pose_bisector(data_pairs)
+        def on_yield(pose_batch):
+            self._insert_pose_bisector(pose_batch)
             self.status = "{:.0f}% completed".format(self._task.progress * 100)
 
         def on_completed(_):
@@ -140,9 +140,10 @@ class OfflineLocalizationController(Observable):
             args=args,
         )
 
-    def _insert_pose_bisector(self, data_pairs):
-        for timestamp, pose in data_pairs:
-            self._localization_storage.pose_bisector.insert(timestamp, pose)
+    def _insert_pose_bisector(self, pose_batch):
+        self._localization_storage.pose_bisector.insert_many(
+            pose_batch.timestamps, pose_batch.data
+        )
         self.on_localization_yield()
 
     def cancel_task(self):
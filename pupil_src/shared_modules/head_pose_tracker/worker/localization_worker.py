@@ -85,7 +85,7 @@ def offline_localization(
                 if len(queue) >= batch_size:
                     data = queue[:batch_size]
                     del queue[:batch_size]
-                    yield data
+                    yield fm.Serialized_Dict_Batch.from_pairs(data)
 
                 continue
 
@@ -93,7 +93,7 @@ def offline_localization(
         if not_localized_count >= 5:
             camera_extrinsics_prv = None
 
-    yield queue
+    yield fm.Serialized_Dict_Batch.from_pairs(queue)
 
 
 def online_localization(
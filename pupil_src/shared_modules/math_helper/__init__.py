@@ -8,4 +8,4 @@ Lesser General Public License (LGPL v3.0).
 See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
-from .intersections import nearest_intersection
+from .intersections import nearest_intersection, nearest_intersections
@@ -70,6 +70,40 @@ def nearest_intersection(line0, line1):
         return None, None  # parallel lines
 
 
+def nearest_intersections(lines0, lines1):
+    """Vectorized nearest_intersection() for arrays of lines of shape (N, 2, 3).
+
+    Returns the nearest intersection points (N, 3) and the shortest distances (N,).
+    """
+    lines0 = np.asarray(lines0, dtype=np.float64)
+    lines1 = np.asarray(lines1, dtype=np.float64)
+    p1, p3 = lines0[:, 0], lines1[:, 0]
+
+    def normalise(directions):
+        magnitudes = np.linalg.norm(directions, axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(magnitudes == 0, 0.0, directions / magnitudes)
+
+    d1 = normalise(lines0[:, 1] - p1)
+    d2 = normalise(lines1[:, 1] - p3)
+
+    diff = p1 - p3
+    a01 = -np.einsum("ij,ij->i", d1, d2)
+    b0 = np.einsum("ij,ij->i", diff, d1)
+    b1 = -np.einsum("ij,ij->i", diff, d2)
+
+    # Parallel lines select any pair of closest points.
+    not_parallel = np.abs(a01) < 1.0
+    det = np.where(not_parallel, 1.0 - a01 * a01, 1.0)
+    s0 = np.where(not_parallel, (a01 * b1 - b0) / det, -b0)
+    s1 = np.where(not_parallel, (a01 * b0 - b1) / det, 0.0)
+
+    closest_points0 = p1 + s0[:, np.newaxis] * d1
+    closest_points1 = p3 + s1[:, np.newaxis] * d2
+    distances = np.linalg.norm(closest_points1 - closest_points0, axis=1)
+    return (closest_points0 + closest_points1) * 0.5, distances
+
+
 def nearest_linepoint_to_point(ref_point, line):
 
     p1 = line[0]
@@ -92,6 +92,13 @@ class Bisector(object):
     def _start_stop_idc_for_window(self, ts_window):
         return np.searchsorted(self.data_ts, ts_window)
 
+    def start_stop_idc_for_windows(self, window_starts, window_stops):
+        """Index ranges of the data in each window, same as by_ts_window() but for
+        arrays of windows."""
+        window_starts = np.asarray(window_starts)
+        window_stops = np.asarray(window_stops)
+        return self._start_stop_idc_for_window((window_starts, window_stops))
+
     def __getitem__(self, key):
         return self.data[key]
 
@@ -122,6 +129,18 @@ class Mutable_Bisector(Bisector):
         self.data_ts = np.insert(self.data_ts, insert_idx, timestamp)
         self.data = np.insert(self.data, insert_idx, datum)
 
+    def insert_many(self, timestamps, data):
+        """Inserts all data at once, cheaper than calling insert() for each datum"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if not len(timestamps):
+            return
+        order = np.argsort(timestamps, kind="stable")
+        data_array = np.empty(len(data), dtype=object)
+        data_array[:] = data
+        insert_idc = np.searchsorted(self.data_ts, timestamps[order])
+        self.data_ts = np.insert(self.data_ts, insert_idc, timestamps[order])
+        self.data = np.insert(self.data, insert_idc, data_array[order])
+
 
 class Affiliator(Bisector):
     """docstring for ClassName"""
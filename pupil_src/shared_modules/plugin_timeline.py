@@ -17,6 +17,7 @@ from pyglui import ui
 from pyglui.pyfontstash import fontstash
 
 import gl_utils
+from timeline_envelope import TimelineEnvelope
 
 Row = collections.namedtuple("Row", ["label", "elements"])
 
@@ -39,6 +40,30 @@ RangeElementFrameIdx = collections.namedtuple(
 RangeElementFrameIdx.__new__.__defaults__ = (0, 0, (1.0, 1.0, 1.0, 1.0), 8, 0)
 
 
+def draw_envelope(
+    envelope: TimelineEnvelope,
+    width,
+    scale,
+    color,
+    ylim=None,
+    line_type=gl.GL_LINES,
+):
+    """Draws the envelope level matching `width` in the current coordinate system.
+
+    GL_LINES draws the min-max range of each bin, GL_LINE_STRIP additionally
+    connects consecutive bins, which resembles a line plot of the raw data.
+    """
+    points = envelope.range_points(width, ylim=ylim)
+    if not len(points):
+        return
+    cygl_utils.draw_polyline(
+        points.tolist(),
+        color=color,
+        line_type=line_type,
+        thickness=scale,
+    )
+
+
 class PluginTimeline:
     timeline_row_height = 16
 
@@ -13,12 +13,12 @@ import logging
 import os
 import typing as T
 from contextlib import contextmanager
-from itertools import chain
 
 import numpy as np
 import OpenGL.GL as gl
 import zmq
 
+import background_helper as bh
 import data_changed
 import file_methods as fm
 import gl_utils
@@ -27,20 +27,38 @@ import pyglui.cygl.utils as cygl_utils
 import zmq_tools
 from observable import Observable
 from plugin import System_Plugin_Base
+from plugin_timeline import draw_envelope
 from pyglui import ui
 from pyglui.pyfontstash import fontstash as fs
+from timeline_envelope import TimelineEnvelope, envelope_quantiles
 from video_capture.utils import VideoSet
 
 logger = logging.getLogger(__name__)
 
 COLOR_LEGEND_EYE_RIGHT = cygl_utils.RGBA(0.9844, 0.5938, 0.4023, 1.0)
 COLOR_LEGEND_EYE_LEFT = cygl_utils.RGBA(0.668, 0.6133, 0.9453, 1.0)
-NUMBER_SAMPLES_TIMELINE = 4000
 
 DATA_KEY_CONFIDENCE = "confidence"
 DATA_KEY_DIAMETER = "diameter_3d"
 
 
+def _build_pupil_envelope(
+    timestamps, serialized_data, key, world_start_stop_ts, file_path, envelope_key
+):
+    """Builds the timeline envelope of `key` and saves it, if file_path is given"""
+    values = np.fromiter(
+        (fm.Serialized_Dict(msgpack_bytes=datum)[key] for datum in serialized_data),
+        dtype=np.float64,
+        count=len(serialized_data),
+    )
+    envelope = TimelineEnvelope.from_timeseries(
+        timestamps, values, xlim=world_start_stop_ts
+    )
+    if file_path is not None:
+        envelope.save(file_path, envelope_key)
+    yield envelope
+
+
 class Pupil_Producer_Base(Observable, System_Plugin_Base):
     uniqueness = "by_base_class"
     order = 0.01
@@ -71,6 +89,7 @@ class Pupil_Producer_Base(Observable, System_Plugin_Base):
         self._pupil_changed_listener.add_observer(
             "on_data_changed", self._refresh_timelines
         )
+        self._envelope_tasks = {}
 
     def init_ui(self):
         self.add_menu()
@@ -142,6 +161,8 @@ class Pupil_Producer_Base(Observable, System_Plugin_Base):
         self.conf_timeline.refresh()
 
     def deinit_ui(self):
+        for key, eye_id in list(self._envelope_tasks):
+            self._cancel_envelope_task(key, eye_id)
         self.remove_menu()
         self.g_pool.user_timelines.remove(self.dia_timeline)
         self.g_pool.user_timelines.remove(self.conf_timeline)
@@ -149,6 +170,7 @@ class Pupil_Producer_Base(Observable, System_Plugin_Base):
         self.conf_timeline = None
 
     def recent_events(self, events):
+        self._fetch_envelope_tasks()
         if "frame" in events:
             frm_idx = events["frame"].index
             window = pm.enclosing_window(self.g_pool.timestamps, frm_idx)
@@ -161,64 +183,118 @@ class Pupil_Producer_Base(Observable, System_Plugin_Base):
         ylim=None,
         fallback_detector_tag: T.Optional[str] = None,
     ):
+        """Loads the persisted envelopes of the pupil data for `key`.
+
+        Missing envelopes are built in background tasks. Until they are available,
+        the timeline is drawn without the corresponding eye.
+        """
         world_start_stop_ts = [self.g_pool.timestamps[0], self.g_pool.timestamps[-1]]
-        if not self.g_pool.pupil_positions:
-            self.cache[key] = {
-                "left": [],
-                "right": [],
-                "xlim": world_start_stop_ts,
-                "ylim": [0, 1],
-            }
-        else:
-            ts_data_pairs_right_left = [], []
+        envelopes_right_left = [
+            TimelineEnvelope.empty(world_start_stop_ts),
+            TimelineEnvelope.empty(world_start_stop_ts),
+        ]
+        for eye_id in (0, 1):
+            self._cancel_envelope_task(key, eye_id)
+        if self.g_pool.pupil_positions:
             for eye_id in (0, 1):
+                used_detector_tag = detector_tag
                 pupil_positions = self.g_pool.pupil_positions[eye_id, detector_tag]
                 if not pupil_positions and fallback_detector_tag is not None:
+                    used_detector_tag = fallback_detector_tag
                     pupil_positions = self.g_pool.pupil_positions[
                         eye_id, fallback_detector_tag
                     ]
                 if pupil_positions:
-                    t0, t1 = (
-                        pupil_positions.timestamps[0],
-                        pupil_positions.timestamps[-1],
-                    )
-                    timestamps_target = np.linspace(
-                        t0, t1, NUMBER_SAMPLES_TIMELINE, dtype=np.float32
+                    envelopes_right_left[eye_id] = self._load_or_start_envelope(
+                        pupil_positions,
+                        key,
+                        eye_id,
+                        used_detector_tag,
+                        world_start_stop_ts,
                     )
 
-                    data_indeces = pm.find_closest(
-                        pupil_positions.timestamps, timestamps_target
-                    )
-                    data_indeces = np.unique(data_indeces)
-                    for idx in data_indeces:
-                        ts_data_pair = (
-                            pupil_positions.timestamps[idx],
-                            pupil_positions[idx][key],
-                        )
-                        ts_data_pairs_right_left[eye_id].append(ts_data_pair)
-
-            if ylim is None:
-                # max_val must not be 0, else gl will crash
-                all_pupil_data_chained = chain.from_iterable(ts_data_pairs_right_left)
-                try:
-                    # Outlier removal based on:
-                    # https://en.wikipedia.org/wiki/Outlier#Tukey's_fences
-                    min_val, max_val = np.quantile(
-                        [pd[1] for pd in all_pupil_data_chained], [0.25, 0.75]
-                    )
-                    iqr = max_val - min_val
-                    min_val -= 1.5 * iqr
-                    max_val += 1.5 * iqr
-                    ylim = min_val, max_val
-                except IndexError:  # no pupil data available
-                    ylim = 0.0, 1.0
-
-            self.cache[key] = {
-                "right": ts_data_pairs_right_left[0],
-                "left": ts_data_pairs_right_left[1],
-                "xlim": world_start_stop_ts,
-                "ylim": ylim,
-            }
+        self.cache[key] = {
+            "right": envelopes_right_left[0],
+            "left": envelopes_right_left[1],
+            "xlim": world_start_stop_ts,
+            "fixed_ylim": ylim,
+        }
+        self._update_ylim(key)
+
+    def _update_ylim(self, key: str):
+        ylim = self.cache[key]["fixed_ylim"]
+        if ylim is None:
+            try:
+                # Outlier removal based on:
+                # https://en.wikipedia.org/wiki/Outlier#Tukey's_fences
+                min_val, max_val = envelope_quantiles(
+                    (self.cache[key]["right"], self.cache[key]["left"]), [0.25, 0.75]
+                )
+                iqr = max_val - min_val
+                min_val -= 1.5 * iqr
+                max_val += 1.5 * iqr
+                ylim = min_val, max_val
+            except IndexError:  # no pupil data available
+                ylim = 0.0, 1.0
+            if ylim[0] == ylim[1]:
+                # max_val must not be equal to min_val, else gl will crash
+                ylim = ylim[0] - 0.5, ylim[1] + 0.5
+        self.cache[key]["ylim"] = ylim
+
+    def _load_or_start_envelope(
+        self, pupil_positions, key, eye_id, detector_tag, world_start_stop_ts
+    ) -> TimelineEnvelope:
+        token = self._pupil_changed_announcer.current_token
+        file_path = os.path.join(
+            self.g_pool.rec_dir,
+            "offline_data",
+            "timelines",
+            f"pupil_{key}_eye{eye_id}.npz",
+        )
+        envelope_key = "-".join(
+            (
+                type(self).__name__,
+                str(token),
+                detector_tag,
+                "{:.6f}-{:.6f}".format(*world_start_stop_ts),
+            )
+        )
+        if token is None:
+            # the data is not announced yet and can not be identified
+            file_path = None
+        else:
+            envelope = TimelineEnvelope.load(file_path, envelope_key)
+            if envelope is not None:
+                return envelope
+
+        self._envelope_tasks[key, eye_id] = bh.IPC_Logging_Task_Proxy(
+            f"Pupil timeline eye{eye_id}",
+            _build_pupil_envelope,
+            args=(
+                np.asarray(pupil_positions.timestamps, dtype=np.float64),
+                [datum.serialized for datum in pupil_positions],
+                key,
+                world_start_stop_ts,
+                file_path,
+                envelope_key,
+            ),
+        )
+        return TimelineEnvelope.empty(world_start_stop_ts)
+
+    def _fetch_envelope_tasks(self):
+        for (key, eye_id), task in list(self._envelope_tasks.items()):
+            for envelope in task.fetch():
+                self.cache[key]["left" if eye_id else "right"] = envelope
+                self._update_ylim(key)
+                self.dia_timeline.refresh()
+                self.conf_timeline.refresh()
+            if task.completed or task.canceled:
+                del self._envelope_tasks[key, eye_id]
+
+    def _cancel_envelope_task(self, key, eye_id):
+        task = self._envelope_tasks.pop((key, eye_id), None)
+        if task is not None:
+            task.cancel()
 
     def draw_pupil_diameter(self, width, height, scale):
         self.draw_pupil_data(DATA_KEY_DIAMETER, width, height, scale)
@@ -229,12 +305,11 @@ class Pupil_Producer_Base(Observable, System_Plugin_Base):
     def draw_pupil_data(self, key, width, height, scale):
         right = self.cache[key]["right"]
         left = self.cache[key]["left"]
+        ylim = self.cache[key]["ylim"]
 
-        with gl_utils.Coord_System(*self.cache[key]["xlim"], *self.cache[key]["ylim"]):
-            cygl_utils.draw_points(
-                right, size=2.0 * scale, color=COLOR_LEGEND_EYE_RIGHT
-            )
-            cygl_utils.draw_points(left, size=2.0 * scale, color=COLOR_LEGEND_EYE_LEFT)
+        with gl_utils.Coord_System(*self.cache[key]["xlim"], *ylim):
+            draw_envelope(right, width, 2.0 * scale, COLOR_LEGEND_EYE_RIGHT, ylim)
+            draw_envelope(left, width, 2.0 * scale, COLOR_LEGEND_EYE_LEFT, ylim)
 
     def draw_dia_legend(self, width, height, scale):
         self.draw_legend(self.dia_timeline.label, width, height, scale)
@@ -169,6 +169,10 @@ def detect_markers(
         edges, mode=cv2.RETR_TREE, method=cv2.CHAIN_APPROX_SIMPLE, offset=(0, 0)
     )
 
+    if hierarchy is None:
+        # no contours, e.g. in a uniform image region
+        return []
+
     # remove extra encapsulation
     hierarchy = hierarchy[0]
     contours = np.array(contours)
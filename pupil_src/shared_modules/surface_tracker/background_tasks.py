@@ -16,25 +16,65 @@ import os
 import types
 
 import cv2
+import numpy as np
 
 import background_helper
 import player_methods
+from tasklib.background.parallel import default_worker_count
+
+from .bitset import Bitset
+from .surface import Gaze_On_Surface_Batch, Undistorted_Gaze
 
 logger = logging.getLogger(__name__)
 
 
+# Frames without cached markers per worker process, below this there are less workers
+MIN_FRAMES_PER_VIDEO_WORKER = 300
+
+
 def background_video_processor(
-    video_file_path, callable, visited_list, seek_idx, mp_context
+    video_file_path, callable, visited, seek_idx, mp_context, worker_count=None
 ):
-    return background_helper.IPC_Logging_Task_Proxy(
-        "Background Video Processor",
-        video_processing_generator,
-        (video_file_path, callable, seek_idx, visited_list),
-        context=mp_context,
+    """Processes all unvisited frames, split into contiguous chunks of frames that
+    are decoded and processed in parallel, one worker process per chunk.
+
+    visited is a sequence of booleans with one entry per frame, e.g. Cache.visited.
+    """
+    visited = np.asarray(visited, dtype=bool)
+    frame_ranges = _unvisited_frame_ranges(
+        visited, worker_count or default_worker_count()
     )
+    return background_helper.Task_Proxy_Group(
+        background_helper.IPC_Logging_Task_Proxy(
+            "Background Video Processor",
+            video_processing_generator,
+            (video_file_path, callable, seek_idx, visited[start:stop], start),
+            context=mp_context,
+        )
+        for start, stop in frame_ranges
+    )
+
+
+def _unvisited_frame_ranges(visited, worker_count):
+    """Splits the frames into contiguous ranges with similar counts of unvisited
+    frames"""
+    unvisited_idc = np.flatnonzero(~visited)
+    range_count = min(worker_count, len(unvisited_idc) // MIN_FRAMES_PER_VIDEO_WORKER)
+    range_count = max(1, range_count)
+    split_positions = np.linspace(0, len(unvisited_idc), range_count + 1)[1:-1]
+    splits = unvisited_idc[split_positions.astype(int)].tolist()
+    boundaries = [0, *splits, len(visited)]
+    return list(zip(boundaries[:-1], boundaries[1:]))
 
 
-def video_processing_generator(video_file_path, callable, seek_idx, visited_list):
+def video_processing_generator(
+    video_file_path, callable, seek_idx, visited, frame_offset=0
+):
+    """Processes the frames that were not visited yet.
+
+    visited covers the frames starting at frame_offset. Seek requests for frames
+    outside of this range are left for the processor that covers them.
+    """
     import os
     import logging
 
@@ -51,41 +91,21 @@ def video_processing_generator(video_file_path, callable, seek_idx, visited_list
 
     # Ensure that indiced are not generated beyond video frame count
     frame_count = cap.get_frame_count()
-    visited_list = visited_list[:frame_count]
-
-    visited_list = [x is not None for x in visited_list]
-
-    def next_unvisited_idx(frame_idx):
-        """
-        Starting from the given index, find the next frame that has not been
-        processed yet. If no future frames need processing, check from the start.
-
-        Args:
-            frame_idx: Index to start search from.
-
-        Returns: Next index that requires processing.
-
-        """
-        try:
-            visited = visited_list[frame_idx]
-        except IndexError:
-            visited = True  # trigger search from the start
-
-        if not visited:
-            next_unvisited = frame_idx
-        else:
-            # find next unvisited site in the future
-            try:
-                next_unvisited = visited_list.index(False, frame_idx)
-            except ValueError:
-                # any thing in the past?
-                try:
-                    next_unvisited = visited_list.index(False, 0, frame_idx)
-                except ValueError:
-                    # no unvisited sites left. Done!
-                    logger.debug("Caching completed.")
-                    next_unvisited = None
-        return next_unvisited
+    visited = Bitset.from_bools(visited[: max(0, frame_count - frame_offset)])
+
+    def requested_seek_idx():
+        with seek_idx.get_lock():
+            requested_frame_idx = seek_idx.value
+            requested_idx = requested_frame_idx - frame_offset
+            if requested_frame_idx == -1 or not 0 <= requested_idx < len(visited):
+                return None
+            seek_idx.value = -1
+        logger.debug(
+            "User required seek. Marker caching at Frame: {}".format(
+                requested_frame_idx
+            )
+        )
+        return requested_idx
 
     def handle_frame(frame_idx):
         if frame_idx != cap.get_frame_index() + 1:
@@ -95,37 +115,31 @@ def video_processing_generator(video_file_path, callable, seek_idx, visited_list
                 cap.seek_to_frame(frame_idx)
             except video_capture.FileSeekError:
                 logger.warning("Could not evaluate frame: {}.".format(frame_idx))
-                visited_list[frame_idx] = True  # this frame is now visited.
                 return []
 
         try:
             frame = cap.get_frame()
         except video_capture.EndofVideoError:
             logger.warning("Could not evaluate frame: {}.".format(frame_idx))
-            visited_list[frame_idx] = True
             return []
         return callable(frame)
 
     while True:
-        last_frame_idx = cap.get_frame_index()
-        if seek_idx.value != -1:
-            assert seek_idx.value < len(
-                visited_list
-            ), "The requested seek index is outside of the predefined cache range!"
-            last_frame_idx = seek_idx.value
-            seek_idx.value = -1
-            logger.debug(
-                "User required seek. Marker caching at Frame: {}".format(last_frame_idx)
-            )
+        last_frame_idx = requested_seek_idx()
+        if last_frame_idx is None:
+            last_frame_idx = max(0, cap.get_frame_index() - frame_offset)
 
-        next_frame_idx = next_unvisited_idx(last_frame_idx)
+        # Starting from the given index, find the next frame that has not been
+        # processed yet. If no future frames need processing, check from the start.
+        next_frame_idx = visited.next_unset(last_frame_idx, wrap_around=True)
 
         if next_frame_idx is None:
+            logger.debug("Caching completed.")
             break
         else:
-            res = handle_frame(next_frame_idx)
-            visited_list[next_frame_idx] = True
-            yield next_frame_idx, res
+            res = handle_frame(frame_offset + next_frame_idx)
+            visited[next_frame_idx] = True
+            yield frame_offset + next_frame_idx, res
 
 
 def background_data_processor(data, callable, seek_idx, mp_context):
@@ -139,37 +153,7 @@ def background_data_processor(data, callable, seek_idx, mp_context):
 
 def data_processing_generator(data, callable, seek_idx):
     # We treat frames without marker detections as already processed from the start.
-    visited_list = [x is None for x in data]
-
-    def next_unvisited_idx(sample_idx):
-        """
-        Starting from the given index, find the next sample that has not been
-        processed yet. If no future samples need processing, check from the start.
-
-        Args:
-            sample_idx: Index to start search from.
-
-        Returns: Next index that requires processing.
-
-        """
-        try:
-            visited = visited_list[sample_idx]
-        except IndexError:
-            visited = True  # trigger search from the start
-
-        if visited is False:
-            next_unvisited = sample_idx
-        else:
-            # find next unvisited site in the future
-            try:
-                next_unvisited = visited_list.index(False, sample_idx)
-            except ValueError:
-                # any thing in the past?
-                try:
-                    next_unvisited = visited_list.index(False, 0, sample_idx)
-                except ValueError:
-                    next_unvisited = None
-        return next_unvisited
+    visited = Bitset.from_bools(x is None for x in data)
 
     def handle_sample(sample_idx):
         sample = data[sample_idx]
@@ -181,34 +165,89 @@ def data_processing_generator(data, callable, seek_idx):
             next_sample_idx = seek_idx.value
             seek_idx.value = -1
 
-        next_sample_idx = next_unvisited_idx(next_sample_idx)
+        # Starting from the given index, find the next sample that has not been
+        # processed yet. If no future samples need processing, check from the start.
+        next_sample_idx = visited.next_unset(next_sample_idx, wrap_around=True)
 
         if next_sample_idx is None:
             break
         else:
             res = handle_sample(next_sample_idx)
-            visited_list[next_sample_idx] = True
+            visited[next_sample_idx] = True
             yield next_sample_idx, res
             next_sample_idx += 1
 
 
 def gaze_on_surface_generator(
-    surfaces, section, all_world_timestamps, all_gaze_events, camera_model
+    surfaces,
+    section,
+    all_world_timestamps,
+    all_gaze_events,
+    camera_model,
+    undistorted_gaze=None,
 ):
+    if undistorted_gaze is None:
+        undistorted_gaze = Undistorted_Gaze.from_events(all_gaze_events, camera_model)
     for surface in surfaces:
         gaze_on_surf = surface.map_section(
-            section, all_world_timestamps, all_gaze_events, camera_model
+            section,
+            all_world_timestamps,
+            all_gaze_events,
+            camera_model,
+            undistorted_gaze,
         )
         yield gaze_on_surf
 
 
+def gaze_on_surface_batch_generator(
+    surfaces,
+    section,
+    all_world_timestamps,
+    all_gaze_events,
+    camera_model,
+    undistorted_gaze=None,
+):
+    """Yields a Gaze_On_Surface_Batch per surface.
+
+    If undistorted_gaze is None, it is computed for all_gaze_events and yielded
+    before the batches, such that it can be passed in again next time.
+    """
+    if undistorted_gaze is None:
+        undistorted_gaze = Undistorted_Gaze.from_events(all_gaze_events, camera_model)
+        yield undistorted_gaze
+    for surface in surfaces:
+        batch = surface.map_section_batch(
+            section,
+            all_world_timestamps,
+            all_gaze_events,
+            camera_model,
+            undistorted_gaze,
+        )
+        if batch is None:
+            batch = Gaze_On_Surface_Batch.empty()
+        yield batch
+
+
 def background_gaze_on_surface(
-    surfaces, section, all_world_timestamps, all_gaze_events, camera_model, mp_context
+    surfaces,
+    section,
+    all_world_timestamps,
+    all_gaze_events,
+    camera_model,
+    mp_context,
+    undistorted_gaze=None,
 ):
     return background_helper.IPC_Logging_Task_Proxy(
         "Background Data Processor",
-        gaze_on_surface_generator,
-        (surfaces, section, all_world_timestamps, all_gaze_events, camera_model),
+        gaze_on_surface_batch_generator,
+        (
+            surfaces,
+            section,
+            all_world_timestamps,
+            all_gaze_events,
+            camera_model,
+            undistorted_gaze,
+        ),
         context=mp_context,
     )
 
@@ -222,8 +261,10 @@ def get_export_proxy(
     fixations,
     camera_model,
     mp_context,
+    undistorted_gaze=None,
+    worker_count=None,
 ):
-    exporter = Exporter(
+    return Export_Proxy(
         export_dir,
         export_range,
         surfaces,
@@ -231,16 +272,129 @@ def get_export_proxy(
         gaze_positions,
         fixations,
         camera_model,
+        mp_context,
+        undistorted_gaze,
+        worker_count,
     )
-    proxy = background_helper.IPC_Logging_Task_Proxy(
-        "Offline Surface Tracker Exporter",
-        exporter.save_surface_statisics_to_file,
-        context=mp_context,
-    )
-    return proxy
+
+
+class Export_Proxy:
+    """
+    Exports the files of each surface in up to worker_count processes, and the
+    statistics over all surfaces in one more process afterwards.
+
+    Every surface process only gets the surfaces it exports. It passes back the
+    timestamps of the gaze on each of its surfaces, such that the statistics are
+    written without mapping the gaze a second time.
+    """
+
+    def __init__(
+        self,
+        export_dir,
+        export_range,
+        surfaces,
+        world_timestamps,
+        gaze_positions,
+        fixations,
+        camera_model,
+        mp_context,
+        undistorted_gaze=None,
+        worker_count=None,
+    ):
+        if os.path.isdir(os.path.join(export_dir, "surfaces")):
+            logger.info("Will overwrite previous export for this section")
+        self._mp_context = mp_context
+        worker_count = max(
+            1, min(worker_count or default_worker_count(), len(surfaces))
+        )
+        self._surface_idc_per_worker = [
+            idc
+            for idc in (
+                list(range(len(surfaces)))[worker_idx::worker_count]
+                for worker_idx in range(worker_count)
+            )
+            if idc
+        ]
+        self._surface_proxies = [
+            background_helper.IPC_Logging_Task_Proxy(
+                "Offline Surface Tracker Exporter",
+                Exporter(
+                    export_dir,
+                    export_range,
+                    [surfaces[surf_idx] for surf_idx in surface_idc],
+                    world_timestamps,
+                    gaze_positions,
+                    fixations,
+                    camera_model,
+                    undistorted_gaze,
+                ).save_surface_data_to_files,
+                context=mp_context,
+            )
+            for surface_idc in self._surface_idc_per_worker
+        ]
+
+        self._statistics_exporter = Exporter(
+            export_dir,
+            export_range,
+            surfaces,
+            world_timestamps,
+            gaze_positions=None,
+            fixations=None,
+            camera_model=None,
+        )
+        export_window = player_methods.exact_window(world_timestamps, export_range)
+        self._gaze_ts_in_section = gaze_positions.init_dict_for_window(export_window)[
+            "data_ts"
+        ]
+        self._gaze_on_surf_ts = [np.empty(0) for _ in surfaces]
+        self._statistics_proxy = None
+
+    def fetch(self):
+        for surface_idc, proxy in zip(
+            self._surface_idc_per_worker, self._surface_proxies
+        ):
+            for idx, gaze_on_surf_ts in proxy.fetch():
+                self._gaze_on_surf_ts[surface_idc[idx]] = gaze_on_surf_ts
+
+        surfaces_exported = all(proxy.completed for proxy in self._surface_proxies)
+        if self._statistics_proxy is None and surfaces_exported:
+            self._statistics_proxy = background_helper.IPC_Logging_Task_Proxy(
+                "Offline Surface Tracker Exporter",
+                self._statistics_exporter.save_surface_statisics_to_file,
+                args=(self._gaze_ts_in_section, self._gaze_on_surf_ts),
+                context=self._mp_context,
+            )
+        if self._statistics_proxy is not None:
+            yield from self._statistics_proxy.fetch()
+
+    def cancel(self, timeout=1):
+        for proxy in self._proxies:
+            proxy.cancel(timeout)
+
+    @property
+    def completed(self):
+        return self._statistics_proxy is not None and self._statistics_proxy.completed
+
+    @property
+    def canceled(self):
+        return any(proxy.canceled for proxy in self._proxies)
+
+    @property
+    def _proxies(self):
+        if self._statistics_proxy is None:
+            return self._surface_proxies
+        return [*self._surface_proxies, self._statistics_proxy]
 
 
 class Exporter:
+    """
+    Exports the surface tracker results of a section of the recording.
+
+    The data of the individual surfaces and the statistics over all surfaces are
+    written by separate functions, such that they can run in separate processes
+    (see Export_Proxy). Large files are formatted column-wise and written at once.
+    """
+
     def __init__(
         self,
         export_dir,
@@ -250,6 +404,7 @@ class Exporter:
         gaze_positions,
         fixations,
         camera_model,
+        undistorted_gaze=None,
     ):
         self.export_range = export_range
         self.metrics_dir = os.path.join(export_dir, "surfaces")
@@ -258,85 +413,77 @@ class Exporter:
         self.gaze_positions = gaze_positions
         self.fixations = fixations
         self.camera_model = camera_model
-        self.gaze_on_surfaces = None
-        self.fixations_on_surfaces = None
+        self.undistorted_gaze = undistorted_gaze
 
-    def save_surface_statisics_to_file(self):
-        logger.info("exporting metrics to {}".format(self.metrics_dir))
-        if os.path.isdir(self.metrics_dir):
-            logger.info("Will overwrite previous export for this section")
-        else:
-            try:
-                os.mkdir(self.metrics_dir)
-            except OSError:
-                logger.warning("Could not make metrics dir {}".format(self.metrics_dir))
-                return
+    def save_surface_statisics_to_file(
+        self, gaze_ts_in_section, gaze_on_surf_ts_per_surface
+    ):
+        """Writes the statistics over all surfaces.
 
-        (
-            self.gaze_on_surfaces,
-            self.fixations_on_surfaces,
-        ) = self._map_gaze_and_fixations()
+        Args:
+            gaze_ts_in_section: Timestamps of all gaze in the export range.
+            gaze_on_surf_ts_per_surface: Unique timestamps of the gaze on each
+            surface, as yielded by save_surface_data_to_files().
+        """
+        logger.info("exporting metrics to {}".format(self.metrics_dir))
+        if not self._make_metrics_dir():
+            return
 
         self._export_surface_visibility()
-        self._export_surface_gaze_distribution()
+        self._export_surface_gaze_distribution(
+            gaze_ts_in_section, gaze_on_surf_ts_per_surface
+        )
         self._export_surface_events()
+        return
+
+        # Task_proxy requires a genrator. The `yield` below
+        # triggers this function to become a generator.
+        yield
+
+    def save_surface_data_to_files(self):
+        """Writes the files of every surface and yields the index of the surface
+        together with the unique timestamps of the gaze on it."""
+        if not self._make_metrics_dir():
+            return
 
         for surf_idx, surface in enumerate(self.surfaces):
             # Sanitize surface name to include it in the filename
             surface_name = "_" + surface.name.replace("/", "")
 
             self._export_surface_positions(surface, surface_name)
-            self._export_gaze_on_surface(
-                self.gaze_on_surfaces[surf_idx], surface, surface_name
+            gaze_on_surf = self._map_section(
+                surface, self.gaze_positions, self.undistorted_gaze
             )
+            self._export_gaze_on_surface(gaze_on_surf, surface, surface_name)
             self._export_fixations_on_surface(
-                self.fixations_on_surfaces[surf_idx], surface, surface_name
+                self._map_section(surface, self.fixations), surface, surface_name
             )
             self._export_surface_heatmap(surface, surface_name)
 
             logger.info(
                 "Saved surface gaze and fixation data for '{}'".format(surface.name)
             )
+            yield surf_idx, np.unique(gaze_on_surf.timestamps[gaze_on_surf.on_surf])
 
-        logger.info("Done exporting reference surface data.")
-        return
-
-        # Task_proxy requires a genrator. The `yield` below
-        # triggers this function to become a generator.
-        yield
-
-    def _map_gaze_and_fixations(self):
-        """
-        Result: Tuple[events_per_surface, events_per_surface]
-        events_per_surface = List[events_surface_0, ..., events_surface_N]
-        events_surface_i = List[events_world_frame_0, ..., events_world_frame_M]
-        events_world_frame_j: List[event, ...]
-
-        N: Number of surfaces
-        M: Number of world frames
-        """
-        section = slice(*self.export_range)
-        gaze_on_surface = list(
-            gaze_on_surface_generator(
-                self.surfaces,
-                section,
-                self.world_timestamps,
-                self.gaze_positions,
-                self.camera_model,
-            )
-        )
-
-        fixations_on_surface = list(
-            gaze_on_surface_generator(
-                self.surfaces,
-                section,
-                self.world_timestamps,
-                self.fixations,
-                self.camera_model,
-            )
+    def _make_metrics_dir(self):
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+        except OSError:
+            logger.warning("Could not make metrics dir {}".format(self.metrics_dir))
+            return False
+        return True
+
+    def _map_section(self, surface, events, undistorted_gaze=None):
+        batch = surface.map_section_batch(
+            slice(*self.export_range),
+            self.world_timestamps,
+            events,
+            self.camera_model,
+            undistorted_gaze,
         )
-
-        return gaze_on_surface, fixations_on_surface
+        if batch is None:
+            batch = Gaze_On_Surface_Batch.empty()
+        return batch
 
     def _export_surface_visibility(self):
         with open(
@@ -364,7 +511,9 @@ class Exporter:
                 csv_writer.writerow((surface.name, visible_count))
             logger.info("Created 'surface_visibility.csv' file")
 
-    def _export_surface_gaze_distribution(self):
+    def _export_surface_gaze_distribution(
+        self, gaze_ts_in_section, gaze_on_surf_ts_per_surface
+    ):
         with open(
             os.path.join(self.metrics_dir, "surface_gaze_distribution.csv"),
             "w",
@@ -373,23 +522,18 @@ class Exporter:
         ) as csv_file:
             csv_writer = csv.writer(csv_file, delimiter=",")
 
-            export_window = player_methods.exact_window(
-                self.world_timestamps, self.export_range
-            )
-            gaze_in_section = self.gaze_positions.by_ts_window(export_window)
-            not_on_any_surf_ts = set([gp["timestamp"] for gp in gaze_in_section])
+            not_on_any_surf_ts = np.unique(gaze_ts_in_section)
 
-            csv_writer.writerow(("total_gaze_point_count", len(gaze_in_section)))
+            csv_writer.writerow(("total_gaze_point_count", len(gaze_ts_in_section)))
             csv_writer.writerow("")
             csv_writer.writerow(("surface_name", "gaze_count"))
 
-            for surf_idx, surface in enumerate(self.surfaces):
-                gaze_on_surf = self.gaze_on_surfaces[surf_idx]
-                gaze_on_surf = list(itertools.chain.from_iterable(gaze_on_surf))
-                gaze_on_surf_ts = set(
-                    [gp["base_data"][1] for gp in gaze_on_surf if gp["on_surf"]]
+            for surface, gaze_on_surf_ts in zip(
+                self.surfaces, gaze_on_surf_ts_per_surface
+            ):
+                not_on_any_surf_ts = np.setdiff1d(
+                    not_on_any_surf_ts, gaze_on_surf_ts, assume_unique=True
                 )
-                not_on_any_surf_ts -= gaze_on_surf_ts
                 csv_writer.writerow((surface.name, len(gaze_on_surf_ts)))
 
             csv_writer.writerow(("not_on_any_surface", len(not_on_any_surf_ts)))
@@ -465,130 +609,123 @@ class Exporter:
             cv2.imwrite(heatmap_path, heatmap_img)
 
     def _export_surface_positions(self, surface, surface_name):
-        with open(
+        section = slice(*self.export_range)
+        frame_idc = np.arange(len(self.world_timestamps))[section]
+        locations = surface.location_cache[section]
+        detected = [bool(location) for location in locations]
+        locations = list(itertools.compress(locations, detected))
+        frame_idc = frame_idc[detected]
+
+        def transformations(name):
+            trans = [getattr(location, name) for location in locations]
+            return _format_matrices(np.reshape(trans, (-1, 3, 3)))
+
+        _write_csv(
             os.path.join(self.metrics_dir, "surf_positions" + surface_name + ".csv"),
-            "w",
-            encoding="utf-8",
-            newline="",
-        ) as csv_file:
-            csv_writer = csv.writer(csv_file, delimiter=",")
-            csv_writer.writerow(
-                (
-                    "world_index",
-                    "world_timestamp",
-                    "img_to_surf_trans",
-                    "surf_to_img_trans",
-                    "num_detected_markers",
-                    "dist_img_to_surf_trans",
-                    "surf_to_dist_img_trans",
-                )
-            )
-            for idx, (ts, ref_surf_data) in enumerate(
-                zip(self.world_timestamps, surface.location_cache)
-            ):
-                if self.export_range[0] <= idx < self.export_range[1]:
-                    if (
-                        ref_surf_data is not None
-                        and ref_surf_data is not False
-                        and ref_surf_data.detected
-                    ):
-                        csv_writer.writerow(
-                            (
-                                idx,
-                                ts,
-                                ref_surf_data.img_to_surf_trans,
-                                ref_surf_data.surf_to_img_trans,
-                                ref_surf_data.num_detected_markers,
-                                ref_surf_data.dist_img_to_surf_trans,
-                                ref_surf_data.surf_to_dist_img_trans,
-                            )
-                        )
-
-    def _export_gaze_on_surface(self, gazes_on_surface, surface, surface_name):
-        with open(
+            (
+                "world_index",
+                "world_timestamp",
+                "img_to_surf_trans",
+                "surf_to_img_trans",
+                "num_detected_markers",
+                "dist_img_to_surf_trans",
+                "surf_to_dist_img_trans",
+            ),
+            (
+                frame_idc.tolist(),
+                np.asarray(self.world_timestamps)[frame_idc].tolist(),
+                transformations("img_to_surf_trans"),
+                transformations("surf_to_img_trans"),
+                [location.num_detected_markers for location in locations],
+                transformations("dist_img_to_surf_trans"),
+                transformations("surf_to_dist_img_trans"),
+            ),
+            row_format="%r,%r,%s,%s,%r,%s,%s",
+        )
+
+    def _export_gaze_on_surface(self, gaze_on_surf, surface, surface_name):
+        norm_pos = gaze_on_surf.norm_pos
+        _write_csv(
             os.path.join(
                 self.metrics_dir, "gaze_positions_on_surface" + surface_name + ".csv"
             ),
-            "w",
-            encoding="utf-8",
-            newline="",
-        ) as csv_file:
-            csv_writer = csv.writer(csv_file, delimiter=",")
-            csv_writer.writerow(
-                (
-                    "world_timestamp",
-                    "world_index",
-                    "gaze_timestamp",
-                    "x_norm",
-                    "y_norm",
-                    "x_scaled",
-                    "y_scaled",
-                    "on_surf",
-                    "confidence",
-                )
-            )
-            for idx, gaze_on_surf in enumerate(gazes_on_surface):
-                idx += self.export_range[0]
-                if gaze_on_surf:
-                    for gp in gaze_on_surf:
-                        csv_writer.writerow(
-                            (
-                                self.world_timestamps[idx],
-                                idx,
-                                gp["timestamp"],
-                                gp["norm_pos"][0],
-                                gp["norm_pos"][1],
-                                gp["norm_pos"][0] * surface.real_world_size["x"],
-                                gp["norm_pos"][1] * surface.real_world_size["y"],
-                                gp["on_surf"],
-                                gp["confidence"],
-                            )
-                        )
+            (
+                "world_timestamp",
+                "world_index",
+                "gaze_timestamp",
+                "x_norm",
+                "y_norm",
+                "x_scaled",
+                "y_scaled",
+                "on_surf",
+                "confidence",
+            ),
+            (
+                np.asarray(self.world_timestamps)[gaze_on_surf.frame_idc].tolist(),
+                gaze_on_surf.frame_idc.tolist(),
+                gaze_on_surf.timestamps.tolist(),
+                norm_pos[:, 0].tolist(),
+                norm_pos[:, 1].tolist(),
+                (norm_pos[:, 0] * surface.real_world_size["x"]).tolist(),
+                (norm_pos[:, 1] * surface.real_world_size["y"]).tolist(),
+                gaze_on_surf.on_surf.tolist(),
+                gaze_on_surf.confidences.tolist(),
+            ),
+        )
 
     def _export_fixations_on_surface(self, fixations_on_surf, surface, surface_name):
-        """
-        fixations_on_surf structure: fixations_on_surf[world_frame_idx][event_idx]
-        """
-        with open(
+        fixations = self.fixations[fixations_on_surf.event_idc]
+        norm_pos = fixations_on_surf.norm_pos
+        _write_csv(
             os.path.join(
                 self.metrics_dir, "fixations_on_surface" + surface_name + ".csv"
             ),
-            "w",
-            encoding="utf-8",
-            newline="",
-        ) as csv_file:
-            csv_writer = csv.writer(csv_file, delimiter=",")
-            csv_writer.writerow(
-                (
-                    "world_timestamp",
-                    "world_index",
-                    "fixation_id",
-                    "start_timestamp",
-                    "duration",
-                    "dispersion",
-                    "norm_pos_x",
-                    "norm_pos_y",
-                    "x_scaled",
-                    "y_scaled",
-                    "on_surf",
-                )
-            )
-            for world_idx, fixs_for_frame in enumerate(fixations_on_surf):
-                world_idx += self.export_range[0]
-                if fixs_for_frame:
-                    for fix in fixs_for_frame:
-                        csv_writer.writerow(
-                            (
-                                self.world_timestamps[world_idx],
-                                world_idx,
-                                fix["id"],
-                                fix["timestamp"],
-                                fix["duration"],
-                                fix["dispersion"],
-                                fix["norm_pos"][0],
-                                fix["norm_pos"][1],
-                                fix["norm_pos"][0] * surface.real_world_size["x"],
-                                fix["norm_pos"][1] * surface.real_world_size["y"],
-                                fix["on_surf"],
-                            )
-                        )
+            (
+                "world_timestamp",
+                "world_index",
+                "fixation_id",
+                "start_timestamp",
+                "duration",
+                "dispersion",
+                "norm_pos_x",
+                "norm_pos_y",
+                "x_scaled",
+                "y_scaled",
+                "on_surf",
+            ),
+            (
+                np.asarray(self.world_timestamps)[fixations_on_surf.frame_idc].tolist(),
+                fixations_on_surf.frame_idc.tolist(),
+                [fix["id"] for fix in fixations],
+                [fix["timestamp"] for fix in fixations],
+                [fix["duration"] for fix in fixations],
+                [fix["dispersion"] for fix in fixations],
+                norm_pos[:, 0].tolist(),
+                norm_pos[:, 1].tolist(),
+                (norm_pos[:, 0] * surface.real_world_size["x"]).tolist(),
+                (norm_pos[:, 1] * surface.real_world_size["y"]).tolist(),
+                fixations_on_surf.on_surf.tolist(),
+            ),
+        )
+
+
+def _write_csv(path, header, columns, row_format=None):
+    """Writes columns of values to a csv file at once.
+
+    Values are formatted with repr(), which matches csv.writer for numbers and
+    booleans, unless a row_format is given. Values must not need quoting.
+    """
+    if row_format is None:
+        row_format = ",".join(["%r"] * len(header))
+    rows = map(row_format.__mod__, zip(*columns))
+    with open(path, "w", encoding="utf-8", newline="") as csv_file:
+        # same line terminator as csv.writer
+        csv_file.write(",".join(header) + "\r\n")
+        for row in rows:
+            csv_file.write(row + "\r\n")
+
+
+def _format_matrices(matrices):
+    """Quoted csv fields of matrices, the same as csv.writer writes them"""
+    # numpy chooses the number format per matrix, so keep using str()
+    return [f'"{matrix}"' for matrix in matrices]
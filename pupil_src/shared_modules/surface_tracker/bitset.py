@@ -0,0 +1,138 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import typing as T
+
+import numpy as np
+
+_WORD_BITS = 64
+_FULL_WORD = (1 << _WORD_BITS) - 1
+
+
+def _lowest_bit(word: int) -> int:
+    return (word & -word).bit_length() - 1
+
+
+def _word_count(bit_count: int) -> int:
+    return -(-bit_count // _WORD_BITS)
+
+
+class Bitset:
+    """Fixed size set of bits that quickly finds the next unset bit.
+
+    Bits are stored in 64 bit words. A second level of words marks which of the words
+    are full, such that finding the next unset bit skips 4096 set bits per step.
+    Bits beyond the size are kept set, so they are never found as unset.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._words = [0] * _word_count(size)
+        self._full_words = [0] * _word_count(len(self._words))
+        self._set_padding()
+
+    @staticmethod
+    def from_bools(bools: T.Iterable[bool]) -> "Bitset":
+        bools = np.fromiter(bools, dtype=bool)
+        bitset = Bitset(len(bools))
+        padded = np.zeros(len(bitset._words) * _WORD_BITS, dtype=bool)
+        padded[: len(bools)] = bools
+        packed = np.packbits(padded, bitorder="little").view("<u8")
+        bitset._words = packed.tolist()
+        bitset._set_padding()
+        for word_idx, word in enumerate(bitset._words):
+            if word == _FULL_WORD:
+                bitset._mark_full(word_idx)
+        return bitset
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, idx: int) -> bool:
+        self._check_index(idx)
+        word_idx, bit_idx = divmod(idx, _WORD_BITS)
+        return bool(self._words[word_idx] >> bit_idx & 1)
+
+    def __setitem__(self, idx: int, value: bool):
+        self._check_index(idx)
+        word_idx, bit_idx = divmod(idx, _WORD_BITS)
+        if value:
+            word = self._words[word_idx] | (1 << bit_idx)
+            if word == _FULL_WORD:
+                self._mark_full(word_idx)
+        else:
+            word = self._words[word_idx] & ~(1 << bit_idx)
+            summary_idx, summary_bit_idx = divmod(word_idx, _WORD_BITS)
+            self._full_words[summary_idx] &= ~(1 << summary_bit_idx)
+        self._words[word_idx] = word
+
+    def next_unset(self, start: int, wrap_around=False) -> T.Optional[int]:
+        """Index of the first unset bit at or after start, None if there is none.
+
+        With wrap_around, the search continues from the beginning if there is no
+        unset bit after start.
+        """
+        if self.size == 0:
+            return None
+        next_idx = self._next_unset_from(start) if 0 <= start < self.size else None
+        if next_idx is None and wrap_around and start > 0:
+            next_idx = self._next_unset_from(0)
+        return next_idx
+
+    def to_array(self) -> np.ndarray:
+        words = np.array(self._words, dtype="<u8")
+        bits = np.unpackbits(words.view(np.uint8), bitorder="little")
+        return bits[: self.size].astype(bool)
+
+    def set_ranges(self) -> T.List[T.List[int]]:
+        """Ranges [first, last] of consecutive set bits"""
+        padded = np.concatenate(([False], self.to_array(), [False]))
+        changes = np.flatnonzero(padded[1:] != padded[:-1])
+        starts, stops = changes[::2], changes[1::2]
+        return np.stack([starts, stops - 1], axis=1).tolist()
+
+    def _next_unset_from(self, start):
+        word_idx, bit_idx = divmod(start, _WORD_BITS)
+        unset = ~self._words[word_idx] & (_FULL_WORD << bit_idx) & _FULL_WORD
+        if not unset:
+            word_idx = self._next_non_full_word(word_idx + 1)
+            if word_idx is None:
+                return None
+            unset = ~self._words[word_idx] & _FULL_WORD
+        return word_idx * _WORD_BITS + _lowest_bit(unset)
+
+    def _next_non_full_word(self, start):
+        summary_idx, bit_idx = divmod(start, _WORD_BITS)
+        while summary_idx < len(self._full_words):
+            summary = self._full_words[summary_idx]
+            non_full = ~summary & (_FULL_WORD << bit_idx) & _FULL_WORD
+            if non_full:
+                return summary_idx * _WORD_BITS + _lowest_bit(non_full)
+            summary_idx += 1
+            bit_idx = 0
+        return None
+
+    def _mark_full(self, word_idx):
+        summary_idx, bit_idx = divmod(word_idx, _WORD_BITS)
+        self._full_words[summary_idx] |= 1 << bit_idx
+
+    def _set_padding(self):
+        padding_start = self.size % _WORD_BITS
+        if padding_start:
+            self._words[-1] |= _FULL_WORD << padding_start & _FULL_WORD
+            if self._words[-1] == _FULL_WORD:
+                self._mark_full(len(self._words) - 1)
+        summary_padding_start = len(self._words) % _WORD_BITS
+        if summary_padding_start:
+            self._full_words[-1] |= _FULL_WORD << summary_padding_start & _FULL_WORD
+
+    def _check_index(self, idx):
+        if not 0 <= idx < self.size:
+            raise IndexError(f"Bit index {idx} out of range for size {self.size}")
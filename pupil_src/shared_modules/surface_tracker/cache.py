@@ -11,8 +11,11 @@ See COPYING and COPYING.LESSER for license details.
 
 import logging
 
+import numpy as np
+
+from .bitset import Bitset
+
 logger = logging.getLogger(__name__)
-import itertools
 
 
 class Cache(list):
@@ -30,37 +33,50 @@ class Cache(list):
 
         self.length = len(self)
 
-        self._positive_ranges = self.recompute_ranges(self.positive_eval_fn)
-        self._visited_ranges = self.recompute_ranges(self.visited_eval_fn)
+        entries = super().__iter__()
+        self._visited = Bitset.from_bools(map(self.visited_eval_fn, entries))
+        entries = super().__iter__()
+        self._positive = Bitset.from_bools(map(self.positive_eval_fn, entries))
+        self._visited_ranges = None
+        self._positive_ranges = None
 
     @property
     def visited_ranges(self):
+        if self._visited_ranges is None:
+            self._visited_ranges = self._visited.set_ranges()
         return self._visited_ranges
 
     @property
     def positive_ranges(self):
+        if self._positive_ranges is None:
+            self._positive_ranges = self._positive.set_ranges()
         return self._positive_ranges
 
+    @property
+    def visited(self) -> np.ndarray:
+        """Boolean array that is True for all visited entries"""
+        return self._visited.to_array()
+
+    def next_unvisited(self, start):
+        """Index of the next unvisited entry, searching from the start again if there
+        is none after start. None if all entries were visited."""
+        return self._visited.next_unset(start, wrap_around=True)
+
     def update(self, key, item, force=False):
         if self[key] is not None:
             if not force:
                 raise IndexError(
                     "Can not overwrite an already cached position without force!"
                 )
-            self[key] = item
-            self._visited_ranges = self.recompute_ranges(self.visited_eval_fn)
-            self._positive_ranges = self.recompute_ranges(self.positive_eval_fn)
-
-        elif item is not None:
-            # unvisited
-            self[key] = item
-
-            self.update_ranges(self._visited_ranges, key)
-            if self.positive_eval_fn(item):
-                self.update_ranges(self._positive_ranges, key)
-        else:
+        elif item is None:
             raise ValueError("`None` is not a valid value to be assigned in the cache!")
 
+        self[key] = item
+        self._visited[key] = self.visited_eval_fn(item)
+        self._positive[key] = self.positive_eval_fn(item)
+        self._visited_ranges = None
+        self._positive_ranges = None
+
     @staticmethod
     def visited_eval_fn(x):
         return x is not None
@@ -68,39 +84,3 @@ class Cache(list):
     @staticmethod
     def positive_eval_fn(x):
         return bool(x)
-
-    def recompute_ranges(self, eval_fn):
-        group_end_index = -1
-        ranges = []
-        for key, group in itertools.groupby(self, eval_fn):
-            group_start_index = group_end_index + 1
-            group_end_index += sum(1 for _ in group)
-            if key:
-                ranges.append([group_start_index, group_end_index])
-        return ranges
-
-    @staticmethod
-    def update_ranges(ranges, index):
-        for _range in ranges:
-            # most common case: extend a range
-            if index == _range[0] - 1:
-                _range[0] = index
-                Cache.merge_ranges(ranges)
-                return
-            elif index == _range[1] + 1:
-                _range[1] = index
-                Cache.merge_ranges(ranges)
-                return
-        # somewhere outside of range proximity
-        ranges.append([index, index])
-        ranges.sort(key=lambda x: x[0])
-
-    @staticmethod
-    def merge_ranges(ranges):
-        for i in range(len(ranges) - 1):
-            if ranges[i][1] == ranges[i + 1][0] - 1:
-                # merge touching fields
-                ranges[i] = [ranges[i][0], ranges[i + 1][1]]
-                # del second field
-                del ranges[i + 1]
-                return
@@ -0,0 +1,130 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import hashlib
+import logging
+import os
+import typing as T
+
+import msgpack
+import numpy as np
+
+from .cache import Cache
+from .surface import Surface_Location
+
+logger = logging.getLogger(__name__)
+
+_TRANSFORMATIONS = (
+    "dist_img_to_surf_trans",
+    "surf_to_dist_img_trans",
+    "img_to_surf_trans",
+    "surf_to_img_trans",
+)
+
+
+class Surface_Location_Cache_Store:
+    """
+    Persists complete surface location caches, one file per cache key.
+
+    The key identifies everything the locations are computed from, e.g. the surface
+    definition, the marker cache and the camera intrinsics (see `key`). A surface
+    whose inputs did not change finds its locations by key, while an edited surface
+    gets a new key and needs to be recomputed.
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    @staticmethod
+    def key(**inputs) -> str:
+        """Key for the location cache computed from the given inputs, which need to
+        be serializable with msgpack."""
+        packed = msgpack.packb(
+            [Surface_Location_Cache_Store.VERSION, sorted(inputs.items())],
+            use_bin_type=True,
+            default=_ndarray_to_list,
+        )
+        return hashlib.sha1(packed).hexdigest()
+
+    def load(self, key: str, frame_count: int) -> T.Optional[Cache]:
+        try:
+            with np.load(self._path(key)) as data:
+                detected_idc = data["detected_idc"]
+                num_detected_markers = data["num_detected_markers"]
+                transformations = {name: data[name] for name in _TRANSFORMATIONS}
+                stored_frame_count = int(data["frame_count"])
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.debug(f"Could not read surface location cache {key}", exc_info=True)
+            return None
+        if stored_frame_count != frame_count:
+            return None
+
+        locations = [Surface_Location(detected=False) for _ in range(frame_count)]
+        for row, frame_idx in enumerate(detected_idc.tolist()):
+            locations[frame_idx] = Surface_Location(
+                detected=True,
+                num_detected_markers=int(num_detected_markers[row]),
+                **{name: trans[row] for name, trans in transformations.items()},
+            )
+        return Cache(locations)
+
+    def save(self, key: str, location_cache: Cache):
+        """Saves a location cache that has an entry for every frame"""
+        if location_cache.next_unvisited(0) is not None:
+            raise ValueError("Only complete location caches can be saved!")
+        if os.path.exists(self._path(key)):
+            return
+
+        detected = [location for location in location_cache if location.detected]
+        arrays = {
+            name: np.array(
+                [getattr(location, name) for location in detected], dtype=np.float64
+            ).reshape(-1, 3, 3)
+            for name in _TRANSFORMATIONS
+        }
+        os.makedirs(self._directory, exist_ok=True)
+        # write to a temporary file first, such that there are no incomplete caches
+        tmp_path = self._path(key) + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            frame_count=len(location_cache),
+            detected_idc=np.array(
+                [idx for idx, location in enumerate(location_cache) if location],
+                dtype=np.int64,
+            ),
+            num_detected_markers=np.array(
+                [location.num_detected_markers for location in detected],
+                dtype=np.int64,
+            ),
+            **arrays,
+        )
+        os.replace(tmp_path, self._path(key))
+
+    def remove_all_except(self, keys: T.Iterable[str]):
+        """Removes caches that are no longer used, e.g. of edited surfaces"""
+        if not os.path.isdir(self._directory):
+            return
+        kept_file_names = {os.path.basename(self._path(key)) for key in keys}
+        for file_name in os.listdir(self._directory):
+            if file_name.endswith(".npz") and file_name not in kept_file_names:
+                os.remove(os.path.join(self._directory, file_name))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.npz")
+
+
+def _ndarray_to_list(o):
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    return o
@@ -0,0 +1,269 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import logging
+import os
+import typing as T
+
+import msgpack
+import numpy as np
+
+import file_methods
+
+from .cache import Cache
+from .surface_marker import Surface_Marker
+
+logger = logging.getLogger(__name__)
+
+
+class Marker_Cache_Store:
+    """
+    Persists the marker cache of the offline surface tracker incrementally.
+
+    The markers of each frame are appended as one msgpack record to the records file,
+    while the index file gets a fixed size entry with the frame index, the position
+    of the record, the number of markers and their largest perimeter. Loading only
+    reads the index, markers are deserialized when their frame is accessed (see
+    Stored_Marker_Cache).
+    Cache relevant detector parameters are kept in a separate metadata file.
+    """
+
+    VERSION = 2
+
+    INDEX_DTYPE = np.dtype(
+        [
+            ("frame_index", "<i8"),
+            ("offset", "<i8"),
+            ("size", "<i4"),
+            ("marker_count", "<i4"),
+            ("max_perimeter", "<f8"),
+        ]
+    )
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._metadata = file_methods.Persistent_Dict(self._metadata_path)
+        self._records_file = None
+        self._index_file = None
+
+    @property
+    def _records_path(self):
+        return os.path.join(self._directory, "records")
+
+    @property
+    def _index_path(self):
+        return os.path.join(self._directory, "index")
+
+    @property
+    def _metadata_path(self):
+        return os.path.join(self._directory, "metadata")
+
+    @property
+    def metadata(self) -> T.Optional[dict]:
+        """Metadata the store was created with, None if it is empty or outdated"""
+        if self._metadata.get("version", None) != self.VERSION:
+            return None
+        if not os.path.exists(self._index_path):
+            return None
+        return self._metadata.get("metadata", None)
+
+    def clear(self, metadata: dict):
+        """Removes all stored markers and starts over with new metadata"""
+        self.close()
+        os.makedirs(self._directory, exist_ok=True)
+        for path in (self._records_path, self._index_path):
+            open(path, "wb").close()
+        self._metadata.clear()
+        self._metadata["version"] = self.VERSION
+        self._metadata["metadata"] = dict(metadata)
+        self._metadata.save()
+
+    def append(self, frame_index: int, markers: T.Sequence[Surface_Marker]):
+        if self._records_file is None:
+            self._records_file = open(self._records_path, "ab")
+            self._index_file = open(self._index_path, "ab")
+        record = msgpack.packb(markers, use_bin_type=True, default=_ndarray_to_list)
+        entry = np.array(
+            [
+                (
+                    frame_index,
+                    self._records_file.tell(),
+                    len(record),
+                    len(markers),
+                    _max_perimeter(markers),
+                )
+            ],
+            dtype=self.INDEX_DTYPE,
+        )
+        self._records_file.write(record)
+        self._index_file.write(entry.tobytes())
+
+    def flush(self):
+        """Writes appended markers to disk. Records are flushed before the index, such
+        that the index never points to missing records."""
+        if self._records_file is not None:
+            self._records_file.flush()
+            self._index_file.flush()
+
+    def close(self):
+        self.flush()
+        if self._records_file is not None:
+            self._records_file.close()
+            self._index_file.close()
+            self._records_file = None
+            self._index_file = None
+
+    def load(self, frame_count: int) -> "Stored_Marker_Cache":
+        """Marker cache with the stored frames, which are only read on access"""
+        self.flush()
+        index = self._load_index()
+        index = index[
+            (0 <= index["frame_index"]) & (index["frame_index"] < frame_count)
+        ]
+        return Stored_Marker_Cache(self._records_path, index, frame_count)
+
+    def _load_index(self) -> np.ndarray:
+        with open(self._index_path, "rb") as index_file:
+            data = index_file.read()
+        # drop incomplete entries, e.g. after a crash during writing
+        entry_count = len(data) // self.INDEX_DTYPE.itemsize
+        data = data[: entry_count * self.INDEX_DTYPE.itemsize]
+        index = np.frombuffer(data, dtype=self.INDEX_DTYPE)
+        records_size = os.path.getsize(self._records_path)
+        return index[index["offset"] + index["size"] <= records_size]
+
+
+class _Unread_Markers(T.NamedTuple):
+    offset: int
+    size: int
+
+
+class Stored_Marker_Cache(Cache):
+    """
+    Marker cache that deserializes the markers of a frame on first access.
+
+    Frames without markers are known from the store index and are filled in right
+    away. This keeps the visited and positive ranges correct without reading any
+    markers. Only the record of the accessed frame is read from the records file.
+    """
+
+    def __init__(self, records_path, index, frame_count):
+        entries = [None] * frame_count
+        self._max_perimeters = np.zeros(frame_count)
+        # later entries for the same frame overwrite earlier ones
+        for frame_index, offset, size, marker_count, max_perimeter in index.tolist():
+            if marker_count:
+                entries[frame_index] = _Unread_Markers(offset, size)
+            else:
+                entries[frame_index] = []
+            self._max_perimeters[frame_index] = max_perimeter
+        super().__init__(entries)
+        self._records_path = records_path
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[idx] for idx in range(*key.indices(len(self)))]
+        entry = super().__getitem__(key)
+        if isinstance(entry, _Unread_Markers):
+            with open(self._records_path, "rb") as records_file:
+                entry = self._read_markers(records_file, key, entry)
+        return entry
+
+    def __iter__(self):
+        with open(self._records_path, "rb") as records_file:
+            for idx in range(len(self)):
+                entry = super().__getitem__(idx)
+                if isinstance(entry, _Unread_Markers):
+                    entry = self._read_markers(records_file, idx, entry)
+                yield entry
+
+    def __reduce__(self):
+        # pickle as plain cache, e.g. for background processes
+        return Cache, (list(self),)
+
+    def update(self, key, item, force=False):
+        super().update(key, item, force=force)
+        self._max_perimeters[key] = _max_perimeter(item)
+
+    @property
+    def max_perimeters(self) -> np.ndarray:
+        """Largest marker perimeter per frame, 0 for frames without markers"""
+        return self._max_perimeters.copy()
+
+    def _read_markers(self, records_file, idx, unread: _Unread_Markers):
+        records_file.seek(unread.offset)
+        record = records_file.read(unread.size)
+        markers = [
+            Surface_Marker.deserialize(args)
+            for args in msgpack.unpackb(record, strict_map_key=False)
+        ]
+        super().__setitem__(idx, markers)
+        return markers
+
+
+class _Unfiltered_Markers(T.NamedTuple):
+    max_perimeter: float
+
+
+class Filtered_Marker_Cache(Cache):
+    """
+    View of a marker cache that only contains markers with at least min_perimeter.
+
+    Frames are filtered on first access. Whether a frame has any marker left is
+    known from the largest marker perimeter of each frame, which a
+    Stored_Marker_Cache knows without reading its markers.
+    """
+
+    def __init__(self, unfiltered: Cache, min_perimeter):
+        if isinstance(unfiltered, Stored_Marker_Cache):
+            max_perimeters = unfiltered.max_perimeters.tolist()
+        else:
+            max_perimeters = [_max_perimeter(markers) for markers in unfiltered]
+        entries = []
+        for visited, max_perimeter in zip(unfiltered.visited, max_perimeters):
+            if not visited:
+                entries.append(None)
+            elif max_perimeter >= min_perimeter:
+                entries.append(_Unfiltered_Markers(max_perimeter))
+            else:
+                entries.append([])
+        super().__init__(entries)
+        self._unfiltered = unfiltered
+        self._min_perimeter = min_perimeter
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[idx] for idx in range(*key.indices(len(self)))]
+        entry = super().__getitem__(key)
+        if isinstance(entry, _Unfiltered_Markers):
+            entry = [
+                m for m in self._unfiltered[key] if m.perimeter >= self._min_perimeter
+            ]
+            super().__setitem__(key, entry)
+        return entry
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __reduce__(self):
+        # pickle as plain cache, e.g. for background processes
+        return Cache, (list(self),)
+
+
+def _max_perimeter(markers) -> float:
+    return max((m.perimeter for m in markers or []), default=0.0)
+
+
+def _ndarray_to_list(o):
+    # apriltag detections can contain their pose as numpy arrays
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    return o
@@ -0,0 +1,133 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import logging
+import threading
+import typing as T
+
+import numpy as np
+
+from .surface import Surface, Surface_Location
+from .surface_marker import Surface_Marker
+
+logger = logging.getLogger(__name__)
+
+
+class Surface_Definition(T.NamedTuple):
+    """Registered markers of a defined surface at the time of a request"""
+
+    surface: Surface
+    registered_markers_undist: dict
+    registered_markers_dist: dict
+
+    @staticmethod
+    def from_surface(surface: Surface) -> "Surface_Definition":
+        # Copies of the mappings, such that markers can be added or removed while
+        # the surface is being located.
+        return Surface_Definition(
+            surface,
+            dict(surface.registered_markers_undist),
+            dict(surface.registered_markers_dist),
+        )
+
+
+class Marker_Detection_Request(T.NamedTuple):
+    frame_index: int
+    frame_timestamp: float
+    gray_img: np.ndarray
+    surface_definitions: T.List[Surface_Definition]
+    camera_model: T.Any
+
+
+class Marker_Detection_Result(T.NamedTuple):
+    frame_index: int
+    frame_timestamp: float
+    markers: T.List[Surface_Marker]
+    surface_locations: T.Dict[Surface, Surface_Location]
+
+
+class Marker_Detection_Thread:
+    """
+    Detects markers and locates surfaces in a background thread.
+
+    Only the latest request is kept, older requests that were not processed yet are
+    dropped. Results are tagged with the index and timestamp of the frame they were
+    computed from. Markers are detected with detect_markers(gray_img, frame_index),
+    which is only called from the background thread. To change the detector, set a
+    new function, which is used from the next request on.
+    """
+
+    def __init__(
+        self, detect_markers: T.Callable[[np.ndarray, int], T.List[Surface_Marker]]
+    ):
+        self.detect_markers = detect_markers
+        self._condition = threading.Condition()
+        self._request = None
+        self._result = None
+        self._should_stop = False
+        self._thread = threading.Thread(
+            target=self._run, name="Surface Tracker Marker Detection", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, request: Marker_Detection_Request):
+        with self._condition:
+            self._request = request
+            self._condition.notify()
+
+    def fetch(self) -> T.Optional[Marker_Detection_Result]:
+        """Latest result that was not fetched yet, None if there is none"""
+        with self._condition:
+            result, self._result = self._result, None
+        return result
+
+    def stop(self, timeout=1.0):
+        with self._condition:
+            self._should_stop = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._request is not None or self._should_stop
+                )
+                if self._should_stop:
+                    return
+                request, self._request = self._request, None
+
+            try:
+                result = self._process(self.detect_markers, request)
+            except Exception:
+                logger.exception("Error during marker detection!")
+                continue
+
+            with self._condition:
+                self._result = result
+
+    @staticmethod
+    def _process(
+        detect_markers, request: Marker_Detection_Request
+    ) -> Marker_Detection_Result:
+        markers = detect_markers(request.gray_img, request.frame_index)
+        markers_by_uid = {m.uid: m for m in markers}
+        surface_locations = {
+            definition.surface: Surface.locate(
+                markers_by_uid,
+                request.camera_model,
+                definition.registered_markers_undist,
+                definition.registered_markers_dist,
+            )
+            for definition in request.surface_definitions
+        }
+        return Marker_Detection_Result(
+            request.frame_index, request.frame_timestamp, markers, surface_locations
+        )
@@ -24,6 +24,7 @@ class marker_detection_callable(MarkerDetectorController):
             apriltag_nthreads=detector._apriltag_nthreads,
             apriltag_quad_decimate=detector.apriltag_quad_decimate,
             apriltag_decode_sharpening=detector.apriltag_decode_sharpening,
+            marker_roi_tracking=detector.marker_roi_tracking,
         )
 
     def __call__(self, frame):
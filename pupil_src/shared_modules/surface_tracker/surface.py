@@ -227,6 +227,86 @@ class Surface(abc.ABC):
         img_points.shape = orig_shape
         return img_points
 
+    @staticmethod
+    def map_gaze_positions_to_surf(norm_pos, camera_model, trans_matrices):
+        """Map gaze positions from normalized image space to normalized surface space.
+
+        All positions are undistorted at once, and transformed with one
+        transformation matrix each, which is much faster than mapping them one by
+        one with `map_to_surf`.
+
+        Args:
+            norm_pos (ndarray): Normalized gaze positions with shape (N, 2).
+            camera_model: Camera Model object.
+            trans_matrices (ndarray): Image to surface transformation matrices. Either
+            one matrix per position with shape (N, 3, 3) or a single matrix with
+            shape (3, 3) for all positions.
+
+        Returns:
+            ndarray: Positions in normalized surface space with shape (N, 2).
+
+        """
+        img_points = Surface.undistort_gaze_positions(norm_pos, camera_model)
+        return Surface.map_undistorted_points_to_surf(img_points, trans_matrices)
+
+    @staticmethod
+    def undistort_gaze_positions(norm_pos, camera_model):
+        """Map gaze positions from normalized image space to undistorted image pixel
+        space.
+
+        The result does not depend on the surface, so it can be computed once and
+        mapped onto all surfaces with `map_undistorted_points_to_surf`.
+
+        Args:
+            norm_pos (ndarray): Normalized gaze positions with shape (N, 2).
+            camera_model: Camera Model object.
+
+        Returns:
+            ndarray: Undistorted image points with shape (N, 2).
+
+        """
+        norm_pos = np.asarray(norm_pos, dtype=np.float64).reshape(-1, 2)
+        if not len(norm_pos):
+            return np.empty((0, 2))
+
+        width, height = camera_model.resolution
+        img_points = np.empty_like(norm_pos)
+        img_points[:, 0] = norm_pos[:, 0] * width
+        img_points[:, 1] = (1.0 - norm_pos[:, 1]) * height
+        img_points = camera_model.undistort_points_on_image_plane(img_points)
+        return np.asarray(img_points, dtype=np.float64).reshape(-1, 2)
+
+    @staticmethod
+    def map_undistorted_points_to_surf(img_points, trans_matrices):
+        """Map undistorted image points to normalized surface space.
+
+        Args:
+            img_points (ndarray): Undistorted image points with shape (N, 2).
+            trans_matrices (ndarray): Image to surface transformation matrices. Either
+            one matrix per point with shape (N, 3, 3) or a single matrix with shape
+            (3, 3) for all points.
+
+        Returns:
+            ndarray: Points in normalized surface space with shape (N, 2).
+
+        """
+        img_points = np.asarray(img_points, dtype=np.float64).reshape(-1, 2)
+        if not len(img_points):
+            return np.empty((0, 2))
+
+        img_points = np.hstack((img_points, np.ones((len(img_points), 1))))
+        trans_matrices = np.asarray(trans_matrices, dtype=np.float64)
+        if trans_matrices.ndim == 2:
+            surf_points = img_points @ trans_matrices.T
+        else:
+            surf_points = np.einsum("nij,nj->ni", trans_matrices, img_points)
+
+        # Same as cv2.perspectiveTransform(), which maps points at infinity to 0
+        w = surf_points[:, 2:]
+        valid = np.abs(w) > np.finfo(np.float32).eps
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(valid, surf_points[:, :2] / w, 0.0)
+
     def map_gaze_and_fixation_events(self, events, camera_model, trans_matrix=None):
         """
         Map a list of gaze or fixation events onto the surface and return the
@@ -243,35 +323,21 @@ class Surface(abc.ABC):
             List of gaze or fixation on surface events.
 
         """
-        results = []
-        for event in events:
-            gaze_norm_pos = event["norm_pos"]
-            gaze_img_point = methods.denormalize(
-                gaze_norm_pos, camera_model.resolution, flip_y=True
-            )
-            gaze_img_point = np.array(gaze_img_point)
-            surf_norm_pos = self.map_to_surf(
-                gaze_img_point,
-                camera_model,
-                compensate_distortion=True,
-                trans_matrix=trans_matrix,
+        if not len(events):
+            return []
+        if trans_matrix is None:
+            trans_matrix = self.img_to_surf_trans
+
+        surf_norm_pos = self.map_gaze_positions_to_surf(
+            [event["norm_pos"] for event in events], camera_model, trans_matrix
+        )
+        on_surf = _on_surf(surf_norm_pos)
+        return [
+            _gaze_on_surface_datum(event, norm_pos, on_srf)
+            for event, norm_pos, on_srf in zip(
+                events, surf_norm_pos.tolist(), on_surf.tolist()
             )
-            on_srf = bool((0 <= surf_norm_pos[0] <= 1) and (0 <= surf_norm_pos[1] <= 1))
-
-            mapped_datum = {
-                "topic": f"{event['topic']}_on_surface",
-                "norm_pos": surf_norm_pos.tolist(),
-                "confidence": event["confidence"],
-                "on_surf": on_srf,
-                "base_data": (event["topic"], event["timestamp"]),
-                "timestamp": event["timestamp"],
-            }
-            if event["topic"] == "fixations":
-                mapped_datum["id"] = event["id"]
-                mapped_datum["duration"] = event["duration"]
-                mapped_datum["dispersion"] = event["dispersion"]
-            results.append(mapped_datum)
-        return results
+        ]
 
     @abc.abstractmethod
     def update_location(self, frame_idx, visible_markers, camera_model):
@@ -595,15 +661,19 @@ class Surface(abc.ABC):
 
     def update_heatmap(self, gaze_on_surf):
         """Compute the gaze distribution heatmap based on given gaze events."""
+        norm_pos = [g["norm_pos"] for g in gaze_on_surf if g["on_surf"]]
+        self.update_heatmap_from_norm_pos(np.array(norm_pos).reshape(-1, 2))
 
-        heatmap_data = [g["norm_pos"] for g in gaze_on_surf if g["on_surf"]]
+    def update_heatmap_from_norm_pos(self, norm_pos):
+        """Compute the gaze distribution heatmap based on gaze positions with shape
+        (N, 2) in normalized surface coordinates."""
         aspect_ratio = self.real_world_size["y"] / self.real_world_size["x"]
         grid = (
             max(1, int(self._heatmap_resolution * aspect_ratio)),
             int(self._heatmap_resolution),
         )
-        if heatmap_data:
-            xvals, yvals = zip(*((x, 1.0 - y) for x, y in heatmap_data))
+        if len(norm_pos):
+            xvals, yvals = norm_pos[:, 0], 1.0 - norm_pos[:, 1]
             hist, *edges = np.histogram2d(
                 yvals, xvals, bins=grid, range=[[0, 1.0], [0, 1.0]], normed=False
             )
@@ -702,3 +772,102 @@ class Surface_Location:
 
     def __bool__(self):
         return self.detected
+
+
+class Undistorted_Gaze(typing.NamedTuple):
+    """
+    Gaze positions in undistorted image space together with their confidences.
+
+    This is the surface independent part of mapping gaze onto surfaces. Computed
+    once for all gaze of a recording, it can be shared between all surfaces.
+    """
+
+    img_points: np.ndarray  # shape (N, 2)
+    confidences: np.ndarray
+
+    @staticmethod
+    def from_events(events, camera_model) -> "Undistorted_Gaze":
+        norm_pos = [event["norm_pos"] for event in events]
+        return Undistorted_Gaze(
+            img_points=Surface.undistort_gaze_positions(norm_pos, camera_model),
+            confidences=np.array([event["confidence"] for event in events]),
+        )
+
+    def take(self, idc) -> "Undistorted_Gaze":
+        return Undistorted_Gaze(self.img_points[idc], self.confidences[idc])
+
+
+class Gaze_On_Surface_Batch(typing.NamedTuple):
+    """
+    Gaze or fixation events mapped onto a surface, stored column-wise with one row
+    per event.
+
+    Events are referenced by their index in the mapped data (e.g. a Bisector of gaze
+    positions), such that batches are cheap to send between processes. Use
+    `to_events_per_frame` to get the same events as `map_gaze_and_fixation_events`.
+    """
+
+    frame_idc: np.ndarray  # world frame index
+    event_idc: np.ndarray
+    timestamps: np.ndarray
+    confidences: np.ndarray
+    norm_pos: np.ndarray  # normalized surface coordinates, shape (N, 2)
+
+    @staticmethod
+    def empty() -> "Gaze_On_Surface_Batch":
+        return Gaze_On_Surface_Batch(
+            frame_idc=np.empty(0, dtype=np.int64),
+            event_idc=np.empty(0, dtype=np.int64),
+            timestamps=np.empty(0),
+            confidences=np.empty(0),
+            norm_pos=np.empty((0, 2)),
+        )
+
+    def __len__(self):
+        return len(self.event_idc)
+
+    @property
+    def on_surf(self) -> np.ndarray:
+        return _on_surf(self.norm_pos)
+
+    def to_events_per_frame(self, all_events, frame_idc) -> typing.List[list]:
+        """Gaze/fixation on surface events for each of the given world frames
+
+        Args:
+            all_events: The mapped data, indexable by `event_idc`.
+            frame_idc: Sorted world frame indices that contain all `frame_idc` of
+            the batch.
+        """
+        events_per_frame = [[] for _ in frame_idc]
+        positions = np.searchsorted(frame_idc, self.frame_idc).tolist()
+        for position, event_idx, norm_pos, on_srf in zip(
+            positions,
+            self.event_idc.tolist(),
+            self.norm_pos.tolist(),
+            self.on_surf.tolist(),
+        ):
+            event = all_events[event_idx]
+            events_per_frame[position].append(
+                _gaze_on_surface_datum(event, norm_pos, on_srf)
+            )
+        return events_per_frame
+
+
+def _on_surf(surf_norm_pos):
+    return np.all((0 <= surf_norm_pos) & (surf_norm_pos <= 1), axis=1)
+
+
+def _gaze_on_surface_datum(event, norm_pos, on_surf):
+    mapped_datum = {
+        "topic": f"{event['topic']}_on_surface",
+        "norm_pos": norm_pos,
+        "confidence": event["confidence"],
+        "on_surf": on_surf,
+        "base_data": (event["topic"], event["timestamp"]),
+        "timestamp": event["timestamp"],
+    }
+    if event["topic"] == "fixations":
+        mapped_datum["id"] = event["id"]
+        mapped_datum["duration"] = event["duration"]
+        mapped_datum["dispersion"] = event["dispersion"]
+    return mapped_datum
@@ -12,8 +12,11 @@ See COPYING and COPYING.LESSER for license details.
 import abc
 import enum
 import logging
+import math
 import typing as T
 
+import cv2
+import numpy as np
 import square_marker_detect
 import pupil_apriltags
 
@@ -26,8 +29,12 @@ __all__ = [
     "MarkerDetectorMode",
     "MarkerType",
     "ApriltagFamily",
+    "Marker_ROI_Tracker",
 ]
 
+# Region of interest (x_min, y_min, x_max, y_max) in pixels, max exclusive
+ROI = T.Tuple[int, int, int, int]
+
 
 @enum.unique
 class MarkerType(enum.Enum):
@@ -107,8 +114,17 @@ class Surface_Base_Marker_Detector(metaclass=abc.ABCMeta):
             self.detect_markers_iter(gray_img=gray_img, frame_index=frame_index)
         )
 
+    @abc.abstractmethod
+    def detect_markers_in_roi(self, gray_img, roi: ROI) -> T.List[Surface_Marker]:
+        """Detects markers in a region of the image, independent of previous frames.
+        Marker vertices are in full image coordinates."""
+        pass
+
 
 class Surface_Square_Marker_Detector(Surface_Base_Marker_Detector):
+    GRID_SIZE = 5
+    APERTURE = 9
+
     def __init__(
         self,
         marker_min_perimeter: int = ...,
@@ -167,15 +183,11 @@ class Surface_Square_Marker_Detector(Surface_Base_Marker_Detector):
             # better marker positions. But if we would not have seeked we could
             # have used this information! This looks like an inconsistency!
 
-        grid_size = 5
-        aperture = 9
-        min_perimeter = self.marker_min_perimeter
-
         markers = square_marker_detect.detect_markers_robust(
             gray_img=gray_img,
-            grid_size=grid_size,
-            min_marker_perimeter=min_perimeter,
-            aperture=aperture,
+            grid_size=self.GRID_SIZE,
+            min_marker_perimeter=self.marker_min_perimeter,
+            aperture=self.APERTURE,
             prev_markers=self.__previous_raw_markers,
             true_detect_every_frame=true_detect_every_frame,
             invert_image=self.__inverted_markers,
@@ -189,6 +201,24 @@ class Surface_Square_Marker_Detector(Surface_Base_Marker_Detector):
         markers = filter(self._surface_marker_filter, markers)
         return markers
 
+    def detect_markers_in_roi(self, gray_img, roi: ROI) -> T.List[Surface_Marker]:
+        x_min, y_min, x_max, y_max = roi
+        roi_img = gray_img[y_min:y_max, x_min:x_max]
+        if self.__inverted_markers:
+            roi_img = 255 - roi_img
+        markers = square_marker_detect.detect_markers(
+            gray_img=np.ascontiguousarray(roi_img),
+            grid_size=self.GRID_SIZE,
+            min_marker_perimeter=self.marker_min_perimeter,
+            aperture=self.APERTURE,
+        )
+        offset = np.array([x_min, y_min], dtype=np.float32)
+        for marker in markers:
+            marker["verts"] = (np.asarray(marker["verts"]) + offset).tolist()
+            marker["centroid"] = (np.asarray(marker["centroid"]) + offset).tolist()
+        markers = map(Surface_Marker.from_square_tag_detection, markers)
+        return list(filter(self._surface_marker_filter, markers))
+
 
 class Surface_Apriltag_V3_Marker_Detector_Params:
     def __init__(
@@ -264,6 +294,152 @@ class Surface_Apriltag_V3_Marker_Detector(Surface_Base_Marker_Detector):
         markers = map(Surface_Marker.from_apriltag_v3_detection, markers)
         return markers
 
+    def detect_markers_in_roi(self, gray_img, roi: ROI) -> T.List[Surface_Marker]:
+        x_min, y_min, x_max, y_max = roi
+        roi_img = np.ascontiguousarray(gray_img[y_min:y_max, x_min:x_max])
+        markers = self._detector.detect(img=roi_img)
+        translation = np.array([[1, 0, x_min], [0, 1, y_min], [0, 0, 1]], dtype=float)
+        for marker in markers:
+            marker.corners = marker.corners + (x_min, y_min)
+            marker.center = marker.center + (x_min, y_min)
+            marker.homography = translation @ marker.homography
+        return list(map(Surface_Marker.from_apriltag_v3_detection, markers))
+
+
+class Marker_ROI_Tracker:
+    """
+    Detects markers in padded regions around the markers of the previous frame.
+
+    Markers usually move little between consecutive frames, such that searching the
+    regions around their last positions is much faster than searching the full
+    image. The vertices can be propagated with optical flow before computing the
+    regions. The full image is searched every full_detection_interval frames, to
+    find markers that entered the image, and whenever a tracked marker is lost or
+    frames are not consecutive.
+    """
+
+    MIN_ROI_PADDING = 16  # px
+
+    def __init__(
+        self,
+        full_detection_interval: int = 10,
+        roi_padding: float = 0.5,
+        use_optical_flow: bool = False,
+    ):
+        self.full_detection_interval = full_detection_interval
+        # padding relative to the larger side of the marker bounding box
+        self.roi_padding = roi_padding
+        self.use_optical_flow = use_optical_flow
+        self.reset()
+
+    def reset(self):
+        self._previous_markers = []
+        self._previous_frame_index = None
+        self._previous_img = None
+        self._frames_since_full_detection = 0
+
+    def detect_markers(
+        self, detector: Surface_Base_Marker_Detector, gray_img, frame_index: int
+    ) -> T.List[Surface_Marker]:
+        markers = None
+        if self._should_track(frame_index):
+            markers = [
+                marker
+                for roi in self.rois(gray_img)
+                for marker in detector.detect_markers_in_roi(gray_img, roi)
+            ]
+            tracked_uids = {marker.uid for marker in self._previous_markers}
+            if not tracked_uids.issubset(marker.uid for marker in markers):
+                # track loss
+                markers = None
+
+        if markers is None:
+            height, width = gray_img.shape[:2]
+            markers = detector.detect_markers_in_roi(gray_img, (0, 0, width, height))
+            self._frames_since_full_detection = 0
+        else:
+            self._frames_since_full_detection += 1
+
+        self._previous_markers = markers
+        self._previous_frame_index = frame_index
+        if self.use_optical_flow:
+            self._previous_img = gray_img.copy()
+        return markers
+
+    def _should_track(self, frame_index: int) -> bool:
+        return (
+            bool(self._previous_markers)
+            and frame_index - 1 == self._previous_frame_index
+            and self._frames_since_full_detection + 1 < self.full_detection_interval
+        )
+
+    def rois(self, gray_img) -> T.List[ROI]:
+        """Regions to search for the markers of the previous frame"""
+        height, width = gray_img.shape[:2]
+        rois = []
+        for verts in self._tracked_verts(gray_img):
+            (x_min, y_min), (x_max, y_max) = verts.min(axis=0), verts.max(axis=0)
+            padding = max(
+                self.MIN_ROI_PADDING,
+                self.roi_padding * max(x_max - x_min, y_max - y_min),
+            )
+            roi = (
+                max(0, math.floor(x_min - padding)),
+                max(0, math.floor(y_min - padding)),
+                min(width, math.ceil(x_max + padding)),
+                min(height, math.ceil(y_max + padding)),
+            )
+            if roi[0] < roi[2] and roi[1] < roi[3]:
+                rois.append(roi)
+        return _merge_overlapping_rois(rois)
+
+    def _tracked_verts(self, gray_img) -> np.ndarray:
+        """Vertices of the previous markers, with shape (marker count, N, 2)"""
+        verts = np.array(
+            [marker.verts_px for marker in self._previous_markers], dtype=np.float32
+        ).reshape(-1, 4, 2)
+        if (
+            self.use_optical_flow
+            and self._previous_img is not None
+            and self._previous_img.shape == gray_img.shape
+        ):
+            flow_verts, found, _ = cv2.calcOpticalFlowPyrLK(
+                self._previous_img, gray_img, verts.reshape(-1, 1, 2), None
+            )
+            found = found.reshape(-1, 4, 1).astype(bool)
+            flow_verts = np.where(found, flow_verts.reshape(-1, 4, 2), verts)
+            # keep the previous vertices as well, in case the flow is off
+            verts = np.concatenate((verts, flow_verts), axis=1)
+        return verts
+
+
+def _merge_overlapping_rois(rois: T.List[ROI]) -> T.List[ROI]:
+    """Merges overlapping regions, such that no marker is detected twice"""
+    merged = []
+    for roi in rois:
+        overlapping = [other for other in merged if _rois_overlap(roi, other)]
+        while overlapping:
+            for other in overlapping:
+                merged.remove(other)
+                roi = (
+                    min(roi[0], other[0]),
+                    min(roi[1], other[1]),
+                    max(roi[2], other[2]),
+                    max(roi[3], other[3]),
+                )
+            overlapping = [other for other in merged if _rois_overlap(roi, other)]
+        merged.append(roi)
+    return merged
+
+
+def _rois_overlap(roi: ROI, other: ROI) -> bool:
+    return (
+        roi[0] < other[2]
+        and other[0] < roi[2]
+        and roi[1] < other[3]
+        and other[1] < roi[3]
+    )
+
 
 class MarkerDetectorController(Surface_Base_Marker_Detector):
     def __init__(
@@ -275,6 +451,7 @@ class MarkerDetectorController(Surface_Base_Marker_Detector):
         apriltag_nthreads: int = 2,
         apriltag_quad_decimate: float = ...,
         apriltag_decode_sharpening: float = ...,
+        marker_roi_tracking: bool = False,
     ):
         self._marker_detector_mode = marker_detector_mode
         self._marker_min_perimeter = marker_min_perimeter
@@ -286,6 +463,8 @@ class MarkerDetectorController(Surface_Base_Marker_Detector):
         self._apriltag_quad_decimate = apriltag_quad_decimate
         self._apriltag_decode_sharpening = apriltag_decode_sharpening
 
+        self._marker_roi_tracking = marker_roi_tracking
+
         self.init_detector()
 
     def init_detector(self):
@@ -310,6 +489,7 @@ class MarkerDetectorController(Surface_Base_Marker_Detector):
                 square_marker_inverted_markers=self._square_marker_inverted_markers,
                 square_marker_use_online_mode=self._square_marker_use_online_mode,
             )
+        self.__roi_tracker = Marker_ROI_Tracker() if self._marker_roi_tracking else None
 
     @property
     def inverted_markers(self) -> bool:
@@ -360,9 +540,26 @@ class MarkerDetectorController(Surface_Base_Marker_Detector):
         if self.marker_detector_mode.marker_type == MarkerType.APRILTAG_MARKER:
             self.init_detector()
 
+    @property
+    def marker_roi_tracking(self) -> bool:
+        return self._marker_roi_tracking
+
+    @marker_roi_tracking.setter
+    def marker_roi_tracking(self, value: bool):
+        self._marker_roi_tracking = value
+        self.init_detector()
+
     def detect_markers_iter(
         self, gray_img, frame_index: int
     ) -> T.Iterable[Surface_Marker]:
-        yield from self.__detector.detect_markers_iter(
-            gray_img=gray_img, frame_index=frame_index
-        )
+        if self.__roi_tracker is not None:
+            yield from self.__roi_tracker.detect_markers(
+                self.__detector, gray_img=gray_img, frame_index=frame_index
+            )
+        else:
+            yield from self.__detector.detect_markers_iter(
+                gray_img=gray_img, frame_index=frame_index
+            )
+
+    def detect_markers_in_roi(self, gray_img, roi: ROI) -> T.List[Surface_Marker]:
+        return self.__detector.detect_markers_in_roi(gray_img, roi)
@@ -9,15 +9,22 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import itertools
 import logging
 import multiprocessing
 import platform
+import typing as T
 
-import player_methods
+import numpy as np
 
 from . import background_tasks, offline_utils
 from .cache import Cache
-from .surface import Surface, Surface_Location
+from .surface import (
+    Gaze_On_Surface_Batch,
+    Surface,
+    Surface_Location,
+    Undistorted_Gaze,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -54,28 +61,91 @@ class Surface_Offline(Surface):
     def __setstate__(self, state):
         self.__dict__.update(state)
 
-    def map_section(self, section, all_world_timestamps, all_gaze_events, camera_model):
+    def map_section(
+        self,
+        section,
+        all_world_timestamps,
+        all_gaze_events,
+        camera_model,
+        undistorted_gaze: T.Optional[Undistorted_Gaze] = None,
+    ):
+        frame_idc = np.arange(len(all_world_timestamps))[section]
+        batch = self.map_section_batch(
+            section,
+            all_world_timestamps,
+            all_gaze_events,
+            camera_model,
+            undistorted_gaze,
+        )
+        if batch is None:
+            return []
+        return batch.to_events_per_frame(all_gaze_events, frame_idc)
+
+    def map_section_batch(
+        self,
+        section,
+        all_world_timestamps,
+        all_gaze_events,
+        camera_model,
+        undistorted_gaze: T.Optional[Undistorted_Gaze] = None,
+    ) -> T.Optional[Gaze_On_Surface_Batch]:
+        """Maps all gaze events of the frames in section at once.
+
+        undistorted_gaze can be computed once for all_gaze_events and shared between
+        surfaces. Otherwise the gaze of the section is undistorted for this surface.
+        Returns None if the surface locations are not cached.
+        """
         try:
             location_cache = self.location_cache[section]
         except TypeError:
-            return []
+            return None
+
+        frame_idc = np.arange(len(all_world_timestamps))[section]
+        detected = [bool(location) for location in location_cache]
+        if not any(detected):
+            return Gaze_On_Surface_Batch.empty()
+        frame_idc = frame_idc[detected]
+        trans_matrices = np.array(
+            [
+                location.img_to_surf_trans
+                for location in itertools.compress(location_cache, detected)
+            ]
+        )
 
-        section_gaze_on_surf = []
-        for frame_idx, location in enumerate(location_cache):
-            frame_idx += section.start
-            if location and location.detected:
-                frame_window = player_methods.enclosing_window(
-                    all_world_timestamps, frame_idx
-                )
-                gaze_events = all_gaze_events.by_ts_window(frame_window)
+        # Enclosing window of each frame, see player_methods.enclosing_window()
+        world_ts = np.asarray(all_world_timestamps, dtype=np.float64)
+        midpoints = (world_ts[1:] + world_ts[:-1]) / 2.0
+        window_bounds = np.concatenate(([-np.inf], midpoints, [np.inf]))
+        start_idc, stop_idc = all_gaze_events.start_stop_idc_for_windows(
+            window_bounds[frame_idc], window_bounds[frame_idc + 1]
+        )
+        event_counts = np.maximum(stop_idc - start_idc, 0)
+        event_count = event_counts.sum()
+        if not event_count:
+            return Gaze_On_Surface_Batch.empty()
+
+        # Index of every event in all_gaze_events, grouped by frame
+        first_rows = np.cumsum(event_counts) - event_counts
+        event_idc = np.arange(event_count) + np.repeat(
+            start_idc - first_rows, event_counts
+        )
+        if undistorted_gaze is None:
+            gaze = Undistorted_Gaze.from_events(
+                all_gaze_events[event_idc], camera_model
+            )
+        else:
+            gaze = undistorted_gaze.take(event_idc)
 
-                gaze_on_surf = self.map_gaze_and_fixation_events(
-                    gaze_events, camera_model, trans_matrix=location.img_to_surf_trans
-                )
-            else:
-                gaze_on_surf = []
-            section_gaze_on_surf.append(gaze_on_surf)
-        return section_gaze_on_surf
+        surf_norm_pos = self.map_undistorted_points_to_surf(
+            gaze.img_points, np.repeat(trans_matrices, event_counts, axis=0)
+        )
+        return Gaze_On_Surface_Batch(
+            frame_idc=np.repeat(frame_idc, event_counts),
+            event_idc=event_idc,
+            timestamps=all_gaze_events.timestamps[event_idc],
+            confidences=gaze.confidences,
+            norm_pos=surf_norm_pos,
+        )
 
     def update_location(self, frame_idx, marker_cache, camera_model):
         if not self.defined:
@@ -155,6 +225,13 @@ class Surface_Offline(Surface):
                 self.location_cache_filler = None
                 self.on_surface_change(self)
 
+    def restore_location_cache(self, location_cache: Cache):
+        """Replaces the location cache with a previously computed one"""
+        if self.location_cache_filler is not None:
+            self.location_cache_filler.cancel()
+            self.location_cache_filler = None
+        self.location_cache = location_cache
+
     def update_location_cache(self, frame_idx, marker_cache, camera_model):
         """ Update a single entry in the location cache."""
 
@@ -35,7 +35,9 @@ class Surface_Online(Surface):
             self.registered_markers_undist,
             self.registered_markers_dist,
         )
+        self.set_location(location)
 
+    def set_location(self, location):
         self.detected = location.detected
         self.dist_img_to_surf_trans = location.dist_img_to_surf_trans
         self.surf_to_dist_img_trans = location.surf_to_dist_img_trans
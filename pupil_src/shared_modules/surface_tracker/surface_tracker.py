@@ -64,6 +64,7 @@ class Surface_Tracker(Plugin, metaclass=ABCMeta):
         use_online_detection: bool = False,
         use_high_res=APRILTAG_HIGH_RES_ON,
         sharpen=APRILTAG_SHARPENING_ON,
+        roi_tracking: bool = False,
     ):
         super().__init__(g_pool)
 
@@ -88,6 +89,7 @@ class Surface_Tracker(Plugin, metaclass=ABCMeta):
             square_marker_use_online_mode=use_online_detection,
             apriltag_quad_decimate=use_high_res,
             apriltag_decode_sharpening=sharpen,
+            marker_roi_tracking=roi_tracking,
         )
         self._surface_file_store = Surface_File_Store(parent_dir=self._save_dir)
 
@@ -197,6 +199,12 @@ class Surface_Tracker(Plugin, metaclass=ABCMeta):
                     {"subject": "surface_tracker.marker_detection_params_changed"}
                 )
 
+        def set_marker_roi_tracking(val):
+            self.marker_detector.marker_roi_tracking = val
+            self.notify_all(
+                {"subject": "surface_tracker.marker_detection_params_changed"}
+            )
+
         menu = ui.Growing_Menu("Marker Detection Parameters")
         menu.collapsed = True
         menu.append(
@@ -209,6 +217,21 @@ class Surface_Tracker(Plugin, metaclass=ABCMeta):
                 setter=set_marker_detector_mode,
             )
         )
+        menu.append(
+            ui.Info_Text(
+                "Track markers between frames to only search for them around their "
+                "previous positions. This is faster, but markers that enter the "
+                "image can be found a few frames late."
+            )
+        )
+        menu.append(
+            ui.Switch(
+                "marker_roi_tracking",
+                self.marker_detector,
+                setter=set_marker_roi_tracking,
+                label="Track markers",
+            )
+        )
 
         menu.append(self._apriltag_marker_param_menu())
         menu.append(self._square_marker_param_menu())
@@ -432,6 +455,10 @@ class Surface_Tracker(Plugin, metaclass=ABCMeta):
         self._update_surface_corners()
         events["surfaces"] = self._create_surface_events(events, frame.timestamp)
 
+    def _surface_locations_timestamp(self, frame_timestamp):
+        """Timestamp of the frame that the current surface locations are from"""
+        return frame_timestamp
+
     @abstractmethod
     def _update_markers(self, frame):
         pass
@@ -473,6 +500,9 @@ class Surface_Tracker(Plugin, metaclass=ABCMeta):
         """
         gaze_events = events.get("gaze", [])
         fixation_events = events.get("fixations", [])
+        # Locations can be from an earlier frame, e.g. if markers are detected in the
+        # background. The latency is the time between both frames.
+        detection_timestamp = self._surface_locations_timestamp(timestamp)
 
         surface_events = []
         for surface in self.surfaces:
@@ -492,6 +522,8 @@ class Surface_Tracker(Plugin, metaclass=ABCMeta):
                     "gaze_on_surfaces": gaze_on_surf,
                     "fixations_on_surfaces": fixations_on_surf,
                     "timestamp": timestamp,
+                    "detection_timestamp": detection_timestamp,
+                    "detection_latency": timestamp - detection_timestamp,
                 }
                 surface_events.append(surface_event)
 
@@ -548,6 +580,7 @@ class Surface_Tracker(Plugin, metaclass=ABCMeta):
             "marker_detector_mode": marker_detector_mode,
             "use_high_res": self.marker_detector.apriltag_quad_decimate,
             "sharpen": self.marker_detector.apriltag_decode_sharpening,
+            "roi_tracking": self.marker_detector.marker_roi_tracking,
         }
 
     def save_surface_definitions_to_file(self):
@@ -32,6 +32,9 @@ from plugin import Plugin
 from . import background_tasks, offline_utils
 from .cache import Cache
 from .gui import Heatmap_Mode
+from .location_cache_store import Surface_Location_Cache_Store
+from .marker_cache_store import Filtered_Marker_Cache, Marker_Cache_Store
+from .surface import Undistorted_Gaze
 from .surface_marker import Surface_Marker
 from .surface_marker_detector import MarkerDetectorMode, MarkerType
 from .surface_offline import Surface_Offline
@@ -57,6 +60,7 @@ class _CacheRelevantDetectorParams(T.NamedTuple):
     inverted_markers: bool
     quad_decimate: float
     sharpening: float
+    roi_tracking: bool
 
 
 class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
@@ -79,12 +83,21 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
         self.marker_cache = None
         self.marker_cache_unfiltered = None
         self.cache_filler = None
+        self._marker_cache_store = Marker_Cache_Store(
+            os.path.join(g_pool.rec_dir, "offline_data", "surface_marker_cache")
+        )
         self._init_marker_cache()
+        self._location_cache_store = Surface_Location_Cache_Store(
+            os.path.join(g_pool.rec_dir, "offline_data", "surface_location_caches")
+        )
         self.last_cache_update_ts = time.perf_counter()
         self.CACHE_UPDATE_INTERVAL_SEC = 5
 
         self.gaze_on_surf_buffer = None
         self.gaze_on_surf_buffer_filler = None
+        # Gaze in undistorted image space, shared by all surfaces. It is computed
+        # by the gaze buffer filler and reset when the gaze positions change.
+        self._undistorted_gaze = None
 
         self._heatmap_update_requests = set()
         self.export_proxies = set()
@@ -143,6 +156,17 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             return marker_detector_mode
 
     def _init_marker_cache(self):
+        stored_params = self._cache_relevant_params_from_store()
+        if stored_params is not None:
+            self._recalculate_marker_cache(
+                parameters=stored_params,
+                previous_state=self._marker_cache_store.load(
+                    len(self.g_pool.timestamps)
+                ),
+            )
+            logger.debug("Restored previous marker cache.")
+            return
+
         previous_cache_config = file_methods.Persistent_Dict(
             os.path.join(self.g_pool.rec_dir, "square_marker_cache")
         )
@@ -169,16 +193,27 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
                     ]
                 marker_cache_unfiltered.append(markers)
 
+            self._migrate_legacy_marker_cache(previous_params, marker_cache_unfiltered)
             self._recalculate_marker_cache(
                 parameters=previous_params, previous_state=marker_cache_unfiltered
             )
             logger.debug("Restored previous marker cache.")
 
+    def _migrate_legacy_marker_cache(self, params, marker_cache_unfiltered):
+        """Moves a marker cache of the square_marker_cache file to the store"""
+        self._marker_cache_store.clear(self._marker_cache_store_metadata(params))
+        for frame_index, markers in enumerate(marker_cache_unfiltered):
+            if markers is not None:
+                markers = [m for m in markers or [] if m is not None]
+                self._marker_cache_store.append(frame_index, markers)
+        self._marker_cache_store.flush()
+
     def _set_detector_params(self, params: _CacheRelevantDetectorParams):
         self.marker_detector._marker_detector_mode = params.mode
         self.marker_detector._square_marker_inverted_markers = params.inverted_markers
         self.marker_detector._apriltag_quad_decimate = params.quad_decimate
         self.marker_detector._apriltag_decode_sharpening = params.sharpening
+        self.marker_detector._marker_roi_tracking = params.roi_tracking
         self.marker_detector.init_detector()
 
     @staticmethod
@@ -200,14 +235,40 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             inverted_markers=previous_cache.get("inverted_markers", False),
             quad_decimate=previous_cache.get("quad_decimate", APRILTAG_HIGH_RES_ON),
             sharpening=previous_cache.get("sharpening", APRILTAG_SHARPENING_ON),
+            roi_tracking=False,
         )
 
+    def _cache_relevant_params_from_store(
+        self,
+    ) -> T.Optional[_CacheRelevantDetectorParams]:
+        metadata = self._marker_cache_store.metadata
+        if metadata is None:
+            return
+        return _CacheRelevantDetectorParams(
+            mode=MarkerDetectorMode.from_tuple(metadata["mode"]),
+            inverted_markers=metadata["inverted_markers"],
+            quad_decimate=metadata["quad_decimate"],
+            sharpening=metadata["sharpening"],
+            roi_tracking=metadata.get("roi_tracking", False),
+        )
+
+    @staticmethod
+    def _marker_cache_store_metadata(params: _CacheRelevantDetectorParams) -> dict:
+        return {
+            "mode": params.mode.as_tuple(),
+            "inverted_markers": params.inverted_markers,
+            "quad_decimate": params.quad_decimate,
+            "sharpening": params.sharpening,
+            "roi_tracking": params.roi_tracking,
+        }
+
     def _cache_relevant_params_from_controller(self) -> _CacheRelevantDetectorParams:
         return _CacheRelevantDetectorParams(
             mode=self.marker_detector.marker_detector_mode,
             inverted_markers=self.marker_detector.inverted_markers,
             quad_decimate=self.marker_detector.apriltag_quad_decimate,
             sharpening=self.marker_detector.apriltag_decode_sharpening,
+            roi_tracking=self.marker_detector.marker_roi_tracking,
         )
 
     def _recalculate_marker_cache(
@@ -225,7 +286,13 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             for surface in self.surfaces:
                 surface.location_cache = None
 
-        self.marker_cache_unfiltered = Cache(previous_state)
+            self._marker_cache_store.clear(
+                self._marker_cache_store_metadata(parameters)
+            )
+
+        if not isinstance(previous_state, Cache):
+            previous_state = Cache(previous_state)
+        self.marker_cache_unfiltered = previous_state
         self.marker_cache = self._filter_marker_cache(self.marker_cache_unfiltered)
 
         if self.cache_filler is not None:
@@ -236,7 +303,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             offline_utils.marker_detection_callable.from_detector(
                 self.marker_detector, self.CACHE_MIN_MARKER_PERIMETER
             ),
-            list(self.marker_cache),
+            self.marker_cache_unfiltered.visited,
             self.cache_seek_idx,
             mp_context,
         )
@@ -247,12 +314,9 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             # We only need to filter SQUARE_MARKERs
             return cache_to_filter
 
-        marker_cache = []
-        for markers in cache_to_filter:
-            if markers:
-                markers = self._filter_markers(markers)
-            marker_cache.append(markers)
-        return Cache(marker_cache)
+        return Filtered_Marker_Cache(
+            cache_to_filter, self.marker_detector.marker_min_perimeter
+        )
 
     def _filter_markers(self, markers):
         return [
@@ -291,6 +355,9 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             did_timeout = False
 
             for gaze in self.gaze_on_surf_buffer_filler.fetch():
+                if isinstance(gaze, Undistorted_Gaze):
+                    self._undistorted_gaze = gaze
+                    continue
                 self.gaze_on_surf_buffer.append(gaze)
                 if time.perf_counter() - start_time > 1 / 50:
                     did_timeout = True
@@ -309,8 +376,10 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
 
             if proxy.completed:
                 self.export_proxies.remove(proxy)
+                logger.info("Done exporting reference surface data.")
 
     def _update_markers(self, frame):
+        self._restore_location_caches()
         self._update_marker_and_surface_caches()
 
         self.markers = self.marker_cache[frame.index]
@@ -330,6 +399,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             if frame_index is not None:
                 markers = self._remove_duplicate_markers(markers)
                 self.marker_cache_unfiltered.update(frame_index, markers)
+                self._marker_cache_store.append(frame_index, markers)
                 marker_type = self.marker_detector.marker_detector_mode.marker_type
                 if marker_type == MarkerType.SQUARE_MARKER:
                     markers_filtered = self._filter_markers(markers)
@@ -352,6 +422,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             self._fill_gaze_on_surf_buffer()
             self._save_marker_cache()
             self.save_surface_definitions_to_file()
+            self._save_location_caches()
 
         now = time.perf_counter()
         if now - self.last_cache_update_ts > self.CACHE_UPDATE_INTERVAL_SEC:
@@ -381,23 +452,17 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
         for surface in self._heatmap_update_requests:
             surf_idx = self.surfaces.index(surface)
             gaze_on_surf = self.gaze_on_surf_buffer[surf_idx]
-            gaze_on_surf = itertools.chain.from_iterable(gaze_on_surf)
-            gaze_on_surf = (
-                g
-                for g in gaze_on_surf
-                if g["confidence"] >= self.g_pool.min_data_confidence
+            confident = gaze_on_surf.confidences >= self.g_pool.min_data_confidence
+            surface.update_heatmap_from_norm_pos(
+                gaze_on_surf.norm_pos[gaze_on_surf.on_surf & confident]
             )
-            gaze_on_surf = list(gaze_on_surf)
-            surface.update_heatmap(gaze_on_surf)
 
         self._heatmap_update_requests.clear()
 
     def _compute_across_surfaces_heatmap(self):
         gaze_counts_per_surf = []
-        for gaze in self.gaze_on_surf_buffer:
-            gaze = list(itertools.chain.from_iterable(gaze))
-            gaze = [g for g in gaze if g["on_surf"]]
-            gaze_counts_per_surf.append(len(gaze))
+        for gaze_on_surf in self.gaze_on_surf_buffer:
+            gaze_counts_per_surf.append(np.count_nonzero(gaze_on_surf.on_surf))
 
         if gaze_counts_per_surf:
             max_count = max(gaze_counts_per_surf)
@@ -436,6 +501,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             all_gaze_events,
             self.camera_model,
             mp_context,
+            undistorted_gaze=self._undistorted_gaze,
         )
 
     def gl_display(self):
@@ -568,6 +634,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
                 self.g_pool.fixations,
                 self.camera_model,
                 mp_context,
+                undistorted_gaze=self._undistorted_gaze,
             )
             self.export_proxies.add(proxy)
 
@@ -578,6 +645,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             self._fill_gaze_on_surf_buffer()
 
     def _on_gaze_positions_changed(self):
+        self._undistorted_gaze = None
         for surface in self.surfaces:
             self._heatmap_update_requests.add(surface)
             surface.within_surface_heatmap = surface.get_placeholder_heatmap()
@@ -585,6 +653,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
 
     def on_surface_change(self, surface):
         self.save_surface_definitions_to_file()
+        self._save_location_caches()
         self._heatmap_update_requests.add(surface)
         self._debounced_fill_gaze_on_surf_buffer()
 
@@ -604,23 +673,62 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
 
     def cleanup(self):
         super().cleanup()
-        self._save_marker_cache()
+        self._marker_cache_store.close()
+        self._save_location_caches()
+        self._location_cache_store.remove_all_except(
+            self._location_cache_key(surface)
+            for surface in self.surfaces
+            if surface.defined
+        )
 
         for proxy in self.export_proxies.copy():
             proxy.cancel()
             self.export_proxies.remove(proxy)
 
-    def _save_marker_cache(self):
-        marker_cache_file = file_methods.Persistent_Dict(
-            os.path.join(self.g_pool.rec_dir, "square_marker_cache")
-        )
-        marker_cache_file["marker_cache_unfiltered"] = list(
-            self.marker_cache_unfiltered
+    def _location_cache_key(self, surface) -> str:
+        """Identifies all inputs of the surface locations, such that persisted
+        location caches are only reused if none of them changed."""
+        definition = self._surface_file_store.serializer.dict_from_surface(surface)
+        marker_type = self.marker_detector.marker_detector_mode.marker_type
+        if marker_type == MarkerType.SQUARE_MARKER:
+            marker_min_perimeter = self.marker_detector.marker_min_perimeter
+        else:
+            marker_min_perimeter = None
+        return self._location_cache_store.key(
+            registered_markers_undist=definition["reg_markers"],
+            registered_markers_dist=definition["registered_markers_dist"],
+            marker_cache=self._marker_cache_store.metadata,
+            marker_min_perimeter=marker_min_perimeter,
+            camera=(
+                type(self.camera_model).__name__,
+                self.camera_model.resolution,
+                self.camera_model.K,
+                self.camera_model.D,
+            ),
         )
-        marker_cache_file["version"] = self.MARKER_CACHE_VERSION
 
-        current_config = self._cache_relevant_params_from_controller()
-        marker_cache_file["inverted_markers"] = current_config.inverted_markers
-        marker_cache_file["quad_decimate"] = current_config.quad_decimate
-        marker_cache_file["sharpening"] = current_config.sharpening
-        marker_cache_file.save()
+    def _restore_location_caches(self):
+        for surface in self.surfaces:
+            if surface.location_cache is not None or not surface.defined:
+                continue
+            location_cache = self._location_cache_store.load(
+                self._location_cache_key(surface), frame_count=len(self.marker_cache)
+            )
+            if location_cache is not None:
+                surface.restore_location_cache(location_cache)
+                logger.debug(f"Restored location cache of surface '{surface.name}'")
+
+    def _save_location_caches(self):
+        for surface in self.surfaces:
+            if (
+                surface.defined
+                and surface.location_cache is not None
+                and surface.location_cache_filler is None
+                and surface.location_cache.next_unvisited(0) is None
+            ):
+                self._location_cache_store.save(
+                    self._location_cache_key(surface), surface.location_cache
+                )
+
+    def _save_marker_cache(self):
+        self._marker_cache_store.flush()
@@ -9,6 +9,7 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import copy
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +19,11 @@ import pyglui.cygl.utils as pyglui_utils
 import gl_utils
 
 from .gui import Heatmap_Mode
+from .marker_detection_thread import (
+    Marker_Detection_Request,
+    Marker_Detection_Thread,
+    Surface_Definition,
+)
 from .surface_tracker import Surface_Tracker
 from .surface_online import Surface_Online
 
@@ -26,17 +32,26 @@ class Surface_Tracker_Online(Surface_Tracker):
     """
     The Surface_Tracker_Online does marker based AOI tracking in real-time. All
     necessary computation is done per frame.
+
+    With async_detection, markers are detected and surfaces are located in a
+    background thread instead, such that the world process does not wait for the
+    detection. Surfaces are then updated with the latest finished detection, which
+    can be a few frames old.
     """
 
-    def __init__(self, g_pool, *args, **kwargs):
+    def __init__(self, g_pool, *args, async_detection: bool = False, **kwargs):
         self.freeze_scene = False
         self.frozen_scene_frame = None
         self.frozen_scene_tex = None
+        self._detection_thread = None
+        self._detection_result = None
+        self._has_new_detection_result = False
         super().__init__(g_pool, *args, use_online_detection=True, **kwargs)
 
         self.menu = None
         self.button = None
         self.add_button = None
+        self.async_detection = async_detection
 
     @property
     def Surface_Class(self):
@@ -63,6 +78,35 @@ class Surface_Tracker_Online(Surface_Tracker):
     def supported_heatmap_modes(self):
         return [Heatmap_Mode.WITHIN_SURFACE]
 
+    @property
+    def async_detection(self) -> bool:
+        return self._detection_thread is not None
+
+    @async_detection.setter
+    def async_detection(self, value: bool):
+        if value and self._detection_thread is None:
+            self._detection_thread = Marker_Detection_Thread(
+                self._background_marker_detector()
+            )
+        elif not value and self._detection_thread is not None:
+            self._detection_thread.stop()
+            self._detection_thread = None
+            self._detection_result = None
+            self._has_new_detection_result = False
+
+    def _background_marker_detector(self):
+        # The background thread gets its own copy of the detector, such that
+        # parameter changes do not interfere with a running detection.
+        marker_detector = copy.deepcopy(self.marker_detector)
+
+        def detect_markers(gray_img, frame_index):
+            markers = marker_detector.detect_markers(
+                gray_img=gray_img, frame_index=frame_index
+            )
+            return self._remove_duplicate_markers(markers)
+
+        return detect_markers
+
     def _update_ui_custom(self):
         def set_freeze_scene(val):
             self.freeze_scene = val
@@ -77,6 +121,11 @@ class Surface_Tracker_Online(Surface_Tracker):
                 "freeze_scene", self, label="Freeze Scene", setter=set_freeze_scene
             )
         )
+        self.menu.append(
+            pyglui.ui.Switch(
+                "async_detection", self, label="Detect markers in background"
+            )
+        )
 
     def _per_surface_ui_custom(self, surface, surf_menu):
         def set_gaze_hist_len(val):
@@ -118,11 +167,55 @@ class Surface_Tracker_Online(Surface_Tracker):
             events["frame"] = current_frame
 
     def _update_markers(self, frame):
-        self._detect_markers(frame)
+        if self._detection_thread is None:
+            self._detect_markers(frame)
+            return
+
+        edited_surfaces = {surface for surface, _ in self._edit_surf_verts}
+        self._detection_thread.submit(
+            Marker_Detection_Request(
+                frame_index=frame.index,
+                frame_timestamp=frame.timestamp,
+                gray_img=frame.gray,
+                surface_definitions=[
+                    Surface_Definition.from_surface(surface)
+                    for surface in self.surfaces
+                    if surface.defined and surface not in edited_surfaces
+                ],
+                camera_model=self.camera_model,
+            )
+        )
+        result = self._detection_thread.fetch()
+        self._has_new_detection_result = result is not None
+        if result is not None:
+            self._detection_result = result
+            self.markers = result.markers
 
     def _update_surface_locations(self, frame_index):
+        if self._detection_thread is None:
+            for surface in self.surfaces:
+                surface.update_location(frame_index, self.markers, self.camera_model)
+            return
+
+        if not self._has_new_detection_result:
+            # Keep the locations of the latest detection
+            return
+
+        result = self._detection_result
         for surface in self.surfaces:
-            surface.update_location(frame_index, self.markers, self.camera_model)
+            location = result.surface_locations.get(surface, None)
+            if location is not None and surface.defined:
+                surface.set_location(location)
+            else:
+                # Surfaces that are being defined or edited
+                surface.update_location(
+                    result.frame_index, self.markers, self.camera_model
+                )
+
+    def _surface_locations_timestamp(self, frame_timestamp):
+        if self._detection_result is not None:
+            return self._detection_result.frame_timestamp
+        return frame_timestamp
 
     def _update_surface_corners(self):
         for surface, corner_idx in self._edit_surf_verts:
@@ -178,6 +271,24 @@ class Surface_Tracker_Online(Surface_Tracker):
                     "Can not add a new surface: No markers found in the image!"
                 )
 
+    def on_notify(self, notification):
+        super().on_notify(notification)
+
+        if self._detection_thread is not None and notification["subject"] in (
+            "surface_tracker.marker_detection_params_changed",
+            "surface_tracker.marker_min_perimeter_changed",
+        ):
+            self._detection_thread.detect_markers = self._background_marker_detector()
+
+    def get_init_dict(self):
+        init_dict = super().get_init_dict()
+        init_dict["async_detection"] = self.async_detection
+        return init_dict
+
+    def cleanup(self):
+        self.async_detection = False
+        super().cleanup()
+
     def gl_display(self):
         if self.freeze_scene:
             self.gl_display_frozen_scene()
@@ -10,3 +10,4 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 from tasklib.background.create import create
+from tasklib.background.parallel import ParallelGeneratorFunction
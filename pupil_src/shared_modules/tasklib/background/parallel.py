@@ -0,0 +1,146 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import multiprocessing as mp
+import typing as T
+
+from tasklib.background.create import create
+from tasklib.interface import TaskInterface
+
+
+def default_worker_count() -> int:
+    return max(1, mp.cpu_count() - 1)
+
+
+class ParallelGeneratorFunction(TaskInterface):
+    """
+    Runs a generator function once per set of arguments, each in its own background
+    process, with at most `max_workers` processes running at the same time.
+
+    Results are yielded in the order of the argument sets: Results of a part are
+    held back until all previous parts completed. This way the consumer sees the
+    same sequence of results as if all parts ran one after the other in a single
+    process.
+
+    The task completes when all parts completed. If any part raises an exception,
+    all other parts get killed and the exception is passed on.
+    """
+
+    def __init__(
+        self,
+        name,
+        generator_function,
+        args_per_part: T.Sequence[T.Sequence],
+        kwargs=None,
+        pass_shared_memory=False,
+        patches=None,
+        max_workers: T.Optional[int] = None,
+    ):
+        super().__init__()
+        part_count = len(args_per_part)
+        self._parts = [
+            create(
+                f"{name} ({idx + 1}/{part_count})",
+                generator_function,
+                pass_shared_memory,
+                args,
+                dict(kwargs or {}),
+                patches,
+            )
+            for idx, args in enumerate(args_per_part)
+        ]
+        for idx, part in enumerate(self._parts):
+            part.add_observer(
+                "on_yield", lambda value, idx=idx: self._on_part_yield(idx, value)
+            )
+            part.add_observer(
+                "on_completed", lambda _, idx=idx: self._on_part_completed(idx)
+            )
+            part.add_observer("on_exception", self._on_part_exception)
+        self._held_back_results = [[] for _ in self._parts]
+        self._completed_parts = [False] * part_count
+        self._next_part_to_yield = 0
+        self._next_part_to_start = 0
+        self._max_workers = max_workers or default_worker_count()
+        self._cancel_requested = False
+
+    @property
+    def progress(self):
+        if not self._parts:
+            return 1.0
+        return sum(part.progress for part in self._parts) / len(self._parts)
+
+    def start(self):
+        super().start()
+        if not self._parts:
+            self.on_completed(None)
+            return
+        self._start_parts_up_to_max_workers()
+
+    def cancel_gracefully(self):
+        super().cancel_gracefully()
+        self._cancel_requested = True
+        for part in self._running_parts():
+            part.cancel_gracefully()
+
+    def kill(self, grace_period):
+        super().kill(grace_period)
+        for part in self._running_parts():
+            part.kill(grace_period)
+        self.on_canceled_or_killed()
+
+    def update(self):
+        super().update()
+        for part in self._running_parts():
+            part.update()
+            if self.ended:
+                return
+
+        if self._cancel_requested:
+            if not self._running_parts():
+                self.on_canceled_or_killed()
+        elif all(self._completed_parts):
+            self.on_completed(None)
+        else:
+            self._start_parts_up_to_max_workers()
+
+    def _running_parts(self):
+        return [part for part in self._parts if part.running]
+
+    def _start_parts_up_to_max_workers(self):
+        free_workers = self._max_workers - len(self._running_parts())
+        unstarted_parts = self._parts[self._next_part_to_start :]
+        for part in unstarted_parts[: max(0, free_workers)]:
+            part.start()
+            self._next_part_to_start += 1
+
+    def _on_part_yield(self, part_idx, value):
+        if part_idx == self._next_part_to_yield:
+            self.on_yield(value)
+        else:
+            self._held_back_results[part_idx].append(value)
+
+    def _on_part_completed(self, part_idx):
+        self._completed_parts[part_idx] = True
+        while (
+            self._next_part_to_yield < len(self._parts)
+            and self._completed_parts[self._next_part_to_yield]
+        ):
+            self._next_part_to_yield += 1
+            if self._next_part_to_yield < len(self._parts):
+                held_back = self._held_back_results[self._next_part_to_yield]
+                self._held_back_results[self._next_part_to_yield] = []
+                for value in held_back:
+                    self.on_yield(value)
+
+    def _on_part_exception(self, exception):
+        for part in self._running_parts():
+            part.kill(grace_period=None)
+        self.on_exception(exception)
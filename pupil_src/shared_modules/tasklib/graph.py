@@ -0,0 +1,175 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import logging
+import typing as T
+
+from tasklib.background.parallel import default_worker_count
+from tasklib.interface import TaskInterface
+
+logger = logging.getLogger(__name__)
+
+StartFunction = T.Callable[[], T.Optional[TaskInterface]]
+
+
+class TaskGraph(TaskInterface):
+    """
+    Runs tasks in the order given by their dependencies, with at most `max_workers`
+    worker processes running at the same time.
+
+    Every node of the graph has a start function that creates and starts (or
+    schedules, e.g. by adding it to a task manager) a task and returns it. A node is
+    started as soon as all of its dependencies completed and a worker is free. If
+    the start function returns None, the node could not be started. Every node
+    counts with its `worker_count` against `max_workers` while its task is running,
+    tasks that run several processes need to be limited accordingly. If the task of
+    a node does not complete successfully, e.g. because it got replaced by another
+    task, all nodes depending on it are skipped.
+
+    The graph does not run the tasks of its nodes itself, that is up to whoever the
+    start function hands them to. The graph completes when all nodes ended or were
+    skipped.
+    """
+
+    def __init__(self, max_workers: T.Optional[int] = None):
+        super().__init__()
+        self._start_functions: T.Dict[T.Hashable, StartFunction] = {}
+        self._dependencies: T.Dict[T.Hashable, T.Tuple[T.Hashable, ...]] = {}
+        self._worker_counts: T.Dict[T.Hashable, int] = {}
+        self._tasks: T.Dict[T.Hashable, TaskInterface] = {}
+        self._succeeded = set()
+        self._failed = set()
+        self._max_workers = max_workers or default_worker_count()
+
+    def add_node(
+        self,
+        node_id: T.Hashable,
+        start_function: StartFunction,
+        dependencies: T.Iterable[T.Hashable] = (),
+        worker_count: int = 1,
+    ):
+        """
+        Adds a node to the graph. Dependencies need to be added before the nodes
+        that depend on them, which also rules out cycles. The task of the node must
+        not run more than `worker_count` processes at the same time.
+        """
+        if self.started:
+            raise ValueError("Cannot add nodes to a graph that already started!")
+        if node_id in self._start_functions:
+            raise ValueError(f"Node '{node_id}' already exists!")
+        dependencies = tuple(dependencies)
+        for dependency in dependencies:
+            if dependency not in self._start_functions:
+                raise ValueError(f"Unknown dependency '{dependency}' of '{node_id}'")
+        self._start_functions[node_id] = start_function
+        self._dependencies[node_id] = dependencies
+        # nodes that need more workers than available run on their own
+        self._worker_counts[node_id] = max(1, min(worker_count, self._max_workers))
+
+    def __len__(self):
+        return len(self._start_functions)
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @property
+    def progress(self):
+        """Average progress over all nodes, ended nodes count as 1.0"""
+        if not self._start_functions:
+            return 1.0
+        progress = sum(
+            1.0 if self._node_ended(node_id) else self._tasks[node_id].progress
+            for node_id in self._tasks
+        ) + len(self._failed - self._tasks.keys())
+        return progress / len(self._start_functions)
+
+    @property
+    def ended_node_count(self):
+        return len(self._succeeded) + len(self._failed)
+
+    def start(self):
+        super().start()
+        self._start_ready_nodes()
+
+    def cancel_gracefully(self):
+        super().cancel_gracefully()
+        for task in self._running_tasks():
+            if task.running:
+                task.cancel_gracefully()
+        self.on_canceled_or_killed()
+
+    def kill(self, grace_period):
+        super().kill(grace_period)
+        for task in self._running_tasks():
+            if task.running:
+                task.kill(grace_period)
+        self.on_canceled_or_killed()
+
+    def update(self):
+        super().update()
+        self._start_ready_nodes()
+
+    def _start_ready_nodes(self):
+        free_workers = self._max_workers - sum(
+            self._worker_counts[node_id] for node_id in self._running_node_ids()
+        )
+        for node_id in self._start_functions:
+            if self.ended:
+                return
+            if node_id in self._tasks or node_id in self._failed:
+                continue
+            dependencies = self._dependencies[node_id]
+            if any(dependency in self._failed for dependency in dependencies):
+                self._failed.add(node_id)
+                continue
+            if self._worker_counts[node_id] > free_workers:
+                continue
+            if all(dependency in self._succeeded for dependency in dependencies):
+                self._start_node(node_id)
+                free_workers -= self._worker_counts[node_id]
+        self._complete_if_all_nodes_ended()
+
+    def _start_node(self, node_id):
+        task = self._start_functions[node_id]()
+        if task is None:
+            self._failed.add(node_id)
+            return
+        self._tasks[node_id] = task
+        if task.ended:
+            self._on_node_ended(node_id)
+        else:
+            task.add_observer("on_ended", lambda: self._on_node_ended(node_id))
+
+    def _on_node_ended(self, node_id):
+        if self._tasks[node_id].completed:
+            self._succeeded.add(node_id)
+        else:
+            logger.debug(f"Skipping all tasks depending on '{node_id}'")
+            self._failed.add(node_id)
+
+    def _node_ended(self, node_id):
+        return node_id in self._succeeded or node_id in self._failed
+
+    def _running_node_ids(self):
+        """Started nodes that did not end yet, including nodes whose tasks were
+        handed over but not started by their task manager so far"""
+        return [
+            node_id
+            for node_id, task in self._tasks.items()
+            if not self._node_ended(node_id) and not task.ended
+        ]
+
+    def _running_tasks(self):
+        return [self._tasks[node_id] for node_id in self._running_node_ids()]
+
+    def _complete_if_all_nodes_ended(self):
+        if not self.ended and self.ended_node_count == len(self._start_functions):
+            self.on_completed(None)
@@ -129,6 +129,10 @@ class UniqueTaskManager(PluginTaskManager):
             logger.debug(f"Replacing {state} task with ID '{identifier}'")
             if task_duplicated.running:
                 task_duplicated.kill(grace_period=None)
+            elif not task_duplicated.ended:
+                # queued tasks never start, end them such that their observers
+                # don't wait for them forever
+                task_duplicated.on_canceled_or_killed()
             self._tasks.remove(task_duplicated)
         super().add_task(task_new)
 
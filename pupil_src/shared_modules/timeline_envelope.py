@@ -0,0 +1,204 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import logging
+import os
+import typing as T
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+ENVELOPE_BIN_DTYPE = np.dtype(
+    [
+        ("ts", np.float64),
+        ("min", np.float64),
+        ("max", np.float64),
+        ("mean", np.float64),
+        ("count", np.int64),
+    ]
+)
+
+
+class TimelineEnvelope:
+    """Multi-resolution min/max/mean envelope of a timeseries.
+
+    The time range is split into equally sized bins. The finest level has
+    `max_bins` bins (or fewer for short timeseries), each coarser level merges
+    pairs of bins of the previous level, down to `min_bins` bins. Drawing a
+    timeline only requires the level with roughly one bin per pixel, independent
+    of the number of samples.
+
+    Empty bins have a count of 0 and NaN as min, max and mean.
+    """
+
+    version = 1
+
+    def __init__(self, levels: T.Sequence[np.ndarray], xlim: T.Tuple[float, float]):
+        # levels are ordered from finest to coarsest
+        self.levels = list(levels)
+        self.xlim = tuple(xlim)
+
+    @classmethod
+    def empty(cls, xlim=(0.0, 1.0)) -> "TimelineEnvelope":
+        return cls([], xlim)
+
+    @classmethod
+    def from_timeseries(
+        cls,
+        timestamps,
+        values,
+        xlim=None,
+        max_bins: int = 2 ** 14,
+        min_bins: int = 2 ** 6,
+    ) -> "TimelineEnvelope":
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if xlim is None:
+            xlim = (timestamps[0], timestamps[-1]) if len(timestamps) else (0.0, 1.0)
+
+        valid = np.isfinite(values) & np.isfinite(timestamps)
+        timestamps, values = timestamps[valid], values[valid]
+        if not len(values):
+            return cls.empty(xlim)
+
+        bin_count = max_bins
+        while bin_count > min_bins and bin_count // 2 >= len(values):
+            bin_count //= 2
+
+        start, stop = xlim
+        duration = max(stop - start, np.finfo(np.float64).eps)
+        bin_idc = ((timestamps - start) / duration * bin_count).astype(np.int64)
+        bin_idc = np.clip(bin_idc, 0, bin_count - 1)
+
+        counts = np.bincount(bin_idc, minlength=bin_count)
+        sums = np.bincount(bin_idc, weights=values, minlength=bin_count)
+        mins = np.full(bin_count, np.inf)
+        maxs = np.full(bin_count, -np.inf)
+
+        order = np.argsort(bin_idc, kind="stable")
+        sorted_values = values[order]
+        filled_bins = np.flatnonzero(counts)
+        bin_starts = np.concatenate(([0], np.cumsum(counts[filled_bins])[:-1]))
+        mins[filled_bins] = np.minimum.reduceat(sorted_values, bin_starts)
+        maxs[filled_bins] = np.maximum.reduceat(sorted_values, bin_starts)
+
+        levels = []
+        while True:
+            levels.append(cls._level(xlim, counts, sums, mins, maxs))
+            if len(counts) <= min_bins or len(counts) % 2:
+                break
+            counts = counts.reshape(-1, 2).sum(axis=1)
+            sums = sums.reshape(-1, 2).sum(axis=1)
+            mins = mins.reshape(-1, 2).min(axis=1)
+            maxs = maxs.reshape(-1, 2).max(axis=1)
+        return cls(levels, xlim)
+
+    @staticmethod
+    def _level(xlim, counts, sums, mins, maxs) -> np.ndarray:
+        bin_count = len(counts)
+        edges = np.linspace(xlim[0], xlim[1], bin_count + 1)
+        level = np.empty(bin_count, dtype=ENVELOPE_BIN_DTYPE)
+        level["ts"] = (edges[:-1] + edges[1:]) / 2
+        level["count"] = counts
+        empty = counts == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            level["mean"] = np.where(empty, np.nan, sums / counts)
+        level["min"] = np.where(empty, np.nan, mins)
+        level["max"] = np.where(empty, np.nan, maxs)
+        return level
+
+    def __bool__(self):
+        return bool(self.levels)
+
+    def level_for_width(self, width: float, ts_range=None) -> np.ndarray:
+        """Returns the non-empty bins of the coarsest level that has at least one
+        bin per pixel.
+
+        Args:
+            width: Width of the drawing area in pixels.
+            ts_range: Optional visible (start, stop) time range, defaults to xlim.
+        """
+        if not self.levels:
+            return np.empty(0, dtype=ENVELOPE_BIN_DTYPE)
+
+        start, stop = ts_range if ts_range is not None else self.xlim
+        visible_fraction = (stop - start) / max(
+            self.xlim[1] - self.xlim[0], np.finfo(np.float64).eps
+        )
+        required_bins = width / max(visible_fraction, np.finfo(np.float64).eps)
+
+        level = self.levels[0]
+        for candidate in self.levels[1:]:
+            if len(candidate) < required_bins:
+                break
+            level = candidate
+
+        if ts_range is not None:
+            level = level[(level["ts"] >= start) & (level["ts"] <= stop)]
+        return level[level["count"] > 0]
+
+    def range_points(self, width: float, ts_range=None, ylim=None) -> np.ndarray:
+        """Vertices of one vertical min-max line segment per bin, for GL_LINES."""
+        level = self.level_for_width(width, ts_range)
+        points = np.empty((2 * len(level), 2))
+        points[0::2, 0] = points[1::2, 0] = level["ts"]
+        points[0::2, 1] = level["min"]
+        points[1::2, 1] = level["max"]
+        if ylim is not None:
+            points[:, 1] = np.clip(points[:, 1], *ylim)
+        return points
+
+    def save(self, file_path: str, key: str):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        levels = {f"level_{idx}": level for idx, level in enumerate(self.levels)}
+        with open(file_path, "wb") as file_:
+            np.savez(
+                file_,
+                version=self.version,
+                key=key,
+                xlim=np.asarray(self.xlim, dtype=np.float64),
+                **levels,
+            )
+
+    @classmethod
+    def load(cls, file_path: str, key: str) -> T.Optional["TimelineEnvelope"]:
+        """Loads a saved envelope. Returns None if there is no envelope for `key`."""
+        try:
+            with np.load(file_path) as data:
+                if data["version"] != cls.version or str(data["key"]) != key:
+                    return None
+                level_count = sum(1 for name in data.files if name.startswith("level_"))
+                levels = [data[f"level_{idx}"] for idx in range(level_count)]
+                return cls(levels, data["xlim"].tolist())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            logger.debug(f"Could not load timeline envelope from {file_path}")
+            return None
+
+
+def envelope_quantiles(envelopes: T.Iterable[TimelineEnvelope], q) -> np.ndarray:
+    """Approximate quantiles of the values of all envelopes.
+
+    Based on the bin means of the finest levels, weighted by the bin counts.
+
+    Raises:
+        IndexError: If all envelopes are empty.
+    """
+    finest_levels = [env.levels[0] for env in envelopes if env]
+    if not finest_levels:
+        raise IndexError("No envelope data available")
+    bins = np.concatenate(finest_levels)
+    bins = bins[bins["count"] > 0]
+    bins = bins[np.argsort(bins["mean"])]
+    cumulative_weights = np.cumsum(bins["count"]) / bins["count"].sum()
+    return np.interp(q, cumulative_weights, bins["mean"])
@@ -0,0 +1,121 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import cv2
+import numpy as np
+import pytest
+from scipy import optimize as scipy_optimize
+
+from gaze_mapping.gazer_3d.bundle_adjustment import BundleAdjustment
+from gaze_mapping.gazer_3d.calibrate_3d import (
+    SphericalCamera,
+    eye0_hardcoded_translation,
+    eye1_hardcoded_translation,
+)
+
+EYE_TRANSLATIONS = np.array(
+    [eye0_hardcoded_translation, eye1_hardcoded_translation], dtype=np.float64
+)
+EYE_ROTATIONS = np.array([[0.1, 2.9, 0.2], [-0.2, 3.3, -0.1]])
+INITIAL_DEPTH = 500.0
+
+
+def _normalized(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1)[..., np.newaxis]
+
+
+def _synthetic_calibration(rng, target_count, noise=0.0):
+    """Gaze targets in front of the world camera, and their directions as observed
+    by the world camera and by both eyes"""
+    targets = rng.uniform((-300, -200, 300), (300, 200, 1000), size=(target_count, 3))
+    observations = [_normalized(targets)]
+    for rotation, translation in zip(EYE_ROTATIONS, EYE_TRANSLATIONS):
+        matrix = cv2.Rodrigues(rotation)[0]
+        # world to eye coordinates
+        observations.append(_normalized(targets - translation) @ matrix)
+    observations = [
+        _normalized(obs + rng.normal(scale=noise, size=obs.shape))
+        for obs in observations
+    ]
+    return targets, observations
+
+
+def _bundle_adjustment(observations, rng):
+    initial_rotations = EYE_ROTATIONS + rng.normal(scale=0.05, size=(2, 3))
+    spherical_cameras = [
+        SphericalCamera(observations[0], np.zeros(3), np.zeros(3), True, True)
+    ] + [
+        SphericalCamera(obs, rotation, translation, False, True)
+        for obs, rotation, translation in zip(
+            observations[1:], initial_rotations, EYE_TRANSLATIONS
+        )
+    ]
+    initial_targets = observations[0] * INITIAL_DEPTH
+    residual, poses, targets = BundleAdjustment(fix_gaze_targets=False).calculate(
+        spherical_cameras, initial_targets
+    )
+    return initial_rotations, initial_targets, residual, np.array(poses), targets
+
+
+def _scipy_least_squares(observations, initial_rotations, initial_targets):
+    """Optimizes the eye rotations and all gaze targets as one least-squares
+    problem, as it was done before the Schur complement solver"""
+
+    def residuals(variables):
+        rotations = variables[:6].reshape(2, 3)
+        targets = variables[6:].reshape(-1, 3)
+        residuals = [observations[0] - _normalized(targets)]
+        for obs, rotation, translation in zip(
+            observations[1:], rotations, EYE_TRANSLATIONS
+        ):
+            matrix = cv2.Rodrigues(rotation)[0]
+            residuals.append(obs @ matrix.T - _normalized(targets - translation))
+        return np.concatenate(residuals).ravel()
+
+    result = scipy_optimize.least_squares(
+        residuals,
+        np.append(initial_rotations.ravel(), initial_targets.ravel()),
+        ftol=1e-12,
+        xtol=1e-12,
+        gtol=1e-12,
+    )
+    return result.cost, result.x[:6].reshape(2, 3), result.x[6:].reshape(-1, 3)
+
+
+@pytest.mark.parametrize("target_count", [30, 300, 2000])
+def test_recovers_ground_truth(target_count):
+    rng = np.random.default_rng(target_count)
+    true_targets, observations = _synthetic_calibration(rng, target_count)
+
+    _, _, residual, poses, targets = _bundle_adjustment(observations, rng)
+
+    assert residual < 1e-12
+    assert poses[0] == pytest.approx(np.zeros(6))
+    assert poses[1:, :3] == pytest.approx(EYE_ROTATIONS, abs=1e-6)
+    assert poses[1:, 3:] == pytest.approx(EYE_TRANSLATIONS)
+    assert targets == pytest.approx(true_targets, rel=1e-4)
+
+
+def test_matches_least_squares_on_noisy_observations():
+    rng = np.random.default_rng(1)
+    _, observations = _synthetic_calibration(rng, 50, noise=0.005)
+
+    initial_rotations, initial_targets, residual, poses, targets = _bundle_adjustment(
+        observations, rng
+    )
+    expected_residual, expected_rotations, expected_targets = _scipy_least_squares(
+        observations, initial_rotations, initial_targets
+    )
+
+    assert residual == pytest.approx(expected_residual, rel=1e-4)
+    assert poses[1:, :3] == pytest.approx(expected_rotations, abs=1e-4)
+    assert targets == pytest.approx(expected_targets, rel=1e-2)
+    # the noise only shifts the solution slightly away from the ground truth
+    assert poses[1:, :3] == pytest.approx(EYE_ROTATIONS, abs=0.02)
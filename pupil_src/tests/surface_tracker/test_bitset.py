@@ -0,0 +1,76 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import numpy as np
+import pytest
+
+from surface_tracker.bitset import Bitset
+from surface_tracker.cache import Cache
+
+
+def _next_unset_reference(bools, start):
+    unset = [idx for idx, value in enumerate(bools) if not value]
+    after_start = [idx for idx in unset if idx >= start]
+    if after_start:
+        return after_start[0]
+    return unset[0] if unset else None
+
+
+@pytest.mark.parametrize("size", [0, 1, 63, 64, 65, 5000])
+def test_next_unset_matches_linear_search(size):
+    rng = np.random.default_rng(size)
+    bools = (rng.random(size) < 0.95).tolist()
+    bitset = Bitset.from_bools(bools)
+    assert bitset.to_array().tolist() == bools
+    for start in range(0, size + 2, 7):
+        assert bitset.next_unset(start, wrap_around=True) == _next_unset_reference(
+            bools, start
+        )
+
+
+def test_setting_bits_updates_the_search():
+    bitset = Bitset(5000)
+    for idx in range(4999):
+        bitset[idx] = True
+    assert bitset.next_unset(0) == 4999
+    bitset[4999] = True
+    assert bitset.next_unset(0, wrap_around=True) is None
+    bitset[70] = False
+    assert not bitset[70]
+    assert bitset.next_unset(100) is None
+    assert bitset.next_unset(100, wrap_around=True) == 70
+
+
+def test_next_unset_of_empty_bitset():
+    bitset = Bitset.from_bools([])
+    assert bitset.next_unset(0) is None
+    assert bitset.next_unset(1, wrap_around=True) is None
+
+
+def test_set_ranges():
+    bitset = Bitset.from_bools([True, True, False, True, False, False, True])
+    assert bitset.set_ranges() == [[0, 1], [3, 3], [6, 6]]
+
+
+def test_cache_ranges_follow_updates():
+    cache = Cache([None, [], None, ["marker"], None])
+    assert cache.visited_ranges == [[1, 1], [3, 3]]
+    assert cache.positive_ranges == [[3, 3]]
+
+    cache.update(2, ["marker"])
+    assert cache.visited_ranges == [[1, 3]]
+    assert cache.positive_ranges == [[2, 3]]
+    assert cache.next_unvisited(0) == 0
+    assert cache.next_unvisited(1) == 4
+
+    cache.update(3, [], force=True)
+    assert cache.positive_ranges == [[2, 2]]
+    with pytest.raises(IndexError):
+        cache.update(3, ["marker"])
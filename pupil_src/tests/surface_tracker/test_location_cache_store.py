@@ -0,0 +1,46 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import numpy as np
+import pytest
+
+from surface_tracker.cache import Cache
+from surface_tracker.location_cache_store import Surface_Location_Cache_Store
+from surface_tracker.surface import Surface_Location
+
+
+def _location(frame_idx):
+    if frame_idx % 3 == 0:
+        return Surface_Location(detected=False)
+    trans = np.eye(3) * frame_idx
+    return Surface_Location(True, trans, trans, trans, trans, num_detected_markers=2)
+
+
+def test_round_trip(tmpdir):
+    store = Surface_Location_Cache_Store(str(tmpdir.join("location_caches")))
+    key = store.key(registered_markers=[[0.0, 1.0]], camera=np.eye(3))
+    assert key == store.key(camera=np.eye(3), registered_markers=[[0.0, 1.0]])
+    assert store.load(key, frame_count=10) is None
+
+    store.save(key, Cache([_location(idx) for idx in range(10)]))
+    assert store.load(key, frame_count=11) is None
+    location_cache = store.load(key, frame_count=10)
+    assert location_cache.positive_ranges == [[1, 2], [4, 5], [7, 8]]
+    assert np.array_equal(location_cache[4].img_to_surf_trans, np.eye(3) * 4)
+    assert location_cache[4].num_detected_markers == 2
+
+    store.remove_all_except([])
+    assert store.load(key, frame_count=10) is None
+
+
+def test_incomplete_caches_are_not_saved(tmpdir):
+    store = Surface_Location_Cache_Store(str(tmpdir.join("location_caches")))
+    with pytest.raises(ValueError):
+        store.save("key", Cache([_location(0), None]))
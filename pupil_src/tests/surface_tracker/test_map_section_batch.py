@@ -0,0 +1,147 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import numpy as np
+import pytest
+
+import player_methods as pm
+from camera_models import Radial_Dist_Camera
+from surface_tracker.cache import Cache
+from surface_tracker.surface import Surface_Location, Undistorted_Gaze
+from surface_tracker.surface_offline import Surface_Offline
+
+CAMERA_MODEL = Radial_Dist_Camera(
+    "test camera",
+    (1280, 720),
+    [[800.0, 0.0, 640.0], [0.0, 800.0, 360.0], [0.0, 0.0, 1.0]],
+    [[-0.2, 0.05, 0.001, -0.001, 0.0]],
+)
+
+
+def _location(rng):
+    img_to_surf_trans = np.array(
+        [[1 / 1280, 0.0, 0.0], [0.0, 1 / 720, 0.0], [0.0, 0.0, 1.0]]
+    ) + rng.normal(scale=(1e-4, 1e-4, 0.05), size=(3, 3)) * (1, 1, 0)
+    img_to_surf_trans[2] = (1e-5 * rng.normal(), 1e-5 * rng.normal(), 1.0)
+    return Surface_Location(
+        True,
+        img_to_surf_trans,
+        np.linalg.inv(img_to_surf_trans),
+        img_to_surf_trans,
+        np.linalg.inv(img_to_surf_trans),
+        num_detected_markers=2,
+    )
+
+
+@pytest.fixture
+def recording():
+    rng = np.random.default_rng(0)
+    world_ts = np.cumsum(rng.uniform(0.02, 0.05, size=40))
+    surface = Surface_Offline()
+    surface.location_cache = Cache(
+        [
+            _location(rng) if detected else Surface_Location(detected=False)
+            for detected in rng.random(len(world_ts)) < 0.8
+        ]
+    )
+
+    gaze_ts = np.sort(rng.uniform(world_ts[0] - 0.1, world_ts[-1] + 0.1, size=500))
+    gaze = pm.Bisector(
+        [
+            {
+                "topic": "gaze.3d.01.",
+                "norm_pos": rng.uniform(-0.1, 1.1, size=2).tolist(),
+                "confidence": float(rng.random()),
+                "timestamp": ts,
+            }
+            for ts in gaze_ts.tolist()
+        ],
+        gaze_ts,
+    )
+
+    # fixations do not overlap, such that their stop timestamps are sorted as well
+    start_ts = np.sort(rng.uniform(world_ts[0], world_ts[-1], size=30))
+    gaps = np.diff(start_ts, append=start_ts[-1] + 0.3)
+    stop_ts = start_ts + gaps * rng.uniform(0.3, 0.95, size=len(start_ts))
+    fixations = pm.Affiliator(
+        [
+            {
+                "topic": "fixations",
+                "id": idx,
+                "norm_pos": rng.uniform(0.0, 1.0, size=2).tolist(),
+                "confidence": 1.0,
+                "timestamp": ts,
+                "duration": (stop - ts) * 1000,
+                "dispersion": 1.0,
+            }
+            for idx, (ts, stop) in enumerate(zip(start_ts.tolist(), stop_ts.tolist()))
+        ],
+        start_ts,
+        stop_ts,
+    )
+    return surface, world_ts, gaze, fixations
+
+
+def _map_per_frame(surface, section, world_ts, events):
+    """Maps events the way it was done before map_section_batch()"""
+    events_per_frame = []
+    for frame_idx in range(len(world_ts))[section]:
+        location = surface.location_cache[frame_idx]
+        if not location.detected:
+            events_per_frame.append([])
+            continue
+        window = pm.enclosing_window(world_ts, frame_idx)
+        events_per_frame.append(
+            surface.map_gaze_and_fixation_events(
+                events.by_ts_window(window),
+                CAMERA_MODEL,
+                trans_matrix=location.img_to_surf_trans,
+            )
+        )
+    return events_per_frame
+
+
+def _assert_same_events(events_per_frame, expected_per_frame):
+    assert len(events_per_frame) == len(expected_per_frame)
+    for events, expected_events in zip(events_per_frame, expected_per_frame):
+        assert len(events) == len(expected_events)
+        for event, expected in zip(events, expected_events):
+            assert event["norm_pos"] == pytest.approx(expected["norm_pos"], abs=1e-9)
+            assert event["on_surf"] == expected["on_surf"]
+            assert {k: v for k, v in event.items() if k != "norm_pos"} == {
+                k: v for k, v in expected.items() if k != "norm_pos"
+            }
+
+
+@pytest.mark.parametrize("events_name", ["gaze", "fixations"])
+@pytest.mark.parametrize("section", [slice(0, 40), slice(5, 23), slice(39, 40)])
+def test_batch_matches_per_frame_mapping(recording, events_name, section):
+    surface, world_ts, gaze, fixations = recording
+    events = gaze if events_name == "gaze" else fixations
+    expected = _map_per_frame(surface, section, world_ts, events)
+
+    mapped = surface.map_section(section, world_ts, events, CAMERA_MODEL)
+    _assert_same_events(mapped, expected)
+
+    undistorted = Undistorted_Gaze.from_events(events, CAMERA_MODEL)
+    batch = surface.map_section_batch(
+        section, world_ts, events, CAMERA_MODEL, undistorted
+    )
+    expected_rows = [
+        (frame_idx, event)
+        for frame_idx, frame_events in zip(range(len(world_ts))[section], expected)
+        for event in frame_events
+    ]
+    assert batch.frame_idc.tolist() == [frame_idx for frame_idx, _ in expected_rows]
+    assert batch.timestamps.tolist() == [e["timestamp"] for _, e in expected_rows]
+    assert batch.on_surf.tolist() == [e["on_surf"] for _, e in expected_rows]
+    assert batch.norm_pos.reshape(-1, 2) == pytest.approx(
+        np.array([e["norm_pos"] for _, e in expected_rows]).reshape(-1, 2), abs=1e-9
+    )
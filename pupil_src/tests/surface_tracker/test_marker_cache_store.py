@@ -0,0 +1,107 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+import pickle
+
+import numpy as np
+
+from surface_tracker.cache import Cache
+from surface_tracker.marker_cache_store import (
+    Filtered_Marker_Cache,
+    Marker_Cache_Store,
+)
+from surface_tracker.surface_marker import Surface_Marker
+
+
+def _square_marker(marker_id, perimeter=40.0):
+    return Surface_Marker.from_square_tag_detection(
+        {
+            "id": marker_id,
+            "id_confidence": 0.9,
+            "verts": np.arange(8, dtype=float).reshape(4, 1, 2),
+            "perimeter": perimeter,
+        }
+    )
+
+
+def _filled_store(directory):
+    store = Marker_Cache_Store(directory)
+    store.clear({"mode": ("square", None)})
+    store.append(2, [_square_marker(1), _square_marker(2)])
+    store.append(4, [])
+    store.append(7, [_square_marker(3, perimeter=80.0)])
+    store.close()
+    return store
+
+
+def test_round_trip(tmpdir):
+    directory = str(tmpdir.join("marker_cache"))
+    assert Marker_Cache_Store(directory).metadata is None
+    _filled_store(directory)
+
+    store = Marker_Cache_Store(directory)
+    assert store.metadata == {"mode": ["square", None]}
+    cache = store.load(frame_count=10)
+    assert cache.visited_ranges == [[2, 2], [4, 4], [7, 7]]
+    assert cache.positive_ranges == [[2, 2], [7, 7]]
+    assert [m.tag_id for m in cache[2]] == [1, 2]
+    assert cache[2][0].verts_px == [
+        [[0.0, 1.0]],
+        [[2.0, 3.0]],
+        [[4.0, 5.0]],
+        [[6.0, 7.0]],
+    ]
+    assert cache[4] == []
+
+    cache.update(5, [_square_marker(4)])
+    assert cache.visited_ranges == [[2, 2], [4, 5], [7, 7]]
+
+    unpickled = pickle.loads(pickle.dumps(store.load(frame_count=10)))
+    assert type(unpickled) is Cache
+    assert [m.tag_id for m in unpickled[7]] == [3]
+
+
+def test_incomplete_writes_are_dropped(tmpdir):
+    directory = str(tmpdir.join("marker_cache"))
+    _filled_store(directory)
+
+    records_path = os.path.join(directory, "records")
+    with open(records_path, "r+b") as records_file:
+        records_file.truncate(os.path.getsize(records_path) - 1)
+    with open(os.path.join(directory, "index"), "ab") as index_file:
+        index_file.write(b"\x00" * 5)
+
+    cache = Marker_Cache_Store(directory).load(frame_count=10)
+    assert cache.visited_ranges == [[2, 2], [4, 4]]
+
+
+def test_filtered_view_reads_markers_on_access(tmpdir):
+    directory = str(tmpdir.join("marker_cache"))
+    _filled_store(directory)
+    cache = Marker_Cache_Store(directory).load(frame_count=10)
+    cache.update(5, [_square_marker(4, perimeter=20.0)])
+
+    filtered = Filtered_Marker_Cache(cache, min_perimeter=60)
+    assert filtered.visited_ranges == [[2, 2], [4, 5], [7, 7]]
+    assert filtered.positive_ranges == [[7, 7]]
+    # ranges are known from the index, no markers were read
+    assert not isinstance(list.__getitem__(cache, 7), list)
+
+    assert filtered[2] == []
+    assert [m.tag_id for m in filtered[7]] == [3]
+    assert [m.tag_id for m in cache[2]] == [1, 2]
+
+    in_memory = Filtered_Marker_Cache(Cache(list(cache)), min_perimeter=30)
+    assert in_memory.positive_ranges == [[2, 2], [7, 7]]
+    unpickled = pickle.loads(pickle.dumps(in_memory))
+    assert type(unpickled) is Cache
+    assert [m.tag_id for m in unpickled[2]] == [1, 2]
+    assert unpickled[3:6] == [None, [], []]
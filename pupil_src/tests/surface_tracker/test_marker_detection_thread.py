@@ -0,0 +1,77 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import threading
+import time
+
+from surface_tracker.marker_detection_thread import (
+    Marker_Detection_Request,
+    Marker_Detection_Thread,
+)
+from surface_tracker.surface_marker import Surface_Marker
+
+
+def _request(frame_index):
+    return Marker_Detection_Request(
+        frame_index=frame_index,
+        frame_timestamp=frame_index / 30,
+        gray_img=None,
+        surface_definitions=[],
+        camera_model=None,
+    )
+
+
+def _square_marker(marker_id):
+    verts = [[[0.0, 0.0]], [[20.0, 0.0]], [[20.0, 20.0]], [[0.0, 20.0]]]
+    return Surface_Marker.from_square_tag_detection(
+        {"id": marker_id, "id_confidence": 1.0, "verts": verts, "perimeter": 80.0}
+    )
+
+
+def _wait_for_result(thread, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = thread.fetch()
+        if result is not None:
+            return result
+        time.sleep(0.001)
+    raise TimeoutError
+
+
+def test_stale_requests_are_dropped():
+    detection_started = threading.Event()
+    continue_detection = threading.Event()
+    detected_frames = []
+
+    def detect_markers(gray_img, frame_index):
+        detection_started.set()
+        continue_detection.wait(timeout=5.0)
+        detected_frames.append(frame_index)
+        return [_square_marker(frame_index)]
+
+    thread = Marker_Detection_Thread(detect_markers)
+    try:
+        thread.submit(_request(0))
+        assert detection_started.wait(timeout=5.0)
+        # frame 1 is replaced by frame 2 while frame 0 is being processed
+        thread.submit(_request(1))
+        thread.submit(_request(2))
+        continue_detection.set()
+
+        results = [_wait_for_result(thread)]
+        if results[0].frame_index == 0:
+            results.append(_wait_for_result(thread))
+        assert results[-1].frame_index == 2
+        assert results[-1].frame_timestamp == 2 / 30
+        assert [m.tag_id for m in results[-1].markers] == [2]
+        assert detected_frames == [0, 2]
+        assert thread.fetch() is None
+    finally:
+        thread.stop()
@@ -0,0 +1,77 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import numpy as np
+
+from surface_tracker.surface_marker import Surface_Marker
+from surface_tracker.surface_marker_detector import Marker_ROI_Tracker
+
+FULL_IMAGE = (0, 0, 640, 480)
+
+
+def _square_marker(marker_id, x, y, size=20):
+    verts = [[[x, y]], [[x + size, y]], [[x + size, y + size]], [[x, y + size]]]
+    return Surface_Marker.from_square_tag_detection(
+        {"id": marker_id, "id_confidence": 1.0, "verts": verts, "perimeter": size * 4}
+    )
+
+
+class _Fake_Detector:
+    """Finds all markers whose vertices are within the searched region"""
+
+    def __init__(self, markers):
+        self.markers = markers
+        self.searched_rois = []
+
+    def detect_markers_in_roi(self, gray_img, roi):
+        self.searched_rois.append(roi)
+        x_min, y_min, x_max, y_max = roi
+        return [
+            marker
+            for marker in self.markers
+            if all(
+                x_min <= x < x_max and y_min <= y < y_max for (x, y), in marker.verts_px
+            )
+        ]
+
+
+def test_tracks_markers_in_rois():
+    gray_img = np.zeros((480, 640), dtype=np.uint8)
+    detector = _Fake_Detector(
+        [_square_marker(1, 100, 100), _square_marker(2, 110, 130)]
+    )
+    tracker = Marker_ROI_Tracker(full_detection_interval=3)
+
+    assert len(tracker.detect_markers(detector, gray_img, 0)) == 2
+    assert detector.searched_rois == [FULL_IMAGE]
+
+    # markers are close, such that their regions are merged
+    assert len(tracker.detect_markers(detector, gray_img, 1)) == 2
+    assert detector.searched_rois[1:] == [(84, 84, 146, 166)]
+
+    tracker.detect_markers(detector, gray_img, 2)
+    tracker.detect_markers(detector, gray_img, 3)
+    assert detector.searched_rois[2:] == [(84, 84, 146, 166), FULL_IMAGE]
+
+    # frames that are not consecutive need a full detection
+    tracker.detect_markers(detector, gray_img, 5)
+    assert detector.searched_rois[-1] == FULL_IMAGE
+
+
+def test_searches_full_image_on_track_loss():
+    gray_img = np.zeros((480, 640), dtype=np.uint8)
+    detector = _Fake_Detector([_square_marker(1, 100, 100)])
+    tracker = Marker_ROI_Tracker(full_detection_interval=10)
+    tracker.detect_markers(detector, gray_img, 0)
+
+    detector.markers = [_square_marker(1, 300, 300)]
+    markers = tracker.detect_markers(detector, gray_img, 1)
+    assert [marker.tag_id for marker in markers] == [1]
+    assert detector.searched_rois[1:] == [(84, 84, 136, 136), FULL_IMAGE]
@@ -0,0 +1,183 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from surface_tracker.background_tasks import Exporter
+from surface_tracker.surface import Surface_Location
+
+from .test_map_section_batch import CAMERA_MODEL, recording  # noqa: F401
+
+EXPORT_RANGE = (3, 37)
+
+
+@pytest.fixture
+def exporter(recording, tmp_path):  # noqa: F811
+    surface, world_ts, gaze, fixations = recording
+    surface.name = "a/surface"
+    surface.real_world_size = {"x": 2.5, "y": 3.0}
+    surface.within_surface_heatmap = None
+    # matrices for which numpy chooses fixed instead of exponential notation
+    surface.location_cache.update(
+        10,
+        Surface_Location(True, np.eye(3), np.eye(3) * 2, np.eye(3) / 4, np.eye(3), 3),
+        force=True,
+    )
+    return Exporter(
+        str(tmp_path), EXPORT_RANGE, [surface], world_ts, gaze, fixations, CAMERA_MODEL
+    )
+
+
+def _read(path):
+    with open(path, encoding="utf-8", newline="") as csv_file:
+        return csv_file.read()
+
+
+def _write_with_csv_writer(path, header, rows):
+    """Writes the file the way it was done before _write_csv()"""
+    with open(path, "w", encoding="utf-8", newline="") as csv_file:
+        csv_writer = csv.writer(csv_file, delimiter=",")
+        csv_writer.writerow(header)
+        for row in rows:
+            csv_writer.writerow(row)
+    return _read(path)
+
+
+def _exported(exporter, file_name):
+    return _read(os.path.join(exporter.metrics_dir, file_name + "_asurface.csv"))
+
+
+def test_files_match_csv_writer(exporter, tmp_path):
+    [(surf_idx, gaze_on_surf_ts)] = list(exporter.save_surface_data_to_files())
+    surface = exporter.surfaces[surf_idx]
+    world_ts = exporter.world_timestamps
+    size = surface.real_world_size
+    expected_path = str(tmp_path / "expected.csv")
+
+    locations = [
+        (idx, location)
+        for idx, location in enumerate(surface.location_cache)
+        if EXPORT_RANGE[0] <= idx < EXPORT_RANGE[1] and location.detected
+    ]
+    assert _exported(exporter, "surf_positions") == _write_with_csv_writer(
+        expected_path,
+        (
+            "world_index",
+            "world_timestamp",
+            "img_to_surf_trans",
+            "surf_to_img_trans",
+            "num_detected_markers",
+            "dist_img_to_surf_trans",
+            "surf_to_dist_img_trans",
+        ),
+        [
+            (
+                idx,
+                world_ts[idx],
+                location.img_to_surf_trans,
+                location.surf_to_img_trans,
+                location.num_detected_markers,
+                location.dist_img_to_surf_trans,
+                location.surf_to_dist_img_trans,
+            )
+            for idx, location in locations
+        ],
+    )
+
+    gaze = exporter._map_section(surface, exporter.gaze_positions)
+    assert len(gaze.timestamps) > 0
+    assert _exported(exporter, "gaze_positions_on_surface") == _write_with_csv_writer(
+        expected_path,
+        (
+            "world_timestamp",
+            "world_index",
+            "gaze_timestamp",
+            "x_norm",
+            "y_norm",
+            "x_scaled",
+            "y_scaled",
+            "on_surf",
+            "confidence",
+        ),
+        [
+            (world_ts[idx], idx, ts, x, y, x * size["x"], y * size["y"], on, conf)
+            for idx, ts, (x, y), on, conf in zip(
+                gaze.frame_idc.tolist(),
+                gaze.timestamps.tolist(),
+                gaze.norm_pos.tolist(),
+                gaze.on_surf.tolist(),
+                gaze.confidences.tolist(),
+            )
+        ],
+    )
+    assert np.array_equal(gaze_on_surf_ts, np.unique(gaze.timestamps[gaze.on_surf]))
+
+    fixations = exporter._map_section(surface, exporter.fixations)
+    assert len(fixations.timestamps) > 0
+    assert _exported(exporter, "fixations_on_surface") == _write_with_csv_writer(
+        expected_path,
+        (
+            "world_timestamp",
+            "world_index",
+            "fixation_id",
+            "start_timestamp",
+            "duration",
+            "dispersion",
+            "norm_pos_x",
+            "norm_pos_y",
+            "x_scaled",
+            "y_scaled",
+            "on_surf",
+        ),
+        [
+            (
+                world_ts[idx],
+                idx,
+                fix["id"],
+                fix["timestamp"],
+                fix["duration"],
+                fix["dispersion"],
+                x,
+                y,
+                x * size["x"],
+                y * size["y"],
+                on,
+            )
+            for idx, fix, (x, y), on in zip(
+                fixations.frame_idc.tolist(),
+                exporter.fixations[fixations.event_idc],
+                fixations.norm_pos.tolist(),
+                fixations.on_surf.tolist(),
+            )
+        ],
+    )
+
+
+def test_statistics_use_passed_gaze_timestamps(exporter):
+    gaze_ts_in_section = np.array([1.0, 2.0, 2.0, 3.0, 4.0])
+    list(
+        exporter.save_surface_statisics_to_file(
+            gaze_ts_in_section, [np.array([2.0, 3.0])]
+        )
+    )
+    distribution = _read(
+        os.path.join(exporter.metrics_dir, "surface_gaze_distribution.csv")
+    )
+    assert distribution.splitlines() == [
+        "total_gaze_point_count,5",
+        "",
+        "surface_name,gaze_count",
+        "a/surface,2",
+        "not_on_any_surface,2",
+    ]
@@ -0,0 +1,190 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import types
+
+import numpy as np
+import pytest
+
+import file_methods as fm
+import player_methods as pm
+from blink_detection import Blink_Detection, Confidence_History, Offline_Blink_Detection
+
+HEADER = (
+    "id",
+    "start_timestamp",
+    "duration",
+    "end_timestamp",
+    "start_frame_index",
+    "index",
+    "end_frame_index",
+    "confidence",
+    "filter_response",
+    "base_data",
+)
+
+
+def _reference_blink_ranges(classification):
+    """Per-sample state machine that consolidated blinks before vectorization"""
+    ranges = []
+    state, start = "no blink", None
+    for idx, value in enumerate(classification):
+        if state == "no blink" and value > 0:
+            state, start = "blink started", idx
+        elif state == "blink started" and value < 0:
+            state = "blink ending"
+        elif state == "blink ending" and value >= 0:
+            ranges.append((start, idx - 1))
+            state, start = ("blink started", idx) if value > 0 else ("no blink", None)
+    if state == "blink ending":
+        ranges.append((start, len(classification) - 1))
+    return ranges
+
+
+@pytest.fixture
+def detector(tmp_path):
+    pupil_ts = np.arange(12) / 10
+    pupil_data = [
+        fm.Serialized_Dict(
+            python_dict={
+                "topic": "pupil.0.2d",
+                "id": 0,
+                "timestamp": ts,
+                "confidence": 1.0,
+            }
+        )
+        for ts in pupil_ts.tolist()
+    ]
+    g_pool = types.SimpleNamespace(
+        app="exporter",
+        notifications=[],
+        delayed_notifications={},
+        rec_dir=str(tmp_path),
+        timestamps=np.arange(-0.05, 1.2, 1 / 30),
+        pupil_positions=pm.PupilDataBisector(
+            fm.PLData(pupil_data, pupil_ts, ["pupil.0.2d"] * len(pupil_data))
+        ),
+    )
+    detector = Offline_Blink_Detection(g_pool)
+    detector.timestamps = pupil_ts
+    return detector
+
+
+def _consolidate(detector, classification, copy_base_data=False):
+    classification = np.asarray(classification, dtype=float)
+    detector.response_classification = classification
+    detector.filter_response = classification * np.linspace(0.6, 1.7, 12)
+    detector.copy_base_data = copy_base_data
+    detector.consolidate_classifications()
+    return list(detector.g_pool.blinks)
+
+
+@pytest.mark.parametrize(
+    "classification, expected_ranges",
+    [
+        # blink within the recording
+        ([0, 1, 1, 0, -1, -1, 0, 0, 0, 0, 0, 0], [(1, 5)]),
+        # blink starts with the first sample and ends with the last one
+        ([1, 0, 0, 0, 0, 0, 0, 0, 0, 0, -1, -1], [(0, 11)]),
+        # onset right after an offset starts the next blink at that onset
+        ([0, 1, -1, 1, 1, -1, 0, 1, 0, -1, 0, 0], [(1, 2), (3, 5), (7, 9)]),
+        # offsets before any onset and onsets without offset are no blinks
+        ([-1, -1, 0, 1, 0, -1, 0, 1, 1, 0, 0, 1], [(3, 5)]),
+        ([0] * 12, []),
+    ],
+)
+def test_blink_ranges(detector, classification, expected_ranges):
+    assert _reference_blink_ranges(classification) == expected_ranges
+    blinks = _consolidate(detector, classification)
+
+    assert [tuple(b["base_data_index_range"]) for b in blinks] == expected_ranges
+    assert [b["id"] for b in blinks] == list(range(1, len(expected_ranges) + 1))
+    for blink, (start, end) in zip(blinks, expected_ranges):
+        assert blink["start_timestamp"] == detector.timestamps[start]
+        assert blink["end_timestamp"] == detector.timestamps[end]
+        assert blink["duration"] == pytest.approx((end - start) / 10)
+        expected_confidence = np.abs(detector.filter_response[start:end]).mean()
+        assert blink["confidence"] == pytest.approx(min(expected_confidence, 1.0))
+        world_idc = np.searchsorted(
+            detector.g_pool.timestamps, detector.timestamps[[start, end]]
+        )
+        assert blink["start_frame_index"] == world_idc[0]
+        assert blink["end_frame_index"] == world_idc[1]
+        assert blink["index"] == world_idc.sum() // 2
+        assert "base_data" not in blink and "filter_response" not in blink
+
+
+def test_blink_ranges_match_state_machine():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        classification = rng.choice([-1.0, 0.0, 1.0], size=rng.integers(1, 40))
+        starts, ends = Offline_Blink_Detection._blink_index_ranges(classification)
+        assert list(zip(starts.tolist(), ends.tolist())) == _reference_blink_ranges(
+            classification
+        )
+
+
+def test_export_without_copied_base_data(detector):
+    classification = [0, 1, -1, 1, 1, -1, 0, 1, 0, -1, 0, 0]
+    copied = _consolidate(detector, classification, copy_base_data=True)
+    referenced = _consolidate(detector, classification, copy_base_data=False)
+
+    assert [len(b["base_data"]) for b in copied] == [1, 2, 2]
+    for copied_blink, referenced_blink in zip(copied, referenced):
+        assert detector.csv_representation_for_blink(
+            copied_blink, HEADER
+        ) == detector.csv_representation_for_blink(referenced_blink, HEADER)
+
+
+def _old_online_filter(filter_size):
+    blink_filter = np.ones(filter_size) / filter_size
+    blink_filter[filter_size // 2 :] *= -1
+    if filter_size % 2 == 1:  # make filter symmetrical
+        blink_filter[filter_size // 2] = 0.0
+    return blink_filter
+
+
+@pytest.mark.parametrize("capacity", [8, 16])
+@pytest.mark.parametrize("history_samples", [10, 11])
+def test_online_filter_response_matches_convolution(capacity, history_samples):
+    rate = 128
+    detector = Blink_Detection(
+        types.SimpleNamespace(),
+        history_length=history_samples / rate,
+        onset_confidence_threshold=0.0,
+        offset_confidence_threshold=0.0,
+    )
+    # small capacities, such that the buffer wraps around and grows
+    detector.history = Confidence_History(capacity=capacity)
+
+    rng = np.random.default_rng(capacity + history_samples)
+    # confidences up to 0.85 keep the response magnitude below the clamping at 1
+    confidences = rng.uniform(0.0, 0.85, size=300)
+    confidences[100:140] = 0.0
+
+    responses, expected = [], []
+    for end in range(3, len(confidences) + 1, 3):
+        pupil = [
+            {"topic": "pupil.0.2d", "timestamp": idx / rate, "confidence": conf}
+            for idx, conf in zip(range(end - 3, end), confidences[end - 3 : end])
+        ]
+        events = {"pupil": pupil}
+        detector.recent_events(events)
+        for blink in events["blinks"]:
+            sign = 1.0 if blink["type"] == "onset" else -1.0
+            responses.append(sign * blink["confidence"])
+            window = confidences[end - len(blink["base_data"]) : end]
+            assert [pp["confidence"] for pp in blink["base_data"]] == window.tolist()
+            blink_filter = _old_online_filter(len(window))
+            expected.append(np.convolve(window, blink_filter[::-1], "valid")[0] / 0.45)
+
+    assert len(responses) > 80
+    assert len(confidences) > 2 * detector.history._capacity
+    assert responses == pytest.approx(expected, abs=1e-12)
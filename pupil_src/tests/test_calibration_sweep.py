@@ -0,0 +1,97 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import types
+
+import numpy as np
+import pytest
+
+from accuracy_visualizer import Accuracy_Visualizer, Angular_Errors, Calculation_Result
+from gaze_producer import model
+from gaze_producer.worker import calibration_sweep
+from gaze_producer.worker.calibration_sweep import SweepConfiguration, SweepResult
+
+MEMORIZING = SweepConfiguration("Gazer2D", 0.6)
+GENERALIZING = SweepConfiguration("Gazer3D", 0.6)
+
+
+def _fake_create_calibration(fake_gpool, gazer_class_name, ref_dicts, pupil_pos):
+    params = {"fitted_ts": [ref["timestamp"] for ref in ref_dicts]}
+    return "Calibration successful", model.CalibrationResult(gazer_class_name, params)
+
+
+def _fake_calc_angular_errors(
+    g_pool, gazer_class, gazer_params, pupil_list, ref_list, intrinsics
+):
+    """The 2D gazer is exact on the references it was fitted to and 3° off on all
+    other references. The 3D gazer is 1° off everywhere."""
+    fitted_ts = set(gazer_params["fitted_ts"])
+    if gazer_class.__name__ == "Gazer2D":
+        errors_deg = [0.0 if ref["timestamp"] in fitted_ts else 3.0 for ref in ref_list]
+    else:
+        errors_deg = [1.0 for _ in ref_list]
+    count = len(errors_deg)
+    return Angular_Errors(
+        error_lines=np.zeros((count, 4)),
+        angular_err=np.cos(np.deg2rad(errors_deg)),
+        succesive_distances_gaze=np.ones(max(count - 1, 0)),
+        succesive_distances_ref=np.ones(max(count - 1, 0)),
+    )
+
+
+@pytest.fixture
+def fake_fitting(monkeypatch):
+    monkeypatch.setattr(
+        calibration_sweep.create_calibration,
+        "_create_calibration",
+        _fake_create_calibration,
+    )
+    monkeypatch.setattr(
+        Accuracy_Visualizer, "calc_angular_errors", _fake_calc_angular_errors
+    )
+
+
+def _evaluate(configuration):
+    fake_gpool = types.SimpleNamespace(capture=types.SimpleNamespace(intrinsics=None))
+    ref_dicts = [{"timestamp": float(idx), "norm_pos": (0.5, 0.5)} for idx in range(20)]
+    pupil_pos = [{"timestamp": idx / 10} for idx in range(200)]
+    [result] = calibration_sweep._fit_and_evaluate(
+        fake_gpool, configuration, ref_dicts, pupil_pos
+    )
+    return result
+
+
+def test_overfitting_configuration_does_not_win(fake_fitting):
+    memorizing = _evaluate(MEMORIZING)
+    generalizing = _evaluate(GENERALIZING)
+
+    # every reference is evaluated once, with a calibration not fitted to it
+    assert memorizing.accuracy.num_used == generalizing.accuracy.num_used == 20
+    assert memorizing.accuracy.result == pytest.approx(3.0)
+    assert generalizing.accuracy.result == pytest.approx(1.0)
+    # the selected calibration is fitted to all references
+    assert len(memorizing.calibration_result.params["fitted_ts"]) == 20
+    assert calibration_sweep.select_best([memorizing, generalizing]) is generalizing
+
+
+def test_results_with_few_used_samples_are_not_selected():
+    def result(configuration, accuracy, num_used):
+        return SweepResult(
+            configuration,
+            "Calibration successful",
+            None,
+            Calculation_Result(accuracy, num_used, 100),
+            Calculation_Result(0.1, num_used, 100),
+        )
+
+    few_samples = result(MEMORIZING, 0.5, 20)
+    many_samples = result(GENERALIZING, 1.0, 90)
+    assert calibration_sweep.select_best([few_samples, many_samples]) is many_samples
+    assert calibration_sweep.select_best([few_samples]) is few_samples
@@ -0,0 +1,133 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import msgpack
+import pytest
+
+import file_methods as fm
+from gaze_producer.model.columnar_gaze import ColumnarGaze, serialize_gaze_datum
+from gaze_producer.model.gaze_mapper import GazeMapper
+
+
+def _gaze_datum(idx, with_3d=True):
+    datum = {
+        "topic": "gaze.3d.01." if with_3d else "gaze.2d.0.",
+        "confidence": 0.9,
+        "timestamp": float(idx),
+        "norm_pos": [0.1 + idx * 0.01, 0.7 - idx * 0.02],
+        "base_data": [{"topic": "pupil.0", "timestamp": float(idx)}],
+    }
+    if with_3d:
+        datum["gaze_point_3d"] = [1.0, 2.0, 500.0 + idx]
+        datum["eye_centers_3d"] = {0: [20.0, 15.0, -20.0], 1: [-40.0, 15.0, -20.0]}
+    return datum
+
+
+def _float32_serialized(datum):
+    packed = msgpack.packb(datum, use_bin_type=True, use_single_float=True)
+    return fm.Serialized_Dict(msgpack_bytes=packed)
+
+
+def _gaze(count=6):
+    """Mixed gaze: with and without 3D fields, float64 and float32 encodings"""
+    gaze = []
+    for idx in range(count):
+        datum = _gaze_datum(idx, with_3d=idx % 2 == 0)
+        if idx % 3 == 0:
+            gaze.append(_float32_serialized(datum))
+        elif idx % 3 == 1:
+            gaze.append(serialize_gaze_datum(datum))
+        else:
+            gaze.append(fm.Serialized_Dict(python_dict=datum))
+    return gaze
+
+
+def _round_trip(gaze):
+    """Serializes gaze the way it is stored and sent to other processes"""
+    return [fm.Serialized_Dict(msgpack_bytes=datum.serialized) for datum in gaze]
+
+
+def _assert_equal_except_norm_pos(shifted, original):
+    assert len(shifted) == len(original)
+    for shifted_datum, original_datum in zip(shifted, original):
+        assert set(shifted_datum.keys()) == set(original_datum.keys())
+        for key in original_datum.keys():
+            if key != "norm_pos":
+                assert shifted_datum[key] == original_datum[key]
+
+
+def test_shift_round_trip():
+    gaze = _gaze()
+    columnar = ColumnarGaze(gaze)
+    shifted = _round_trip(columnar.shifted(0.05, -0.1))
+
+    _assert_equal_except_norm_pos(shifted, gaze)
+    for shifted_datum, original_datum in zip(shifted, gaze):
+        x, y = original_datum["norm_pos"]
+        assert shifted_datum["norm_pos"] == pytest.approx((x + 0.05, y - 0.1))
+
+    # float32 gaze is converted once, uncorrected gaze keeps its values
+    unshifted = _round_trip(columnar.shifted(0.0, 0.0))
+    _assert_equal_except_norm_pos(unshifted, gaze)
+    for unshifted_datum, original_datum in zip(unshifted, gaze):
+        assert unshifted_datum["norm_pos"] == original_datum["norm_pos"]
+    assert "gaze_point_3d" in unshifted[0] and "gaze_point_3d" not in unshifted[1]
+
+
+def test_gaze_without_norm_pos_is_kept():
+    gaze = [fm.Serialized_Dict(python_dict={"topic": "gaze", "timestamp": 0.0})]
+    gaze += _gaze(2)
+    shifted = ColumnarGaze(gaze).shifted(0.1, 0.1)
+    assert dict(shifted[0]) == {"topic": "gaze", "timestamp": 0.0}
+    assert shifted[1]["norm_pos"] == pytest.approx((0.2, 0.8))
+
+
+def test_correction_does_not_accumulate():
+    gaze = _gaze()
+    gaze_mapper = GazeMapper("id", "name", "calib", (0, 10), (0, 10), 5.0, gaze=gaze)
+
+    gaze_mapper.manual_correction_x = 0.1
+    assert gaze_mapper.apply_manual_correction()
+    once = [datum["norm_pos"] for datum in gaze_mapper.gaze]
+    # applying the same correction again does not shift the gaze a second time
+    assert not gaze_mapper.apply_manual_correction()
+    assert [datum["norm_pos"] for datum in gaze_mapper.gaze] == once
+
+    for correction_x in (0.3, -0.2, 0.1):
+        gaze_mapper.manual_correction_x = correction_x
+        gaze_mapper.apply_manual_correction()
+    assert [datum["norm_pos"] for datum in gaze_mapper.gaze] == once
+
+    gaze_mapper.manual_correction_x = 0.0
+    gaze_mapper.apply_manual_correction()
+    assert [datum["norm_pos"] for datum in gaze_mapper.gaze] == [
+        datum["norm_pos"] for datum in gaze
+    ]
+
+
+def test_reset_gaze_drops_columnar_gaze():
+    gaze_mapper = GazeMapper("id", "name", "calib", (0, 10), (0, 10), 5.0, gaze=_gaze())
+    gaze_mapper.manual_correction_x = 0.1
+    gaze_mapper.apply_manual_correction()
+
+    gaze_mapper.reset_gaze()
+    assert gaze_mapper.empty()
+    assert gaze_mapper.applied_manual_correction == (0.0, 0.0)
+
+    # newly mapped gaze of the same length is not shifted from the old gaze
+    new_gaze = [serialize_gaze_datum(_gaze_datum(idx + 10)) for idx in range(6)]
+    gaze_mapper.gaze = new_gaze
+    gaze_mapper.gaze_ts = [datum["timestamp"] for datum in new_gaze]
+    gaze_mapper.manual_correction_x = 0.2
+    assert gaze_mapper.apply_manual_correction()
+    _assert_equal_except_norm_pos(gaze_mapper.gaze, new_gaze)
+    for shifted_datum, original_datum in zip(gaze_mapper.gaze, new_gaze):
+        x, y = original_datum["norm_pos"]
+        assert shifted_datum["norm_pos"] == pytest.approx((x + 0.2, y))
@@ -0,0 +1,176 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import types
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist
+
+import fixation_detector
+from fixation_detector import (
+    FixationDetectionMethod,
+    Fixation_Detector,
+    Gaze_Ring_Buffer,
+    vector_dispersion,
+)
+
+
+def _gaze(timestamp, vector):
+    return {
+        "topic": "gaze.3d.01.",
+        "timestamp": timestamp,
+        "norm_pos": vector[:2].tolist(),
+        "confidence": 1.0,
+        "gaze_point_3d": vector.tolist(),
+    }
+
+
+def _random_vectors(rng, count):
+    vectors = rng.normal(size=(count, 3)) * (0.05, 0.05, 1.0) + (0.0, 0.0, 1.0)
+    return vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+
+
+def _exact_dispersion(vectors):
+    return np.arccos(1.0 - pdist(vectors, metric="cosine").max())
+
+
+def test_bounds_and_extrema_match_pdist():
+    rng = np.random.default_rng(0)
+    vectors = _random_vectors(rng, 400)
+    # small capacity, such that popping and appending wraps around
+    buffer = Gaze_Ring_Buffer(capacity=64)
+    first = 0
+    for idx, vector in enumerate(vectors):
+        buffer.append(vector, _gaze(float(idx), vector))
+        max_len = rng.integers(2, 64)
+        while len(buffer) > max_len:
+            buffer.pop_oldest()
+            first += 1
+        window = vectors[first : idx + 1]
+
+        assert np.array_equal(buffer.vectors(), window)
+        assert buffer.timestamp(0) == first
+        assert buffer.timestamp(-1) == idx
+        if len(window) < 2:
+            continue
+
+        for axis in range(3):
+            min_seq = buffer._min_queues[axis][0]
+            max_seq = buffer._max_queues[axis][0]
+            assert buffer._value(min_seq, axis) == window[:, axis].min()
+            assert buffer._value(max_seq, axis) == window[:, axis].max()
+
+        lower, upper = buffer.dispersion_bounds()
+        exact = _exact_dispersion(window)
+        assert lower <= exact + 1e-9
+        assert exact <= upper + 1e-9
+
+
+def test_capacity_grows():
+    rng = np.random.default_rng(1)
+    vectors = _random_vectors(rng, 100)
+    buffer = Gaze_Ring_Buffer(capacity=8)
+    for idx, vector in enumerate(vectors[:5]):
+        buffer.append(vector, _gaze(float(idx), vector))
+    buffer.pop_oldest()
+    buffer.pop_oldest()
+    for idx, vector in enumerate(vectors[5:], start=5):
+        buffer.append(vector, _gaze(float(idx), vector))
+
+    assert np.array_equal(buffer.vectors(), vectors[2:])
+    lower, upper = buffer.dispersion_bounds()
+    assert lower <= _exact_dispersion(vectors[2:]) <= upper
+
+
+def test_late_gaze_is_sorted_in():
+    rng = np.random.default_rng(2)
+    vectors = _random_vectors(rng, 6)
+    timestamps = [0.0, 1.0, 3.0, 4.0]
+    buffer = Gaze_Ring_Buffer()
+    buffer.extend(vectors[:4], [_gaze(ts, v) for ts, v in zip(timestamps, vectors[:4])])
+    # gaze that is older than the newest buffered datum
+    buffer.extend(vectors[4:], [_gaze(ts, v) for ts, v in zip((2.0, 5.0), vectors[4:])])
+
+    expected_timestamps = [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+    assert [buffer.timestamp(idx) for idx in range(6)] == expected_timestamps
+    expected = vectors[[0, 1, 4, 2, 3, 5]]
+    assert np.array_equal(buffer.vectors(), expected)
+    assert [ts for _, ts in buffer._base_data] == expected_timestamps
+
+    fixation = buffer.fixation(
+        vector_dispersion(buffer.vectors()), method=FixationDetectionMethod.GAZE_3D
+    )
+    assert fixation["gaze_point_3d"] == pytest.approx(expected.mean(axis=0).tolist())
+    assert fixation["dispersion"] == pytest.approx(
+        np.rad2deg(_exact_dispersion(expected))
+    )
+
+
+@pytest.fixture
+def pdist_calls(monkeypatch):
+    calls = []
+
+    def counting_vector_dispersion(vectors):
+        calls.append(len(vectors))
+        return vector_dispersion(vectors)
+
+    monkeypatch.setattr(
+        fixation_detector, "vector_dispersion", counting_vector_dispersion
+    )
+    return calls
+
+
+def _detector(max_dispersion):
+    g_pool = types.SimpleNamespace(min_data_confidence=0.6)
+    return Fixation_Detector(g_pool, max_dispersion=max_dispersion, min_duration=300)
+
+
+def test_long_fixation_does_not_compute_pairwise_dispersion(pdist_calls):
+    detector = _detector(max_dispersion=3.0)
+    # 30 s of binocular 200 Hz gaze around the same direction, 60 world frames/s
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(12000, 3)) * (0.003, 0.003, 0.0) + (0.0, 0.0, 1.0)
+    vectors /= np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+    samples_per_frame = 400 // 60
+    for end in range(samples_per_frame, len(vectors), samples_per_frame):
+        gaze = [
+            _gaze(idx / 400, vectors[idx])
+            for idx in range(end - samples_per_frame, end)
+        ]
+        events = {"gaze": gaze}
+        detector.recent_events(events)
+        if (end - 1) / 400 < 0.3:
+            continue
+
+        [fixation] = events["fixations"]
+        assert fixation["id"] == 0
+        window = vectors[[round(ts * 400) for _, ts in fixation["base_data"]]]
+        exact = np.rad2deg(_exact_dispersion(window))
+        assert 0.8 * exact <= fixation["dispersion"] <= exact + 1e-9
+
+    assert pdist_calls == []
+
+
+def test_pairwise_dispersion_decides_between_bounds(pdist_calls):
+    # the exact dispersion is 2°, the bounding box diagonal is 2.83°
+    half_angle = np.deg2rad(1.0)
+    offsets = [(1, 0), (0, 1), (-1, 0), (0, -1)] * 10
+    vectors = np.array([(x * half_angle, y * half_angle, 1.0) for x, y in offsets])
+    vectors /= np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+    gaze = [_gaze(idx / 100, vector) for idx, vector in enumerate(vectors)]
+
+    for max_dispersion, is_fixation in ((2.5, True), (1.9, False), (3.0, True)):
+        detector = _detector(max_dispersion)
+        events = {"gaze": gaze}
+        detector.recent_events(events)
+        assert bool(events["fixations"]) is is_fixation
+    assert len(pdist_calls) == 1
+    assert vector_dispersion(vectors) == pytest.approx(np.deg2rad(2.0), rel=1e-3)
@@ -0,0 +1,148 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+import types
+
+import pytest
+
+import file_methods as fm
+from camera_models import Fisheye_Dist_Camera, Radial_Dist_Camera
+from gaze_mapping import Gazer2D
+from gaze_producer.model.gaze_mapping_cache import GazeMappingCache
+
+INTRINSICS = Radial_Dist_Camera(
+    "world",
+    (1280, 720),
+    [[800.0, 0.0, 640.0], [0.0, 800.0, 360.0], [0.0, 0.0, 1.0]],
+    [[-0.2, 0.05, 0.001, -0.001, 0.0]],
+)
+
+
+def _calibration(params=None, gazer_class_name="Gazer2D"):
+    if params is None:
+        params = {"left_model": {"coef_": [[1.0, 2.0]], "intercept_": [0.5]}}
+    return types.SimpleNamespace(gazer_class_name=gazer_class_name, params=params)
+
+
+def _gaze(count, offset=0.0):
+    gaze = [
+        fm.Serialized_Dict(
+            python_dict={
+                "topic": "gaze.2d.0.",
+                "timestamp": offset + idx,
+                "norm_pos": [0.5, 0.5],
+                "confidence": 1.0,
+            }
+        )
+        for idx in range(count)
+    ]
+    return gaze, [offset + idx for idx in range(count)]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GazeMappingCache(str(tmp_path))
+
+
+def test_key_is_stable_and_sensitive(cache, monkeypatch):
+    key = cache.key(_calibration(), "pupil-token", (0, 100), INTRINSICS)
+    assert key == cache.key(_calibration(), "pupil-token", [0, 100], INTRINSICS)
+
+    changed_params = {"left_model": {"coef_": [[1.0, 2.1]], "intercept_": [0.5]}}
+    other_keys = [
+        cache.key(_calibration(changed_params), "pupil-token", (0, 100), INTRINSICS),
+        cache.key(_calibration(), "other-pupil-token", (0, 100), INTRINSICS),
+        cache.key(_calibration(), "pupil-token", (0, 101), INTRINSICS),
+    ]
+    monkeypatch.setattr(Gazer2D, "gazer_version", Gazer2D.gazer_version + 1)
+    other_keys.append(cache.key(_calibration(), "pupil-token", (0, 100), INTRINSICS))
+    assert len({key, *other_keys}) == 5
+
+
+def test_changed_intrinsics_miss_the_cache(cache):
+    key = cache.key(_calibration(), "pupil-token", (0, 100), INTRINSICS)
+    cache.save(key, *_gaze(5))
+
+    K, D = INTRINSICS.K.copy(), INTRINSICS.D.copy()
+    K[0, 0] = 810.0
+    D[0, 0] = -0.21
+    reestimated = [
+        Radial_Dist_Camera("world", (1280, 720), K, INTRINSICS.D),
+        Radial_Dist_Camera("world", (1280, 720), INTRINSICS.K, D),
+        Radial_Dist_Camera("world", (1920, 1080), INTRINSICS.K, INTRINSICS.D),
+        Fisheye_Dist_Camera("world", (1280, 720), INTRINSICS.K, [[0.0] * 4]),
+    ]
+    other_keys = {
+        cache.key(_calibration(), "pupil-token", (0, 100), intrinsics)
+        for intrinsics in reestimated
+    }
+    assert len(other_keys) == 4 and key not in other_keys
+    for other_key in other_keys:
+        assert cache.load(other_key) is None
+    assert cache.load(key) is not None
+
+
+def test_no_key_for_unidentifiable_inputs(cache):
+    assert cache.key(_calibration(), None, (0, 100), INTRINSICS) is None
+    calibration = _calibration()
+    calibration.params = None
+    assert cache.key(calibration, "pupil-token", (0, 100), INTRINSICS) is None
+    unknown_gazer = _calibration(gazer_class_name="UnknownGazer")
+    assert cache.key(unknown_gazer, "pupil-token", (0, 100), INTRINSICS) is None
+    assert cache.key(_calibration(), "pupil-token", (0, 100), None) is None
+    unpackable_params = _calibration({"model": object()})
+    assert cache.key(unpackable_params, "pupil-token", (0, 100), INTRINSICS) is None
+
+
+def test_save_and_load(cache):
+    key = cache.key(_calibration(), "pupil-token", (0, 100), INTRINSICS)
+    assert cache.load(key) is None
+
+    gaze, gaze_ts = _gaze(5)
+    cache.save(key, gaze, gaze_ts)
+    loaded_gaze, loaded_ts = cache.load(key)
+    assert loaded_ts == gaze_ts
+    assert [dict(datum) for datum in loaded_gaze] == [dict(datum) for datum in gaze]
+    assert not any(".tmp" in name for name in os.listdir(cache._directory))
+
+
+def test_incomplete_entry_is_a_miss(cache):
+    key = cache.key(_calibration(), "pupil-token", (0, 100), INTRINSICS)
+    cache.save(key, *_gaze(5))
+    pldata_path = os.path.join(cache._directory, key + ".pldata")
+    with open(pldata_path, "rb") as fh:
+        data = fh.read()
+    with open(pldata_path, "wb") as fh:
+        fh.write(data[: len(data) // 2])
+    assert cache.load(key) is None
+
+
+def test_least_recently_used_entries_are_removed(cache):
+    cache.max_entries = 3
+    keys = [
+        cache.key(_calibration(), "pupil-token", (0, idx), INTRINSICS)
+        for idx in range(4)
+    ]
+    for mtime, key in enumerate(keys[:3], start=1):
+        cache.save(key, *_gaze(2))
+        path = os.path.join(cache._directory, key + ".pldata")
+        os.utime(path, (mtime, mtime))
+
+    assert cache.load(keys[0]) is not None
+    cache.save(keys[3], *_gaze(2))
+
+    assert cache.load(keys[1]) is None
+    assert not os.path.exists(os.path.join(cache._directory, keys[1] + ".pldata"))
+    assert not os.path.exists(
+        os.path.join(cache._directory, keys[1] + "_timestamps.npy")
+    )
+    for key in (keys[0], keys[2], keys[3]):
+        assert cache.load(key) is not None
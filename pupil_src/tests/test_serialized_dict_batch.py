@@ -0,0 +1,41 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import pickle
+
+import file_methods as fm
+import player_methods as pm
+
+
+def test_batch_round_trip():
+    pairs = [
+        (float(idx), fm.Serialized_Dict(python_dict={"id": idx, "topic": "gaze"}))
+        for idx in range(5)
+    ]
+    batch = pickle.loads(pickle.dumps(fm.Serialized_Dict_Batch.from_pairs(pairs)))
+    assert len(batch) == 5
+    assert [ts for ts, _ in batch] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert [datum["id"] for _, datum in batch] == list(range(5))
+
+
+def test_batch_with_start_and_stop_timestamps():
+    batch = fm.Serialized_Dict_Batch.from_serialized(
+        [[1.0, 2.0], [3.0, 4.0]],
+        [fm.Serialized_Dict(python_dict={"id": idx}).serialized for idx in range(2)],
+    )
+    assert [ts for ts, _ in batch] == [(1.0, 2.0), (3.0, 4.0)]
+    assert not fm.Serialized_Dict_Batch.from_pairs([])
+
+
+def test_mutable_bisector_insert_many():
+    bisector = pm.Mutable_Bisector(["b", "d"], [2.0, 4.0])
+    bisector.insert_many([5.0, 1.0, 3.0], ["e", "a", "c"])
+    assert bisector.timestamps.tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert bisector.data.tolist() == ["a", "b", "c", "d", "e"]
@@ -0,0 +1,159 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import pytest
+
+from observable import Observable
+from tasklib.graph import TaskGraph
+from tasklib.interface import TaskInterface
+from tasklib.manager import UniqueTaskManager
+
+
+class _ManualTask(TaskInterface):
+    """Task that runs until the test completes or kills it"""
+
+    progress = 0.5
+
+    def start(self):
+        super().start()
+
+    def cancel_gracefully(self):
+        super().cancel_gracefully()
+        self.on_canceled_or_killed()
+
+    def kill(self, grace_period):
+        super().kill(grace_period)
+        self.on_canceled_or_killed()
+
+    def update(self):
+        super().update()
+
+
+class _Plugin(Observable):
+    def recent_events(self, events):
+        pass
+
+    def cleanup(self):
+        pass
+
+
+def _graph_with_started_tasks(max_workers=None):
+    graph = TaskGraph(max_workers=max_workers)
+    started = {}
+
+    def start_function(node_id):
+        def start():
+            task = _ManualTask()
+            task.start()
+            started[node_id] = task
+            return task
+
+        return start
+
+    return graph, started, start_function
+
+
+def test_nodes_start_after_their_dependencies_completed():
+    graph, started, start_function = _graph_with_started_tasks(max_workers=4)
+    graph.add_node("references", start_function("references"))
+    graph.add_node("calib", start_function("calib"), dependencies=["references"])
+    graph.add_node("mapper_a", start_function("mapper_a"), dependencies=["calib"])
+    graph.add_node("mapper_b", start_function("mapper_b"), dependencies=["calib"])
+    graph.start()
+    assert list(started) == ["references"]
+
+    started["references"].on_completed(None)
+    graph.update()
+    assert list(started) == ["references", "calib"]
+
+    started["calib"].on_completed(None)
+    graph.update()
+    assert list(started) == ["references", "calib", "mapper_a", "mapper_b"]
+    assert graph.progress == pytest.approx(3 / 4)
+
+    started["mapper_a"].on_completed(None)
+    started["mapper_b"].on_completed(None)
+    graph.update()
+    assert graph.completed
+
+
+def test_max_workers_limits_running_nodes():
+    graph, started, start_function = _graph_with_started_tasks(max_workers=2)
+    for node_id in range(5):
+        graph.add_node(node_id, start_function(node_id))
+    graph.start()
+    assert list(started) == [0, 1]
+
+    started[0].on_completed(None)
+    graph.update()
+    assert list(started) == [0, 1, 2]
+
+
+def test_worker_counts_of_nodes_share_max_workers():
+    graph, started, start_function = _graph_with_started_tasks(max_workers=4)
+    graph.add_node("mapper_a", start_function("mapper_a"), worker_count=3)
+    graph.add_node("mapper_b", start_function("mapper_b"), worker_count=2)
+    graph.add_node("calib", start_function("calib"))
+    graph.add_node("too_large", start_function("too_large"), worker_count=8)
+    graph.start()
+    assert list(started) == ["mapper_a", "calib"]
+
+    started["mapper_a"].on_completed(None)
+    graph.update()
+    assert list(started) == ["mapper_a", "calib", "mapper_b"]
+
+    # nodes that need more workers than available run on their own
+    started["calib"].on_completed(None)
+    started["mapper_b"].on_completed(None)
+    graph.update()
+    assert list(started) == ["mapper_a", "calib", "mapper_b", "too_large"]
+
+
+def test_replaced_queued_task_does_not_block_graph():
+    plugin = _Plugin()
+    task_manager = UniqueTaskManager(plugin)
+    graph = TaskGraph()
+    queued = {}
+
+    def start_calibration():
+        # the task manager only starts the task during the next recent_events
+        queued["calib"] = _ManualTask()
+        task_manager.add_task(queued["calib"], identifier="calib")
+        return queued["calib"]
+
+    graph.add_node("calib", start_calibration)
+    graph.add_node("mapper", lambda: _ManualTask(), dependencies=["calib"])
+    graph.start()
+
+    task_manager.add_task(_ManualTask(), identifier="calib")
+    assert queued["calib"].canceled_or_killed
+    graph.update()
+    assert graph.completed
+
+
+def test_dependents_of_failed_nodes_are_skipped():
+    graph, started, start_function = _graph_with_started_tasks()
+    graph.add_node("calib", start_function("calib"))
+    graph.add_node("mapper", start_function("mapper"), dependencies=["calib"])
+    graph.add_node("not_started", lambda: None)
+    graph.add_node("other", start_function("other"), dependencies=["not_started"])
+    graph.start()
+
+    started["calib"].kill(grace_period=None)
+    graph.update()
+    assert list(started) == ["calib"]
+    assert graph.completed
+    assert graph.progress == 1.0
+
+
+def test_dependencies_need_to_be_added_first():
+    graph = TaskGraph()
+    with pytest.raises(ValueError):
+        graph.add_node("mapper", lambda: None, dependencies=["calib"])
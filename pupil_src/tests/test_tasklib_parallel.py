@@ -0,0 +1,67 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import time
+
+
+from tasklib.background.parallel import ParallelGeneratorFunction
+
+
+def _count(start, stop, delay):
+    time.sleep(delay)
+    for value in range(start, stop):
+        yield value
+
+
+def _fail():
+    raise ValueError("Expected failure")
+    yield
+
+
+def _run_to_end(task, timeout=20.0):
+    task.start()
+    deadline = time.monotonic() + timeout
+    while task.running:
+        assert time.monotonic() < deadline, "Task did not finish in time"
+        task.update()
+        time.sleep(0.01)
+
+
+def test_results_are_yielded_in_part_order():
+    # later parts finish first, but their results must not overtake earlier parts
+    args_per_part = [(0, 5, 0.6), (5, 10, 0.3), (10, 15, 0.0)]
+    task = ParallelGeneratorFunction("test", _count, args_per_part, patches=[])
+    results = []
+    task.add_observer("on_yield", results.append)
+    _run_to_end(task)
+    assert task.completed
+    assert results == list(range(15))
+    assert task.progress == 0.0  # _count does not report progress
+
+
+def test_max_workers_limits_running_parts():
+    args_per_part = [(idx, idx + 1, 0.1) for idx in range(4)]
+    task = ParallelGeneratorFunction(
+        "test", _count, args_per_part, patches=[], max_workers=2
+    )
+    task.start()
+    assert len(task._running_parts()) == 2
+    task.kill(grace_period=None)
+    assert task.canceled_or_killed
+
+
+def test_exception_in_part_is_passed_on():
+    task = ParallelGeneratorFunction("test", _fail, [(), ()], patches=[])
+    exceptions = []
+    task.add_observer("on_exception", exceptions.append)
+    _run_to_end(task)
+    assert not task.completed
+    assert len(exceptions) == 1
+    assert isinstance(exceptions[0], ValueError)
@@ -0,0 +1,91 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import numpy as np
+import pytest
+
+from timeline_envelope import TimelineEnvelope, envelope_quantiles
+
+
+@pytest.fixture
+def timeseries():
+    timestamps = np.linspace(10.0, 20.0, 10_000)
+    values = np.sin(timestamps)
+    values[1234] = 5.0  # spike that must not be lost in coarse levels
+    return timestamps, values
+
+
+def test_envelope_levels(timeseries):
+    timestamps, values = timeseries
+    envelope = TimelineEnvelope.from_timeseries(
+        timestamps, values, max_bins=2 ** 10, min_bins=2 ** 4
+    )
+    assert [len(level) for level in envelope.levels] == [
+        2 ** n for n in range(10, 3, -1)
+    ]
+    for level in envelope.levels:
+        assert level["count"].sum() == len(values)
+        assert level["max"].max() == 5.0
+        assert level["min"].min() == values.min()
+        assert np.allclose(
+            (level["mean"] * level["count"]).sum(), values.sum(), atol=1e-6
+        )
+
+
+def test_level_for_width(timeseries):
+    timestamps, values = timeseries
+    envelope = TimelineEnvelope.from_timeseries(
+        timestamps, values, max_bins=2 ** 10, min_bins=2 ** 4
+    )
+    assert len(envelope.level_for_width(100)) == 128
+    assert len(envelope.level_for_width(10)) == 16
+    assert len(envelope.level_for_width(5000)) == 1024
+    # zooming into a tenth of the time range requires a finer level
+    zoomed = envelope.level_for_width(100, ts_range=(10.0, 11.0))
+    assert 100 <= len(zoomed) <= 2 * 103
+
+
+def test_empty_bins_are_skipped():
+    envelope = TimelineEnvelope.from_timeseries(
+        [0.0, 0.1, 9.9], [1.0, 2.0, 3.0], xlim=(0.0, 10.0), min_bins=2 ** 4
+    )
+    points = envelope.range_points(16)
+    assert points.tolist() == [
+        [0.3125, 1.0],
+        [0.3125, 2.0],
+        [9.6875, 3.0],
+        [9.6875, 3.0],
+    ]
+
+
+def test_save_load(tmp_path, timeseries):
+    envelope = TimelineEnvelope.from_timeseries(*timeseries)
+    file_path = str(tmp_path / "timelines" / "envelope.npz")
+    envelope.save(file_path, key="abc")
+
+    assert TimelineEnvelope.load(file_path, key="other") is None
+    loaded = TimelineEnvelope.load(file_path, key="abc")
+    assert loaded.xlim == envelope.xlim
+    assert len(loaded.levels) == len(envelope.levels)
+    for level, loaded_level in zip(envelope.levels, loaded.levels):
+        assert loaded_level.dtype == level.dtype
+        for field in level.dtype.names:
+            assert np.array_equal(level[field], loaded_level[field], equal_nan=True)
+
+
+def test_envelope_quantiles(timeseries):
+    envelope = TimelineEnvelope.from_timeseries(*timeseries)
+    low, high = envelope_quantiles([envelope, TimelineEnvelope.empty()], [0.25, 0.75])
+    expected_low, expected_high = np.quantile(timeseries[1], [0.25, 0.75])
+    assert low == pytest.approx(expected_low, abs=0.01)
+    assert high == pytest.approx(expected_high, abs=0.01)
+
+    with pytest.raises(IndexError):
+        envelope_quantiles([TimelineEnvelope.empty()], [0.5])